@@ -0,0 +1,78 @@
+"""
+Bango packages, as GetPackage returns them, kept in the Django cache.
+
+The developer hub reads packages far more often than they change, and each
+GetPackage is a slow SOAP call. A package is fresh for
+BANGO_PACKAGE_CACHE_TIMEOUT seconds. For BANGO_PACKAGE_CACHE_STALE seconds
+after that it is still returned, while it is fetched again on another
+thread. Changing a package through solitude invalidates it.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from solitude import metrics
+from solitude.logger import getLogger
+from solitude.workers import spawn
+
+log = getLogger('s.bango')
+
+
+def _key(package_id):
+    return 'bango:package:{0}'.format(package_id)
+
+
+def store(package_id, package):
+    if settings.BANGO_PACKAGE_CACHE_TIMEOUT:
+        cache.set(_key(package_id), (time.time(), package),
+                  settings.BANGO_PACKAGE_CACHE_TIMEOUT +
+                  settings.BANGO_PACKAGE_CACHE_STALE)
+    return package
+
+
+def invalidate(package_id):
+    cache.delete(_key(package_id))
+
+
+def get(package_id, fetch):
+    """
+    The package with package_id. On a miss fetch is called to get it from
+    Bango, it should return a dict.
+    """
+    if not settings.BANGO_PACKAGE_CACHE_TIMEOUT:
+        return fetch()
+
+    entry = cache.get(_key(package_id))
+    if entry is None:
+        metrics.incr('solitude_bango_package_cache_total', result='miss')
+        return store(package_id, fetch())
+
+    fetched, package = entry
+    if time.time() - fetched < settings.BANGO_PACKAGE_CACHE_TIMEOUT:
+        metrics.incr('solitude_bango_package_cache_total', result='hit')
+    else:
+        metrics.incr('solitude_bango_package_cache_total', result='stale')
+        refresh_later(package_id, fetch)
+    return package
+
+
+def refresh_later(package_id, fetch):
+    # One refresh at a time, across all the processes.
+    if cache.add(_key(package_id) + ':refreshing', 1, settings.BANGO_TIMEOUT):
+        spawn(refresh, package_id, fetch)
+
+
+def refresh(package_id, fetch):
+    started = time.time()
+    try:
+        package = fetch()
+        entry = cache.get(_key(package_id))
+        # If the package was invalidated or fetched again while this was
+        # running, what's there is newer.
+        if entry is not None and entry[0] < started:
+            store(package_id, package)
+    except Exception:
+        log.exception('Refreshing package {0} failed'.format(package_id))
+    finally:
+        cache.delete(_key(package_id) + ':refreshing')
@@ -1,8 +1,11 @@
 import functools
 import os
+import Queue
+import random
+import sys
 import uuid
 from datetime import datetime
-from time import time
+import time
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
@@ -19,9 +22,12 @@ from suds.transport.http import HttpTransport
 from .constants import (ACCESS_DENIED, HEADERS_ALLOWED,
                         INTERNAL_ERROR, SERVICE_UNAVAILABLE, WSDL_MAP,
                         WSDL_MAP_MANGLED)
-from .errors import (AuthError, BangoError,
-                     BangoUnanticipatedError, ProxyError)
+from .errors import (AuthError, BangoError, BangoUnanticipatedError,
+                     BangoUnavailable, ProxyError)
+from solitude import breakers, bulkheads, metrics
 from solitude.logger import getLogger
+from solitude.middleware import server_timing
+from solitude.workers import spawn
 
 # Add in the list of allowed methods here.
 exporter = [
@@ -56,6 +62,20 @@ token_checker = [
     'CheckToken',
 ]
 
+# Methods that only read from Bango, so it's safe to call them more than
+# once. See retry.
+idempotent = [
+    'CheckToken',
+    'GetAcceptedSBIAgreement',
+    'GetEmailAddresses',
+    'GetPackage',
+    'GetRefundStatus',
+    'GetSBIAgreement',
+]
+
+# The number of calls to a method before its p95 is used as the hedge delay.
+HEDGE_SAMPLES = 20
+
 
 # Status codes from the proxy that raise an error and stop processing.
 FATAL_PROXY_STATUS_CODES = (404, 500,)
@@ -145,6 +165,16 @@ class Client(object):
     def call(self, name, data, wsdl='exporter'):
         log.info('Bango client call: {0}, wsdl: {1}, package: {2}'
                  .format(name, wsdl, data.get('packageId', '<none>')))
+        return retry(name, functools.partial(self.attempt, name, data, wsdl))
+
+    def attempt(self, name, data, wsdl):
+        try:
+            with bulkheads.limit('bango'):
+                return self.send(name, data, wsdl)
+        except bulkheads.Full, exc:
+            raise BangoUnavailable(SERVICE_UNAVAILABLE, exc.detail)
+
+    def send(self, name, data, wsdl):
         client = self.client(wsdl)
 
         package = client.factory.create(get_request(name))
@@ -153,9 +183,24 @@ class Client(object):
         package.username = settings.BANGO_AUTH.get('USER', '')
         package.password = settings.BANGO_AUTH.get('PASSWORD', '')
 
+        breaker = breakers.get('bango', name)
+        if not breaker.allow():
+            raise BangoUnavailable(
+                SERVICE_UNAVAILABLE,
+                'Not calling {0}, Bango keeps failing.'.format(name))
+
         # Actually call Bango.
-        with statsd.timer('solitude.bango.request.%s' % name.lower()):
-            response = getattr(client.service, name)(package)
+        try:
+            with statsd.timer('solitude.bango.request.%s' % name.lower()), \
+                    metrics.timer('solitude_bango_request_seconds',
+                                  method=name.lower()), \
+                    server_timing('bango'):
+                response = getattr(client.service, name)(package)
+        except:
+            breaker.record(False)
+            raise
+        breaker.record(
+            response.responseCode not in (INTERNAL_ERROR, SERVICE_UNAVAILABLE))
 
         self.is_error(response.responseCode, response.responseMessage)
         return response
@@ -168,6 +213,7 @@ class Client(object):
     def is_error(self, code, message):
         # Count the numbers of responses we get.
         statsd.incr('solitude.bango.response.%s' % code.lower())
+        metrics.incr('solitude_bango_response_total', code=code.lower())
         # If there was an error raise it.
         if code == ACCESS_DENIED:
             raise AuthError(ACCESS_DENIED, message)
@@ -182,6 +228,120 @@ class Client(object):
             raise BangoUnanticipatedError(code, message)
 
 
+def retryable(exc):
+    """
+    Bango failed rather than refusing what we sent.
+    """
+    if isinstance(exc, BangoUnavailable):
+        return False
+    if isinstance(exc, BangoError):
+        return exc.id in (INTERNAL_ERROR, SERVICE_UNAVAILABLE)
+    return True
+
+
+def hedge_delay(name):
+    """
+    Seconds to wait for an answer from name before trying again alongside.
+    """
+    histogram = metrics.registry.get(
+        metrics.Histogram, 'solitude_bango_request_seconds',
+        method=name.lower())
+    if histogram.count < HEDGE_SAMPLES:
+        return settings.BANGO_HEDGE_DELAY
+    return histogram.quantile(0.95)
+
+
+def retry(name, func):
+    """
+    Call func, which calls the Bango method name, and return what it
+    returns.
+
+    If the method is idempotent, func is called again after a jittered
+    backoff when Bango fails, up to BANGO_RETRY_ATTEMPTS times in all. If
+    the first call hasn't answered by the p95 of the method, a second one
+    is started alongside and the first answer wins. An error that isn't
+    worth retrying stops any more attempts and is raised once none are
+    running. If nothing has answered after BANGO_RETRY_DEADLINE seconds
+    BangoUnavailable is raised.
+    """
+    attempts = settings.BANGO_RETRY_ATTEMPTS
+    if name not in idempotent or attempts < 2:
+        return func()
+
+    results = Queue.Queue()
+
+    def attempt(number):
+        try:
+            results.put((number, func(), None))
+        except:
+            results.put((number, None, sys.exc_info()))
+
+    start = time.time()
+    deadline = start + settings.BANGO_RETRY_DEADLINE
+    # When the next attempt starts, the first is the hedge.
+    next_attempt = start + hedge_delay(name)
+    spawn(attempt, 1)
+    started, running, failures = 1, 1, 0
+    # The first error that isn't worth retrying.
+    refused = None
+    while True:
+        now = time.time()
+        if next_attempt is not None and now >= next_attempt:
+            kind = 'retry' if failures else 'hedge'
+            log.info('Bango {0} of {1}, attempt {2}'
+                     .format(kind, name, started + 1))
+            metrics.incr('solitude_bango_retry_total', method=name.lower(),
+                         kind=kind)
+            started += 1
+            running += 1
+            spawn(attempt, started)
+            next_attempt = None
+            continue
+
+        if now >= deadline:
+            break
+        wait = deadline - now
+        if next_attempt is not None:
+            wait = min(wait, next_attempt - now)
+        try:
+            number, result, exc_info = results.get(timeout=wait)
+        except Queue.Empty:
+            continue
+
+        running -= 1
+        if exc_info is None:
+            if number > 1:
+                metrics.incr('solitude_bango_retry_won_total',
+                             method=name.lower())
+            return result
+
+        if refused or not retryable(exc_info[1]):
+            # Nothing else is started, but an attempt that is still running
+            # can still answer.
+            refused = refused or exc_info
+            next_attempt = None
+            if not running:
+                raise refused[0], refused[1], refused[2]
+            continue
+
+        failures += 1
+        pause = random.uniform(
+            0, settings.BANGO_RETRY_BACKOFF * 2 ** (failures - 1))
+        if started < attempts and time.time() + pause < deadline:
+            next_attempt = min(next_attempt or deadline, time.time() + pause)
+        elif not running:
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+    if refused:
+        raise refused[0], refused[1], refused[2]
+
+    metrics.incr('solitude_bango_retry_total', method=name.lower(),
+                 kind='deadline')
+    raise BangoUnavailable(SERVICE_UNAVAILABLE,
+                           'No answer to {0} in {1} seconds'
+                           .format(name, settings.BANGO_RETRY_DEADLINE))
+
+
 class Proxy(HttpTransport):
 
     def get_headers(self, url, headers):
@@ -217,7 +377,7 @@ class ClientProxy(Client):
 #
 # Use of time() for ints, mean that tests work and so do requests from the
 # command line using mock. As long as you don't do them too fast.
-ltime = lambda: str(int(time() * 1000000))[8:]
+ltime = lambda: str(int(time.time() * 1000000))[8:]
 mock_data = {
     'CreateBangoNumber': {
         'bango': 'some-bango-number',
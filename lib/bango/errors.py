@@ -1,3 +1,6 @@
+from solitude.errors import ErrorFormatter
+
+
 class BangoError(Exception):
 
     def __init__(self, id, message):
@@ -13,6 +16,24 @@ class AuthError(BangoError):
     """We've got the settings wrong on our end."""
 
 
+class BangoFormatter(ErrorFormatter):
+
+    def format(self):
+        # The same as format_client_error.
+        return {'__all__': [self.error.message], '__bango__': self.error.id,
+                '__type__': 'bango'}
+
+
+class BangoUnavailable(BangoError):
+
+    """
+    Bango kept failing, so calls to it are being refused for a while. See
+    solitude.breakers.
+    """
+    status_code = 503
+    formatter = BangoFormatter
+
+
 class BangoAnticipatedError(BangoError):
 
     """
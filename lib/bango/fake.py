@@ -0,0 +1,135 @@
+"""
+A fake Bango for benchmarks and load tests, run it with the bango_fake
+command.
+
+It answers every method solitude calls on the exporter, billing, direct and
+token checker services with the data the mock client uses, in SOAP replies
+built from the WSDLs in lib/bango/wsdl/test. The method is read from the
+request body, so the same server can be used as BANGO_PROXY or as the
+location of the services themselves.
+
+Errors are returned the way Bango returns them, as an INTERNAL_ERROR or
+SERVICE_UNAVAILABLE response code in an otherwise normal reply.
+"""
+import random
+
+from suds import client as sudsclient
+from suds.mx import Content
+from suds.mx.literal import Literal
+from suds.sax.parser import Parser
+
+from lib.bango import client
+from lib.bango.constants import INTERNAL_ERROR, SERVICE_UNAVAILABLE
+from solitude import fake
+from solitude.logger import getLogger
+
+log = getLogger('s.bango.fake')
+
+STATUSES = {
+    200: '200 OK',
+    404: '404 Not Found',
+}
+
+# Where the mock data doesn't fit the types in the WSDL.
+FAKE_DATA = {
+    'DoRefund': {
+        'refundTransactionId': client.ltime,
+    },
+    'GetAcceptedSBIAgreement': {
+        'acceptedSBIAgreement': '2013-01-23T00:00:00',
+        'sbiAgreementExpires': '2014-01-23T00:00:00',
+    },
+}
+
+WSDLS = {
+    'exporter': client.exporter,
+    'billing': client.billing,
+    'direct': client.direct,
+    'token_checker': client.token_checker,
+}
+
+
+def method_name(body, headers):
+    """
+    The Bango method called, from the first element in the SOAP body or
+    failing that the SOAP action.
+    """
+    if body:
+        try:
+            envelope = Parser().parse(string=body).root()
+            return envelope.getChild('Body').children[0].name
+        except Exception:
+            log.warning('Could not parse the request body')
+    action = headers.get('HTTP_X_SOLITUDE_SOAPACTION',
+                         headers.get('HTTP_SOAPACTION', ''))
+    return action.strip('"').split('/')[-1]
+
+
+class FakeBango(object):
+
+    """
+    The WSGI application. The profile sets the latency and errors of each
+    method, by the Bango method names.
+    """
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.clients = {}
+        self.wsdls = {}
+        for wsdl, methods in WSDLS.items():
+            self.clients[wsdl] = sudsclient.Client(
+                client.get_wsdl(wsdl), cache=client.ReadOnlyCache())
+            for method in methods:
+                self.wsdls[method] = wsdl
+
+    def __call__(self, environ, start_response):
+        status, body = self.respond(environ)
+        start_response(STATUSES[status], [
+            ('Content-Type', 'text/xml; charset=utf-8'),
+            ('Content-Length', str(len(body)))])
+        return [body]
+
+    def respond(self, environ):
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        body = environ['wsgi.input'].read(length) if length else ''
+        name = method_name(body, environ)
+        if name not in self.wsdls:
+            log.warning('No fake for: {0}'.format(name))
+            return 404, ''
+
+        outcome = self.profile.method(name).wait()
+        if outcome == fake.OK:
+            data = client.ClientMock().mock_results(name)
+            data.update(FAKE_DATA.get(name, {}))
+        else:
+            # A request that timed out has already waited for longer than
+            # the client would.
+            code = (SERVICE_UNAVAILABLE if outcome == fake.TIMEOUT
+                    else random.choice([INTERNAL_ERROR, SERVICE_UNAVAILABLE]))
+            data = {'responseCode': code,
+                    'responseMessage': 'Fake {0}'.format(outcome)}
+        return 200, self.reply(name, data).encode('utf-8')
+
+    def reply(self, name, data):
+        """
+        A SOAP envelope with the response to name, with the fields of the
+        result set from data.
+        """
+        suds = self.clients[self.wsdls[name]]
+        method = suds.wsdl.services[0].ports[0].methods[name]
+        binding = method.binding.output
+        element = binding.bodypart_types(method, input=False)[0]
+        response = suds.factory.create('{{{1}}}{0}'.format(*element.qname))
+        result = getattr(response, response.__keylist__[0])
+
+        # The token checker capitalises its fields.
+        fields = dict((field.lower(), field) for field in result.__keylist__)
+        for key, value in data.items():
+            field = fields.get(key.lower())
+            if field is None:
+                continue
+            setattr(result, field, value() if callable(value) else value)
+
+        content = Content(tag=element.name, value=response, type=element)
+        body = Literal(suds.wsdl.schema, xstq=False).process(content)
+        return binding.envelope(binding.header([]), binding.body(body)).str()
@@ -11,7 +11,7 @@ import mobile_codes
 from django_statsd.clients import statsd
 from lxml import etree
 
-from lib.bango.client import get_client
+from lib.bango.client import get_client, retry
 from lib.bango.constants import (COUNTRIES, CURRENCIES, INVALID_PERSON, OK,
                                  RATINGS, RATINGS_SCHEME,
                                  VAT_NUMBER_DOES_NOT_EXIST)
@@ -21,6 +21,7 @@ from lib.transactions.constants import (PROVIDER_BANGO, STATUS_COMPLETED,
                                         TYPE_REFUNDS)
 from lib.transactions.forms import check_status
 from lib.transactions.models import Transaction
+from solitude import metrics
 from solitude.base import log_cef
 from solitude.constants import PAYMENT_METHOD_CHOICES
 from solitude.fields import ListField
@@ -290,14 +291,23 @@ class NotificationForm(forms.Form):
         """
         Use the token service to see if any data has been tampered with.
         """
-        cli = get_client().client('token_checker')
-        with statsd.timer('solitude.bango.request.checktoken'):
-            true_data = cli.service.CheckToken(token=tok)
+        client = get_client()
+
+        def check():
+            cli = client.client('token_checker')
+            with statsd.timer('solitude.bango.request.checktoken'), \
+                    metrics.timer('solitude_bango_request_seconds',
+                                  method='checktoken'):
+                return cli.service.CheckToken(token=tok)
+
+        true_data = retry('CheckToken', check)
         if true_data.ResponseCode is None:
             # Any None field means the token was invalid.
             # This might happen if someone tampered with Token= itself in the
             # query string or if Bango's server was messed up.
             statsd.incr('solitude.bango.response.checktoken_fail')
+            metrics.incr('solitude_bango_response_total',
+                         code='checktoken_fail')
             msg = 'Invalid Bango token: {0}'.format(tok)
             log.error(msg)
             raise forms.ValidationError(msg)
@@ -0,0 +1,65 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from lib.bango.fake import FakeBango
+from solitude import fake
+from solitude.logger import getLogger
+
+log = getLogger('s.bango.fake')
+
+
+class Command(BaseCommand):
+    help = ('Runs a fake Bango server for benchmarks and load tests. Set '
+            'BANGO_PROXY to its URL.')
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--host', dest='host', default='127.0.0.1',
+            help='Host to listen on, default: 127.0.0.1'
+        ),
+        make_option(
+            '--port', dest='port', type='int', default=8003,
+            help='Port to listen on, default: 8003'
+        ),
+        make_option(
+            '--profile', dest='profile', default='fast',
+            choices=sorted(fake.PROFILES.keys()),
+            help='Latency and error profile, default: fast'
+        ),
+        make_option(
+            '--latency', dest='latency', type='float',
+            help='Mean latency in milliseconds, overrides the profile'
+        ),
+        make_option(
+            '--jitter', dest='jitter', type='float',
+            help='Standard deviation of the latency in milliseconds'
+        ),
+        make_option(
+            '--errors', dest='errors', type='float',
+            help='Fraction of requests that fail, for example 0.05'
+        ),
+        make_option(
+            '--timeouts', dest='timeouts', type='float',
+            help='Fraction of requests that hang'
+        ),
+        make_option(
+            '--method', dest='methods', action='append',
+            help='Profile for one method, can be repeated, for example: '
+                 'GetPackage=latency:300,jitter:100,errors:0.05'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        profile = fake.get_profile(
+            options['profile'],
+            **dict((k, options[k])
+                   for k in ['latency', 'jitter', 'errors', 'timeouts']))
+        profile = fake.with_methods(profile, options['methods'])
+        server = fake.server(FakeBango(profile), options['host'],
+                             options['port'])
+        log.info('Fake Bango on http://{0}:{1}/ with {2}'
+                 .format(options['host'], server.server_port, profile))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
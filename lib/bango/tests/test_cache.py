@@ -0,0 +1,77 @@
+from django.core.cache import cache as django_cache
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from mock import Mock, patch
+from nose.tools import eq_, ok_
+
+from lib.bango import cache
+
+
+@override_settings(BANGO_PACKAGE_CACHE_TIMEOUT=60,
+                   BANGO_PACKAGE_CACHE_STALE=600)
+@patch('lib.bango.cache.time.time', lambda: 1000)
+class TestPackageCache(TestCase):
+
+    def setUp(self):
+        django_cache.clear()
+        self.fetch = Mock(return_value={'packageId': 1})
+        # Refresh on the test thread.
+        patcher = patch('lib.bango.cache.spawn',
+                        lambda func, *args: func(*args))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_miss(self):
+        eq_(cache.get(1, self.fetch), {'packageId': 1})
+        eq_(self.fetch.call_count, 1)
+
+    def test_hit(self):
+        cache.get(1, self.fetch)
+        eq_(cache.get(1, self.fetch), {'packageId': 1})
+        eq_(self.fetch.call_count, 1)
+
+    @override_settings(BANGO_PACKAGE_CACHE_TIMEOUT=0)
+    def test_off(self):
+        cache.get(1, self.fetch)
+        cache.get(1, self.fetch)
+        eq_(self.fetch.call_count, 2)
+
+    def test_invalidate(self):
+        cache.get(1, self.fetch)
+        cache.invalidate(1)
+        cache.get(1, self.fetch)
+        eq_(self.fetch.call_count, 2)
+
+    def test_stale(self):
+        cache.get(1, self.fetch)
+        self.fetch.return_value = {'packageId': 2}
+        with patch('lib.bango.cache.time.time', lambda: 1061):
+            # The old one while it is refreshed.
+            eq_(cache.get(1, self.fetch), {'packageId': 1})
+            eq_(cache.get(1, self.fetch), {'packageId': 2})
+        eq_(self.fetch.call_count, 2)
+        ok_(not django_cache.get('bango:package:1:refreshing'))
+
+    def test_refreshing(self):
+        cache.get(1, self.fetch)
+        django_cache.set('bango:package:1:refreshing', 1)
+        with patch('lib.bango.cache.time.time', lambda: 1061):
+            cache.get(1, self.fetch)
+        eq_(self.fetch.call_count, 1)
+
+    def test_refresh_invalidated(self):
+        def fetch():
+            cache.invalidate(1)
+            return {'packageId': 2}
+
+        cache.refresh(1, fetch)
+        eq_(django_cache.get('bango:package:1'), None)
+
+    def test_refresh_fails(self):
+        cache.get(1, self.fetch)
+        django_cache.set('bango:package:1:refreshing', 1)
+        self.fetch.side_effect = ValueError
+        cache.refresh(1, self.fetch)
+        eq_(django_cache.get('bango:package:1')[1], {'packageId': 1})
+        ok_(not django_cache.get('bango:package:1:refreshing'))
@@ -1,21 +1,27 @@
 # -*- coding: utf-8 -*-
 import os
+import threading
 
 from django import test
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
 import mock
-from nose.tools import eq_, raises
+from nose.tools import eq_, ok_, raises
 from suds.options import Options
 from suds.reader import Reader
 
 import samples
 from ..client import (Client, ClientMock, ClientProxy, dict_to_mock,
-                      get_client, get_request, get_wsdl, Proxy, ReadOnlyCache,
-                      response_to_dict)
-from ..constants import ACCESS_DENIED, OK, WSDL_MAP
-from ..errors import AuthError, BangoError, ProxyError
+                      get_client, get_request, get_wsdl, hedge_delay, Proxy,
+                      ReadOnlyCache, response_to_dict, retry)
+from ..constants import (ACCESS_DENIED, INTERNAL_ERROR, OK,
+                         SERVICE_UNAVAILABLE, WSDL_MAP)
+from ..errors import (AuthError, BangoError, BangoUnanticipatedError,
+                      BangoUnavailable, ProxyError)
+from solitude import breakers, bulkheads, metrics
+from solitude.exceptions import custom_exception_handler
+from solitude.middleware import get_transaction_id, set_context
 
 
 class TestClient(test.TestCase):
@@ -126,6 +132,36 @@ class TestProxy(test.TestCase):
             eq_(res.packageId, 1)
             assert 'CreatePackageResponse' in str(res)
 
+    @mock.patch('lib.bango.client.post')
+    def test_breaker(self, post):
+        post.return_value.status_code = 500
+        breakers.breakers.clear()
+        self.addCleanup(breakers.breakers.clear)
+
+        with self.settings(BANGO_PROXY=self.url, CIRCUIT_BREAKERS={
+                'bango': {'failures': 2, 'reset': 30}}):
+            for x in range(2):
+                with self.assertRaises(ProxyError):
+                    self.bango.MakePremiumPerAccess(samples.good_make_premium)
+            with self.assertRaises(BangoUnavailable) as error:
+                self.bango.MakePremiumPerAccess(samples.good_make_premium)
+        eq_(post.call_count, 2)
+
+        res = custom_exception_handler(error.exception)
+        eq_(res.status_code, 503)
+        eq_(res.data['__bango__'], 'SERVICE_UNAVAILABLE')
+        eq_(res.data['__type__'], 'bango')
+
+    @mock.patch('lib.bango.client.post')
+    def test_bulkhead(self, post):
+        with self.settings(BANGO_PROXY=self.url, BULKHEADS={
+                'bango': {'size': 1, 'timeout': 0}}):
+            with bulkheads.limit('bango'):
+                with self.assertRaises(BangoUnavailable) as error:
+                    self.bango.MakePremiumPerAccess(samples.good_make_premium)
+        ok_(not post.called)
+        eq_(error.exception.id, SERVICE_UNAVAILABLE)
+
     def test_headers(self):
         eq_(Proxy().get_headers('http://foo.com', {'SOAPAction': 'foo'}),
             {'x-solitude-soapaction': 'foo',
@@ -189,3 +225,113 @@ class TestBangoWSDL(test.TestCase):
             with self.settings(BANGO_ENV=env):
                 for wsdl_name in mapping.keys():
                     cli.client(wsdl_name)
+
+
+@test.utils.override_settings(BANGO_RETRY_ATTEMPTS=3, BANGO_RETRY_BACKOFF=0,
+                              BANGO_HEDGE_DELAY=10, BANGO_RETRY_DEADLINE=5)
+class TestRetry(test.TestCase):
+
+    def setUp(self):
+        metrics.registry.clear()
+        # Lets slow calls finish once the test is over.
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.raised = threading.Event()
+
+    def func(self, *results):
+        """
+        Returns a function that returns or raises each of results in turn.
+        A result of 'block' makes that call wait until the test is over, one
+        of 'wait' waits until another call has raised.
+        """
+        results = list(results)
+
+        def func():
+            result = results.pop(0)
+            if result == 'block':
+                self.release.wait()
+                result = 'late'
+            if result == 'wait':
+                self.raised.wait(1)
+                result = 'slow'
+            if isinstance(result, Exception):
+                self.raised.set()
+                raise result
+            return result
+
+        return func
+
+    def test_not_idempotent(self):
+        func = self.func(BangoError(INTERNAL_ERROR, ''), 'ok')
+        with self.assertRaises(BangoError):
+            retry('CreatePackage', func)
+
+    @test.utils.override_settings(BANGO_RETRY_ATTEMPTS=1)
+    def test_off(self):
+        with self.assertRaises(BangoError):
+            retry('GetPackage', self.func(BangoError(INTERNAL_ERROR, ''),
+                                          'ok'))
+
+    def test_retried(self):
+        func = self.func(BangoError(INTERNAL_ERROR, ''), ProxyError(), 'ok')
+        eq_(retry('GetPackage', func), 'ok')
+        eq_(metrics.registry.get(
+            metrics.Counter, 'solitude_bango_retry_total',
+            method='getpackage', kind='retry').value, 2)
+
+    def test_gives_up(self):
+        func = self.func(*[BangoError(SERVICE_UNAVAILABLE, str(x))
+                           for x in range(4)])
+        with self.assertRaises(BangoError) as error:
+            retry('GetPackage', func)
+        eq_(error.exception.message, '2')
+
+    def test_not_retried(self):
+        for error in (BangoUnanticipatedError('NOPE', ''),
+                      BangoUnavailable(SERVICE_UNAVAILABLE, '')):
+            with self.assertRaises(type(error)):
+                retry('GetPackage', self.func(error, 'ok'))
+
+    @test.utils.override_settings(BANGO_HEDGE_DELAY=0.01)
+    def test_hedged(self):
+        eq_(retry('CheckToken', self.func('block', 'fast')), 'fast')
+        eq_(metrics.registry.get(
+            metrics.Counter, 'solitude_bango_retry_won_total',
+            method='checktoken').value, 1)
+
+    @test.utils.override_settings(BANGO_HEDGE_DELAY=0.01)
+    def test_hedge_refused(self):
+        # The first attempt can still answer after the hedge is refused.
+        func = self.func('wait', BangoUnavailable(SERVICE_UNAVAILABLE, ''))
+        eq_(retry('CheckToken', func), 'slow')
+
+    @test.utils.override_settings(BANGO_HEDGE_DELAY=0.01)
+    def test_hedge_refused_both_fail(self):
+        func = self.func('wait', BangoUnanticipatedError('NOPE', ''))
+
+        def wait_then_fail():
+            if func() == 'slow':
+                raise BangoError(INTERNAL_ERROR, '')
+
+        with self.assertRaises(BangoUnanticipatedError):
+            retry('CheckToken', wait_then_fail)
+
+    @test.utils.override_settings(BANGO_HEDGE_DELAY=0.01,
+                                  BANGO_RETRY_DEADLINE=0.1)
+    def test_deadline(self):
+        with self.assertRaises(BangoUnavailable) as error:
+            retry('GetPackage', self.func('block', 'block', 'block'))
+        eq_(error.exception.id, SERVICE_UNAVAILABLE)
+
+    def test_context(self):
+        # Attempts on other threads log as part of the request.
+        set_context({'TRANSACTION_ID': 'webpay:some-id'})
+        self.addCleanup(set_context, {})
+        eq_(retry('GetPackage', get_transaction_id), 'webpay:some-id')
+
+    def test_hedge_delay(self):
+        eq_(hedge_delay('GetPackage'), 10)
+        for x in range(20):
+            metrics.observe('solitude_bango_request_seconds', 0.02,
+                            method='getpackage')
+        ok_(0.01 < hedge_delay('GetPackage') <= 0.025)
@@ -0,0 +1,121 @@
+from StringIO import StringIO
+from wsgiref import util
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from mock import Mock, patch
+from nose.tools import eq_, ok_
+
+from lib.bango import client
+from lib.bango.constants import INTERNAL_ERROR, SERVICE_UNAVAILABLE
+from lib.bango.errors import BangoError
+from lib.bango.fake import FakeBango, method_name
+from solitude import fake
+
+
+class Post(object):
+
+    """Sends requests from the proxy straight to the WSGI application."""
+
+    def __init__(self, app):
+        self.app = app
+        self.calls = []
+
+    def __call__(self, url, data='', headers=None, **kw):
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': '/',
+            'CONTENT_LENGTH': str(len(data)),
+            'wsgi.input': StringIO(data),
+        }
+        for key, value in (headers or {}).items():
+            environ['HTTP_' + key.upper().replace('-', '_')] = value
+        util.setup_testing_defaults(environ)
+        self.calls.append(environ)
+
+        response = Mock()
+        start_response = Mock()
+        response.content = ''.join(self.app(environ, start_response))
+        response.status_code = int(start_response.call_args[0][0][:3])
+        return response
+
+
+@override_settings(BANGO_MOCK=False, BANGO_PROXY='http://fake:8003/')
+class TestFake(TestCase):
+
+    def setUp(self):
+        self.profile = fake.Profile()
+        self.post = Post(FakeBango(self.profile))
+        patcher = patch('lib.bango.client.post', self.post)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = client.get_client()
+
+    def test_package(self):
+        res = self.client.CreatePackage({'companyName': 'c'})
+        eq_(res.responseCode, 'OK')
+        ok_(int(res.packageId))
+        res = self.client.GetPackage({'packageId': res.packageId})
+        eq_(res.companyName, 'Some Company')
+        eq_(res.sbiAgreementAccepted, True)
+
+    def test_all(self):
+        for wsdl, methods in (['exporter', client.exporter],
+                              ['billing', client.billing],
+                              ['direct', client.direct]):
+            for method in methods:
+                eq_(self.client.call(method, {}, wsdl=wsdl).responseCode,
+                    'OK')
+
+    def test_check_token(self):
+        cli = self.client.client('token_checker')
+        eq_(cli.service.CheckToken(token='t').ResponseCode, 'OK')
+
+    def test_proxied(self):
+        self.client.GetPackage({'packageId': 1})
+        environ = self.post.calls[0]
+        ok_(environ['HTTP_X_SOLITUDE_SERVICE'].startswith('https://'))
+        ok_(environ['HTTP_X_SOLITUDE_SOAPACTION'].endswith('/GetPackage"'))
+
+    def test_error(self):
+        self.profile.errors = 1
+        with self.assertRaises(BangoError) as error:
+            self.client.GetPackage({'packageId': 1})
+        ok_(error.exception.id in (INTERNAL_ERROR, SERVICE_UNAVAILABLE))
+
+    def test_method_error(self):
+        self.profile.methods['GetPackage'] = fake.Profile(errors=1)
+        self.client.CreatePackage({})
+        with self.assertRaises(BangoError):
+            self.client.GetPackage({'packageId': 1})
+
+    @patch('time.sleep')
+    def test_timeout(self, sleep):
+        self.profile.timeouts = 1
+        with self.assertRaises(BangoError) as error:
+            self.client.GetPackage({'packageId': 1})
+        eq_(error.exception.id, SERVICE_UNAVAILABLE)
+        sleep.assert_called_with(self.profile.timeout)
+
+    def test_unknown(self):
+        environ = {'CONTENT_LENGTH': '0', 'wsgi.input': StringIO('')}
+        util.setup_testing_defaults(environ)
+        start_response = Mock()
+        self.post.app(environ, start_response)
+        eq_(start_response.call_args[0][0], '404 Not Found')
+
+
+class TestMethodName(TestCase):
+
+    def test_body(self):
+        body = ('<?xml version="1.0"?><SOAP-ENV:Envelope xmlns:SOAP-ENV='
+                '"http://schemas.xmlsoap.org/soap/envelope/"><SOAP-ENV:Body>'
+                '<ns0:GetPackage xmlns:ns0="urn:x"/></SOAP-ENV:Body>'
+                '</SOAP-ENV:Envelope>')
+        eq_(method_name(body, {}), 'GetPackage')
+
+    def test_action(self):
+        eq_(method_name('', {'HTTP_SOAPACTION':
+                             '"https://mozilla.bango.net/CheckToken"'}),
+            'CheckToken')
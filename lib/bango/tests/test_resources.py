@@ -4,6 +4,7 @@ from hashlib import md5
 
 from django import test
 from django.conf import settings
+from django.core.cache import cache as django_cache
 from django.core.urlresolvers import reverse
 
 import mock
@@ -11,12 +12,13 @@ from nose.tools import eq_, ok_
 
 import samples
 import utils
-from ..client import ClientMock
+from .. import cache
+from ..client import ClientMock, mock_data
 from ..constants import (ALREADY_REFUNDED, BANGO_ALREADY_PREMIUM_ENABLED,
                          CANT_REFUND, INTERNAL_ERROR, MICRO_PAYMENT_TYPES, OK,
                          PAYMENT_TYPES, PENDING, SBI_ALREADY_ACCEPTED,
-                         STATUS_BAD, STATUS_GOOD)
-from ..errors import BangoError
+                         SERVICE_UNAVAILABLE, STATUS_BAD, STATUS_GOOD)
+from ..errors import BangoError, BangoUnavailable
 from lib.bango.views.base import BangoResource
 from lib.bango.views.refund import RefundViewSet
 from lib.bango.views.status import Status, StatusSerializer
@@ -31,6 +33,7 @@ from lib.transactions.constants import (PROVIDER_BANGO, PROVIDER_REFERENCE,
 from lib.transactions.models import Transaction
 from solitude.base import APITest
 from solitude.constants import PAYMENT_METHOD_ALL, PAYMENT_METHOD_OPERATOR
+from solitude.logger import get_transaction_id
 
 
 class BangoAPI(APITest):
@@ -76,6 +79,11 @@ class TestError(APITest):
         eq_(foo.client_errors(Error('INVALID', 'thing!')).errors,
             {'name': ['thing!'], '__type__': 'bango', '__bango__': 'INVALID'})
 
+    def test_unavailable(self):
+        with self.assertRaises(BangoUnavailable):
+            BangoResource().client_errors(
+                BangoUnavailable(SERVICE_UNAVAILABLE, ''))
+
 
 class TestLoginResource(BangoAPI):
 
@@ -128,6 +136,12 @@ class TestLoginResource(BangoAPI):
         eq_(res.status_code, 400, res.content)
         eq_(self.get_errors(res.content, '__all__'), ['wat'])
 
+    @mock.patch.object(ClientMock, 'mock_results')
+    def test_unavailable(self, mock_results):
+        mock_results.side_effect = BangoUnavailable(SERVICE_UNAVAILABLE, '')
+        res = self.client.post(self.login_url, data={'packageId': 1})
+        eq_(res.status_code, 503, res.content)
+
     @mock.patch.object(ClientMock, 'mock_results')
     def test_good(self, mock_results):
         mock_results.side_effect = self.variable
@@ -295,9 +309,9 @@ class TestPackageResource(BangoAPI):
         self.create()
         res = self.client.patch(self.package_uri, data=data)
         eq_(res.status_code, 201, res.content)
-        eq_([c[0][0] for c in mock_results.call_args_list],
-            ['UpdateFinanceEmailAddress', 'UpdateSupportEmailAddress',
-             'UpdateAddressDetails', 'DeleteVATNumber'])
+        eq_(self.called(mock_results),
+            ['DeleteVATNumber', 'UpdateAddressDetails',
+             'UpdateFinanceEmailAddress', 'UpdateSupportEmailAddress'])
 
     @mock.patch.object(ClientMock, 'mock_results')
     def test_methods_called(self, mock_results):
@@ -305,9 +319,123 @@ class TestPackageResource(BangoAPI):
         self.create()
         res = self.client.patch(self.package_uri, data=self.patch_data())
         eq_(res.status_code, 201, res.content)
-        eq_([c[0][0] for c in mock_results.call_args_list],
-            ['UpdateFinanceEmailAddress', 'UpdateSupportEmailAddress',
-             'UpdateAddressDetails', 'SetVATNumber'])
+        eq_(self.called(mock_results),
+            ['SetVATNumber', 'UpdateAddressDetails',
+             'UpdateFinanceEmailAddress', 'UpdateSupportEmailAddress'])
+
+    def called(self, mock_results):
+        """
+        The methods called after GetPackage, which run at the same time.
+        """
+        names = [c[0][0] for c in mock_results.call_args_list]
+        eq_(names[0], 'GetPackage')
+        return sorted(names[1:])
+
+    def package(self, **kw):
+        package = dict(mock_data['GetPackage'], **self.patch_data())
+        # Left out of the patch, so they are cleared.
+        package.update(self.ok(), address2=None, addressFax=None,
+                       homePageURL=None)
+        package.update(kw)
+        return package
+
+    @mock.patch.object(ClientMock, 'mock_results')
+    def test_unchanged(self, mock_results):
+        mock_results.side_effect = lambda name: (
+            self.package() if name == 'GetPackage' else self.ok())
+        self.create()
+        res = self.client.patch(self.package_uri, data=self.patch_data())
+        eq_(res.status_code, 201, res.content)
+        eq_(self.called(mock_results), [])
+
+    @mock.patch.object(ClientMock, 'mock_results')
+    def test_vat_changed(self, mock_results):
+        mock_results.side_effect = lambda name: (
+            self.package(vatNumber='456')
+            if name == 'GetPackage' else self.ok())
+        self.create()
+        res = self.client.patch(self.package_uri, data=self.patch_data())
+        eq_(res.status_code, 201, res.content)
+        eq_(self.called(mock_results), ['SetVATNumber'])
+
+    @mock.patch.object(ClientMock, 'mock_results')
+    def test_cache_stale(self, mock_results):
+        django_cache.clear()
+        mock_results.side_effect = lambda name: (
+            self.package(vatNumber='456')
+            if name == 'GetPackage' else self.ok())
+        self.create()
+        with self.settings(BANGO_PACKAGE_CACHE_TIMEOUT=300):
+            # The cache says nothing has changed, Bango doesn't.
+            cache.store(self.seller_bango.package_id,
+                        dict(self.patch_data(), address2=None,
+                             addressFax=None, homePageURL=None))
+            res = self.client.patch(self.package_uri,
+                                    data=self.patch_data())
+        eq_(res.status_code, 201, res.content)
+        eq_(self.called(mock_results), ['SetVATNumber'])
+
+    @mock.patch.object(ClientMock, 'mock_results')
+    def test_unchanged_refreshes_cache(self, mock_results):
+        django_cache.clear()
+        mock_results.side_effect = lambda name: (
+            self.package() if name == 'GetPackage' else self.ok())
+        self.create()
+        with self.settings(BANGO_PACKAGE_CACHE_TIMEOUT=300):
+            self.client.patch(self.package_uri, data=self.patch_data())
+            eq_(cache.get(self.seller_bango.package_id, None)['vatNumber'],
+                self.package()['vatNumber'])
+
+    @mock.patch.object(ClientMock, 'mock_results')
+    def test_vat_already_deleted(self, mock_results):
+        mock_results.side_effect = lambda name: (
+            self.package(vatNumber=None) if name == 'GetPackage'
+            else self.ok())
+        self.create()
+        data = self.patch_data()
+        data['vatNumber'] = ''
+        res = self.client.patch(self.package_uri, data=data)
+        eq_(res.status_code, 201, res.content)
+        eq_(self.called(mock_results), [])
+
+    @mock.patch.object(ClientMock, 'mock_results')
+    def test_package_unknown(self, mock_results):
+        mock_results.side_effect = lambda name: (
+            {'responseCode': INTERNAL_ERROR, 'responseMessage': ''}
+            if name == 'GetPackage' else self.ok())
+        self.create()
+        res = self.client.patch(self.package_uri, data=self.patch_data())
+        eq_(res.status_code, 201, res.content)
+        eq_(self.called(mock_results),
+            ['SetVATNumber', 'UpdateAddressDetails',
+             'UpdateFinanceEmailAddress', 'UpdateSupportEmailAddress'])
+
+    @mock.patch.object(ClientMock, 'mock_results')
+    def test_transaction_id(self, mock_results):
+        # The calls run on other threads, with the same request values.
+        seen = set()
+
+        def results(name):
+            seen.add(get_transaction_id())
+            return self.package(vatNumber='456') if name == 'GetPackage' \
+                else self.ok()
+
+        mock_results.side_effect = results
+        self.create()
+        res = self.client.patch(self.package_uri, data=self.patch_data(),
+                                HTTP_TRANSACTION_ID='webpay:some-id')
+        eq_(res.status_code, 201, res.content)
+        eq_(seen, set(['webpay:some-id']))
+
+    @mock.patch.object(ClientMock, 'mock_results')
+    def test_patch_fails(self, mock_results):
+        mock_results.side_effect = lambda name: (
+            {'responseCode': 'INVALID_COUNTRYISO', 'responseMessage': ''}
+            if name == 'UpdateAddressDetails' else self.ok())
+        self.create()
+        res = self.client.patch(self.package_uri, data=self.patch_data())
+        eq_(res.status_code, 400, res.content)
+        eq_(res.json['countryIso'], [''])
 
     def test_get_full(self):
         self.create()
@@ -316,6 +444,23 @@ class TestPackageResource(BangoAPI):
         data = res.json
         eq_(data['full']['countryIso'], 'BMU')
 
+    @mock.patch.object(ClientMock, 'call', wraps=ClientMock().call)
+    def test_get_full_cached(self, call):
+        django_cache.clear()
+        self.create()
+        url = self.seller_bango.get_uri()
+        with self.settings(BANGO_PACKAGE_CACHE_TIMEOUT=300):
+            for x in range(2):
+                res = self.client.get_with_body(url, data={'full': True})
+                eq_(res.json['full']['countryIso'], 'BMU')
+            eq_(call.call_count, 1)
+
+            # Changing the package fetches it again.
+            self.client.patch(self.package_uri, data=self.patch_data())
+            call.reset_mock()
+            self.client.get_with_body(url, data={'full': True})
+            eq_(call.call_count, 1)
+
 
 class TestBangoProduct(BangoAPI):
 
@@ -373,6 +518,13 @@ class TestBangoProduct(BangoAPI):
         eq_(res.json['meta']['total_count'], 1, res.json)
         eq_(res.json['objects'][0]['bango_id'], 'sample:bangoid')
 
+    def test_get_queries(self):
+        self.create()
+        url = '/bango/product/%s/' % self.sellers.product_bango.pk
+        # The product bango, seller product and seller bango.
+        with self.query_budget(3):
+            eq_(self.client.get(url).status_code, 200)
+
 
 class SellerProductBangoBase(BangoAPI):
 
@@ -426,6 +578,14 @@ class TestBangoMarkPremium(SellerProductBangoBase):
         res = self.client.post(self.list_url, data=data)
         eq_(res.status_code, 400)
 
+    @mock.patch.object(ClientMock, 'mock_results')
+    def test_unavailable(self, mock_results):
+        data = self.create()
+        mock_results.side_effect = BangoUnavailable(SERVICE_UNAVAILABLE, '')
+        res = self.client.post(self.list_url, data=data)
+        eq_(res.status_code, 503, res.content)
+        eq_(res.json['__bango__'], SERVICE_UNAVAILABLE)
+
     @mock.patch.object(ClientMock, 'mock_results')
     def test_done_twice(self, mock_results):
         data = self.create()
@@ -586,6 +746,14 @@ class TestCreateBankConfiguration(BangoAPI):
         res = self.client.post(self.list_url, data=data)
         eq_(res.status_code, 200, res.content)
 
+    @mock.patch('lib.bango.views.bank.cache')
+    def test_invalidates(self, cache):
+        self.create()
+        data = samples.good_bank_details.copy()
+        data['seller_bango'] = self.seller_bango_uri
+        self.client.post(self.list_url, data=data)
+        cache.invalidate.assert_called_with(self.seller_bango.package_id)
+
 
 class TestGetSBI(BangoAPI):
 
@@ -626,6 +794,13 @@ class TestGetSBI(BangoAPI):
         eq_(data['expires'], '2014-01-23 00:00:00')
         eq_(str(self.seller_bango.reget().sbi_expires), '2014-01-23 00:00:00')
 
+    @mock.patch('lib.bango.views.sbi.cache')
+    def test_post_invalidates(self, cache):
+        self.create()
+        self.client.post(self.list_url,
+                         data={'seller_bango': self.seller_bango_uri})
+        cache.invalidate.assert_called_with(self.seller_bango.package_id)
+
     @mock.patch.object(ClientMock, 'mock_results')
     def test_post_already(self, mock_results):
         mock_results.return_value = {'responseCode': SBI_ALREADY_ACCEPTED,
@@ -6,7 +6,7 @@ import os
 from django.conf import settings
 from django.template.loader import render_to_string
 
-from aesfield.default import lookup
+from solitude.aes import lookup
 
 terms_directory = 'lib/bango/templates/bango/terms'
 
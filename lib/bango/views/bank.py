@@ -1,6 +1,7 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
+from lib.bango import cache
 from lib.bango.errors import BangoError, ProcessError
 from lib.bango.forms import CreateBankDetailsForm
 from lib.bango.serializers import SellerBangoOnly
@@ -29,5 +30,7 @@ def bank(request):
         view.client('CreateBankDetails', data)
     except BangoError, exc:
         return view.client_errors(exc)
+    finally:
+        cache.invalidate(data['packageId'])
 
     return Response(form.cleaned_data)
@@ -3,7 +3,7 @@ from rest_framework.response import Response
 from lib.bango.client import format_client_error, get_client
 from lib.bango.errors import (
     BangoAnticipatedError, BangoImmediateError, BangoUnanticipatedError,
-    ProcessError)
+    BangoUnavailable, ProcessError)
 from solitude.base import format_form_errors
 
 
@@ -43,6 +43,10 @@ class BangoResource(object):
         return serial, form
 
     def client_errors(self, exc):
+        if isinstance(exc, BangoUnavailable):
+            # Not something the caller can fix, the exception handler turns
+            # it into a 503.
+            raise exc
         key = getattr(self, 'error_lookup', {}).get(exc.id, '__all__')
         return format_client_error(key, exc)
 
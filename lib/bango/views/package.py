@@ -1,8 +1,13 @@
+from django.conf import settings
+
 from rest_framework.response import Response
 
+from .. import cache
 from ..client import response_to_dict
-from ..constants import INVALID_PERSON, VAT_NUMBER_DOES_NOT_EXIST
-from ..errors import BangoAnticipatedError, ProcessError
+from ..constants import (INVALID_PERSON, SERVICE_UNAVAILABLE,
+                         VAT_NUMBER_DOES_NOT_EXIST)
+from ..errors import (BangoAnticipatedError, BangoError, BangoUnavailable,
+                      ProcessError)
 from ..forms import (FinanceEmailForm, PackageForm,
                      SupportEmailForm, UpdateAddressForm,
                      VatNumberForm)
@@ -10,6 +15,23 @@ from lib.bango.serializers import PackageSerializer, SellerBangoSerializer
 from lib.bango.views.base import BangoResource
 from lib.sellers.models import SellerBango
 from solitude.base import NonDeleteModelViewSet
+from solitude.logger import getLogger
+from solitude.workers import spawn, Timeout
+
+log = getLogger('s.bango')
+
+
+def changed(form, package):
+    """
+    True if the form has data that differs from the package, or the package
+    is unknown. Bango leaves out empty fields, so None and '' are the same.
+    """
+    for field, value in form.cleaned_data.items():
+        if field not in package:
+            return True
+        if unicode(package[field] or '') != unicode(value or ''):
+            return True
+    return False
 
 
 class PackageViewSet(NonDeleteModelViewSet, BangoResource):
@@ -53,8 +75,8 @@ class PackageViewSet(NonDeleteModelViewSet, BangoResource):
         """
         Update the Bango records and then our record. We'll assume that
         any data that is sent in the patch is optional, if ignored, we won't
-        update. We also don't know what the old value is, we just assume if
-        its there its an update.
+        update. Only the Bango methods for data that differs from the
+        package in Bango are called, at the same time.
         """
         if kw.get('partial') is not True:
             return Response(status=405)
@@ -72,29 +94,61 @@ class PackageViewSet(NonDeleteModelViewSet, BangoResource):
             if not form.is_valid():
                 return self.form_errors(form)
 
-        for form in forms:
-            data = form.bango_data
-            keys = form.bango_meta
-            data['packageId'] = obj.package_id
-            try:
-                result = self.client(keys['method'], data,
-                                     raise_on=keys.get('raise_on', None))
-            except BangoAnticipatedError, exc:
-                # We don't know the persons email account, we only
-                # know that Bango might not like it if its unchanged.
-                if exc.id not in (INVALID_PERSON, VAT_NUMBER_DOES_NOT_EXIST):
-                    raise
-            else:
-                if keys.get('to_field'):
-                    # Only change the model in some cases.
-                    setattr(obj, keys.get('to_field'),
-                            getattr(result, keys.get('from_field')))
+        package = self.package(obj.package_id)
+        calls = []
+        try:
+            for form in forms:
+                if not changed(form, package):
+                    continue
+                data = form.bango_data
+                keys = form.bango_meta
+                data['packageId'] = obj.package_id
+                calls.append((keys, spawn(self.client, keys['method'], data,
+                                          raise_on=keys.get('raise_on'))))
+
+            for keys, future in calls:
+                try:
+                    result = future.result(settings.BANGO_TIMEOUT)
+                except Timeout:
+                    raise BangoUnavailable(
+                        SERVICE_UNAVAILABLE,
+                        'No answer to {0} in {1} seconds'.format(
+                            keys['method'], settings.BANGO_TIMEOUT))
+                except BangoAnticipatedError, exc:
+                    # We don't know the persons email account, we only
+                    # know that Bango might not like it if its unchanged.
+                    if exc.id not in (INVALID_PERSON,
+                                      VAT_NUMBER_DOES_NOT_EXIST):
+                        raise
+                else:
+                    if keys.get('to_field'):
+                        # Only change the model in some cases.
+                        setattr(obj, keys.get('to_field'),
+                                getattr(result, keys.get('from_field')))
+        finally:
+            # Even if some of the calls failed, others might have worked.
+            if calls:
+                cache.invalidate(obj.package_id)
 
         obj.save()
         new_serial = SellerBangoSerializer(obj).data.copy()
-        new_serial.update(form.cleaned_data)
+        new_serial.update(forms[-1].cleaned_data)
         return Response(new_serial, status=201)
 
+    def package(self, package_id):
+        """
+        The package as Bango has it, or an empty dict if Bango won't say.
+        This doesn't read the cache, a stale package would skip changes, but
+        it does refresh it.
+        """
+        try:
+            return cache.store(package_id, response_to_dict(
+                self.client('GetPackage', {'packageId': package_id})))
+        except BangoError:
+            log.warning('Could not get package: {0}, updating everything'
+                        .format(package_id), exc_info=True)
+            return {}
+
     def retrieve(self, request, *args, **kw):
         """
         Retrive the seller bango data, but if a 'full' is specified,
@@ -105,10 +159,8 @@ class PackageViewSet(NonDeleteModelViewSet, BangoResource):
         data = self.get_serializer(self.object).data
         data['full'] = {}
         if request.DATA.get('full'):
-            data['full'] = response_to_dict(
-                self.client(
-                    'GetPackage',
-                    {'packageId': self.object.package_id}
-                )
-            )
+            data['full'] = cache.get(
+                self.object.package_id,
+                lambda: response_to_dict(self.client(
+                    'GetPackage', {'packageId': self.object.package_id})))
         return Response(data)
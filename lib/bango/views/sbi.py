@@ -1,6 +1,7 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
+from lib.bango import cache
 from lib.bango.constants import SBI_ALREADY_ACCEPTED
 from lib.bango.errors import BangoAnticipatedError
 from lib.bango.serializers import EasyObject, SBISerializer, SellerBangoOnly
@@ -28,6 +29,9 @@ def sbi_post(view, request):
     except BangoAnticipatedError, exc:
         if exc.id != SBI_ALREADY_ACCEPTED:
             raise
+    finally:
+        # The package says if the agreement was accepted.
+        cache.invalidate(data['packageId'])
 
     res = view.client('GetAcceptedSBIAgreement', data)
     seller_bango = serial.object['seller_bango']
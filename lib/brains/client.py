@@ -1,15 +1,24 @@
+import threading
 from urlparse import urlparse
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
 import braintree
+import requests
 from django_statsd.clients import statsd
 
+from lib.brains.errors import BraintreeUnavailable
+from solitude import breakers, bulkheads, metrics
 from solitude.logger import getLogger
+from solitude.middleware import server_timing
 
 log = getLogger('s.brains')
 
+_lock = threading.Lock()
+_client = None
+_session = None
+
 
 class AuthEnvironment(braintree.environment.Environment):
 
@@ -17,49 +26,151 @@ class AuthEnvironment(braintree.environment.Environment):
         self._url = urlparse(settings.BRAINTREE_PROXY)
         self._real = real
 
+        secure = self._url.scheme == 'https'
         super(AuthEnvironment, self).__init__(
-            self._url.hostname, self._url.port, '',
-            self._url.scheme == 'https', None)
+            self._url.hostname, self._url.port or (443 if secure else 80),
+            '', secure, None)
+
 
+environments = {
+    'sandbox': braintree.environment.Environment.Sandbox,
+    'production': braintree.environment.Environment.Production,
+}
 
-AuthSandbox = AuthEnvironment(braintree.environment.Environment.Sandbox)
-AuthProduction = AuthEnvironment(braintree.environment.Environment.Production)
+
+def get_session():
+    """
+    A requests session shared by the process, so connections to the
+    solitude-auth server are kept alive and reused.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.session(config={
+                'keep_alive': True,
+                'pool_connections': 1,
+                'pool_maxsize': settings.BRAINTREE_POOL_SIZE,
+            })
+        return _session
+
+
+def method(verb, path):
+    """
+    The name of the breaker for a call, the verb and the kind of object, for
+    example: post.customers from POST /merchants/id/customers.
+    """
+    parts = path.strip('/').split('/')
+    if parts[0] == 'merchants':
+        parts = parts[2:]
+    return '{0}.{1}'.format(verb.lower(), parts[0] if parts else '')
 
 
 class Http(braintree.util.http.Http):
 
     def http_do(self, verb, path, headers, body):
+        try:
+            with bulkheads.limit('braintree'):
+                return self.send(verb, path, headers, body)
+        except bulkheads.Full, exc:
+            raise BraintreeUnavailable(exc.detail)
+
+    def send(self, verb, path, headers, body):
+        breaker = breakers.get('braintree', method(verb, path))
+        if not breaker.allow():
+            raise BraintreeUnavailable(
+                'Not calling {0}, Braintree keeps failing.'.format(breaker))
+
         # Tell solitude-auth where we really want this request to go to.
         headers['x-solitude-service'] = self.environment._real.base_url + path
         # Set the URL of the request to point to the auth server.
         path = self.environment._url.path
 
-        with statsd.timer('solitude.braintree.api'):
-            status, text = super(Http, self).http_do(verb, path, headers, body)
+        try:
+            with statsd.timer('solitude.braintree.api'), \
+                    metrics.timer('solitude_braintree_request_seconds'), \
+                    server_timing('braintree'):
+                response = get_session().request(
+                    verb, self.environment.base_url + path,
+                    headers=headers,
+                    data=body,
+                    verify=self.environment.ssl_certificate,
+                    timeout=self.config.timeout)
+        except:
+            breaker.record(False)
+            raise
+        status = response.status_code
+        breaker.record(status < 500)
         statsd.incr('solitude.braintree.response.{0}'.format(status))
-        return status, text
+        metrics.incr('solitude_braintree_response_total', status=status)
+        return status, response.text
+
+
+class ClientToken(object):
+
+    """
+    ClientToken.generate as the braintree module has it, which fills in
+    defaults the gateway doesn't.
+    """
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+
+    def generate(self, params=None):
+        return braintree.ClientToken.generate(
+            dict(params or {}), gateway=self.gateway.client_token)
+
+
+class Client(object):
+
+    """
+    The parts of the braintree module solitude uses, bound to one gateway.
+    """
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+        self.ClientToken = ClientToken(gateway)
+        self.Customer = gateway.customer
+        self.PaymentMethod = gateway.payment_method
+        self.Plan = gateway.plan
+        self.Subscription = gateway.subscription
+        self.WebhookNotification = gateway.webhook_notification
+
+
+def reset():
+    """
+    Forget the client, the next call to get_client creates a new one. Tests
+    that patch the braintree gateway classes need to call this.
+    """
+    global _client
+    with _lock:
+        _client = None
 
 
 def get_client():
     """
     Use this to get the right client and communicate with Braintree.
-    """
-    environments = {
-        'sandbox': AuthSandbox,
-        'production': AuthProduction,
-    }
 
+    The client is created once per process and shared between threads.
+    """
+    global _client
     if not settings.BRAINTREE_PROXY:
         raise ImproperlyConfigured('BRAINTREE_PROXY must be set.')
 
     if not settings.BRAINTREE_MERCHANT_ID:
         raise ImproperlyConfigured('BRAINTREE_MERCHANT_ID must be set.')
 
-    braintree.Configuration.configure(
-        environments[settings.BRAINTREE_ENVIRONMENT],
-        settings.BRAINTREE_MERCHANT_ID,
-        'public key added by solitude-auth',
-        'private key added by solitude-auth',
-        http_strategy=Http
-    )
-    return braintree
+    # Keyed on the settings, so changing them gets a new client.
+    key = (settings.BRAINTREE_ENVIRONMENT, settings.BRAINTREE_MERCHANT_ID,
+           settings.BRAINTREE_PROXY)
+    with _lock:
+        if _client is None or _client[0] != key:
+            # Created here, so it uses the current BRAINTREE_PROXY.
+            config = braintree.Configuration(
+                AuthEnvironment(environments[settings.BRAINTREE_ENVIRONMENT]),
+                settings.BRAINTREE_MERCHANT_ID,
+                'public key added by solitude-auth',
+                'private key added by solitude-auth',
+                http_strategy=Http
+            )
+            _client = (key, Client(braintree.BraintreeGateway(config)))
+        return _client[1]
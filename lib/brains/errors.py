@@ -74,3 +74,26 @@ class BraintreeResultError(Exception):
 
     def __init__(self, result):
         self.result = result
+
+
+class UnavailableFormatter(ErrorFormatter):
+
+    def format(self):
+        return {'braintree': {NON_FIELD_ERRORS: [{
+            'code': 'service_unavailable',
+            'message': self.error.message
+        }]}}
+
+
+class BraintreeUnavailable(BraintreeResultError):
+
+    """
+    Braintree kept failing, so calls to it are being refused for a while. See
+    solitude.breakers.
+    """
+    status_code = 503
+    formatter = UnavailableFormatter
+
+    def __init__(self, message):
+        super(BraintreeUnavailable, self).__init__(None)
+        self.message = message
@@ -0,0 +1,231 @@
+"""
+A fake Braintree for benchmarks and load tests, run it with the
+braintree_fake command.
+
+It stands in for the solitude-auth server as well as Braintree, so point
+BRAINTREE_PROXY at it. Requests to the proxy are answered from the
+x-solitude-service header, the same way solitude-auth forwards them. The
+/parse and /verify endpoints solitude-auth provides for webhooks are there
+too. It only speaks the parts of the Braintree API solitude uses.
+
+A sample webhook, signed with the fake keys, can be fetched from::
+
+    /webhook?kind=subscription_charged_successfully&id=<subscription id>
+"""
+import json
+import random
+import re
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from urlparse import parse_qs, urlparse
+
+from braintree.util.crypto import Crypto
+from braintree.util.xml_util import XmlUtil
+from payments_config import products
+
+from solitude import fake
+from solitude.logger import getLogger
+
+log = getLogger('s.brains.fake')
+
+STATUSES = {
+    200: '200 OK',
+    201: '201 Created',
+    204: '204 No Content',
+    404: '404 Not Found',
+    500: '500 Internal Server Error',
+    503: '503 Service Unavailable',
+}
+
+# Webhook kinds and the status of the transaction on them.
+TRANSACTION_STATUSES = {
+    'subscription_charged_successfully': 'settled',
+    'subscription_charged_unsuccessfully': 'processor_declined',
+}
+
+
+def short_id():
+    return uuid.uuid4().hex[:8]
+
+
+def timestamps():
+    now = datetime.utcnow().replace(microsecond=0)
+    return {'created_at': now, 'updated_at': now}
+
+
+def subscription(subscription_id, plan_id='', token='', status='Active',
+                 transactions=None):
+    today = datetime.utcnow().date()
+    price = products[plan_id].amount if plan_id in products else Decimal(0)
+    data = {
+        'id': subscription_id,
+        'add_ons': [],
+        'billing_period_end_date': today + timedelta(days=29),
+        'billing_period_start_date': today,
+        'discounts': [],
+        'next_billing_date': today + timedelta(days=30),
+        'next_billing_period_amount': price,
+        'payment_method_token': token,
+        'plan_id': plan_id,
+        'price': price,
+        'status': status,
+        'transactions': transactions or [],
+    }
+    data.update(timestamps())
+    return data
+
+
+class FakeBraintree(object):
+
+    """
+    The WSGI application. The profile sets the latency and errors of each
+    route, by the names in routes.
+    """
+    routes = [
+        ('POST', r'^/customers/?$', 'customer'),
+        ('POST', r'^/payment_methods/?$', 'payment_method'),
+        ('DELETE', r'^/payment_methods/any/(?P<token>[^/]+)$',
+         'payment_method_delete'),
+        ('POST', r'^/subscriptions/?$', 'subscription'),
+        ('PUT', r'^/subscriptions/(?P<subscription_id>[^/]+)/cancel$',
+         'subscription_cancel'),
+        ('PUT', r'^/subscriptions/(?P<subscription_id>[^/]+)$',
+         'subscription_update'),
+        ('POST', r'^/client_token$', 'client_token'),
+        ('GET', r'^/plans/?$', 'plans'),
+    ]
+
+    def __init__(self, profile, public_key='fake-public-key',
+                 private_key='fake-private-key'):
+        self.profile = profile
+        self.public_key = public_key
+        self.private_key = private_key
+        self.compiled = [(verb, re.compile(pattern), name)
+                         for verb, pattern, name in self.routes]
+
+    def __call__(self, environ, start_response):
+        status, body, content_type = self.respond(environ)
+        start_response(STATUSES[status], [
+            ('Content-Type', content_type),
+            ('Content-Length', str(len(body)))])
+        return [body]
+
+    def respond(self, environ):
+        path = environ.get('PATH_INFO', '')
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        if path.endswith('/parse'):
+            # Let every webhook through.
+            return 204, '', 'text/plain'
+        if path.endswith('/verify'):
+            return 200, self.verify(query['bt_challenge'][0]), 'text/plain'
+        if path.endswith('/webhook'):
+            return 200, json.dumps(self.webhook(
+                query['kind'][0], query['id'][0])), 'application/json'
+
+        # Where solitude-auth would send the request, or this server if
+        # it's used directly.
+        service = environ.get('HTTP_X_SOLITUDE_SERVICE')
+        if service:
+            path = urlparse(service).path
+        path = re.sub(r'^/merchants/[^/]+', '', path)
+
+        verb = environ['REQUEST_METHOD']
+        for route_verb, pattern, name in self.compiled:
+            match = pattern.match(path)
+            if route_verb == verb and match:
+                break
+        else:
+            log.warning('No fake for: {0} {1}'.format(verb, path))
+            return 404, '', 'text/plain'
+
+        outcome = self.profile.method(name).wait()
+        if outcome != fake.OK:
+            return random.choice([500, 503]), '', 'text/plain'
+
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        body = environ['wsgi.input'].read(length) if length else ''
+        params = XmlUtil.dict_from_xml(body) if body else {}
+        status, data = getattr(self, name)(params, **match.groupdict())
+        xml = XmlUtil.xml_from_dict(data) if data else ''
+        # Unicode if any of the values from the request were.
+        return status, xml.encode('utf-8'), 'application/xml'
+
+    def customer(self, params):
+        data = {'id': short_id(), 'credit_cards': [], 'paypal_accounts': []}
+        data.update(timestamps())
+        return 201, {'customer': data}
+
+    def payment_method(self, params):
+        method = params.get('payment_method', {})
+        data = {
+            'token': short_id(),
+            'card_type': 'Visa',
+            'customer_id': method.get('customer_id', ''),
+            'default': True,
+            'last_4': '1111',
+            'subscriptions': [],
+        }
+        data.update(timestamps())
+        return 201, {'credit_card': data}
+
+    def payment_method_delete(self, params, token):
+        return 200, None
+
+    def subscription(self, params):
+        sub = params.get('subscription', {})
+        return 201, {'subscription': subscription(
+            short_id(), sub.get('plan_id', ''),
+            sub.get('payment_method_token', ''))}
+
+    def subscription_update(self, params, subscription_id):
+        sub = params.get('subscription', {})
+        return 200, {'subscription': subscription(
+            subscription_id, token=sub.get('payment_method_token', ''))}
+
+    def subscription_cancel(self, params, subscription_id):
+        return 200, {'subscription': subscription(
+            subscription_id, status='Canceled')}
+
+    def client_token(self, params):
+        return 201, {'client_token': {'value': uuid.uuid4().hex}}
+
+    def plans(self, params):
+        return 200, {'plans': [
+            dict(timestamps(), id=product.id, price=product.amount,
+                 currency_iso_code=product.currency)
+            for product in products.values()]}
+
+    def sign(self, content):
+        return '{0}|{1}'.format(
+            self.public_key, Crypto.sha1_hmac_hash(self.private_key, content))
+
+    def verify(self, challenge):
+        return self.sign(challenge)
+
+    def webhook(self, kind, subscription_id):
+        """
+        A sample webhook for the subscription, with one transaction if the
+        kind has one.
+        """
+        transactions = []
+        if kind in TRANSACTION_STATUSES:
+            transaction = {
+                'id': short_id(),
+                'amount': Decimal('10.00'),
+                'currency_iso_code': 'USD',
+                'processor_response_code': '2000',
+                'status': TRANSACTION_STATUSES[kind],
+                'tax_amount': None,
+                'type': 'sale',
+            }
+            transaction.update(timestamps())
+            transactions.append(transaction)
+
+        payload = XmlUtil.xml_from_dict({'notification': {
+            'kind': kind,
+            'timestamp': datetime.utcnow(),
+            'subject': {'subscription': subscription(
+                subscription_id, transactions=transactions)},
+        }}).encode('base64')
+        return {'bt_signature': self.sign(payload), 'bt_payload': payload}
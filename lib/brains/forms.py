@@ -1,12 +1,13 @@
 from django import forms
 from django.conf import settings
-from django.core.exceptions import ObjectDoesNotExist
 
 import requests
 
 from lib.brains.models import (
     BraintreeBuyer, BraintreePaymentMethod, BraintreeSubscription)
+from lib.buyers import cache as buyers_cache
 from lib.buyers.models import Buyer
+from lib.sellers import cache as sellers_cache
 from lib.sellers.models import SellerProduct
 from payments_config import products
 from solitude.base import getLogger
@@ -21,16 +22,20 @@ class BuyerForm(forms.Form):
     def clean_uuid(self):
         data = self.cleaned_data['uuid']
 
-        try:
-            self.buyer = Buyer.objects.get(uuid=data)
-        except ObjectDoesNotExist:
+        record = buyers_cache.lookup(data)
+        if record is None:
             raise forms.ValidationError('Buyer does not exist.',
                                         code='does_not_exist')
 
-        if BraintreeBuyer.objects.filter(buyer=self.buyer).exists():
+        # The record can be stale, so when it says there isn't a Braintree
+        # buyer check again before one is created.
+        if (record['braintree_pk'] or BraintreeBuyer.objects
+                .filter(buyer=record['pk']).exists()):
             raise forms.ValidationError('Braintree buyer already exists.',
                                         code='already_exists')
 
+        self.buyer = Buyer.from_values(id=record['pk'], uuid=data,
+                                       active=record['active'])
         return data
 
 
@@ -41,24 +46,31 @@ class PaymentMethodForm(forms.Form):
     def clean_buyer_uuid(self):
         data = self.cleaned_data['buyer_uuid']
 
-        try:
-            self.buyer = Buyer.objects.get(uuid=data)
-        except ObjectDoesNotExist:
+        record = buyers_cache.lookup(data)
+        if record is None:
             raise forms.ValidationError('Buyer does not exist.',
                                         code='does_not_exist')
 
-        try:
-            self.braintree_buyer = self.buyer.braintreebuyer
-        except ObjectDoesNotExist:
+        if not record['braintree_pk']:
             raise forms.ValidationError('Braintree buyer does not exist.',
                                         code='does_not_exist')
 
+        self.buyer = Buyer.from_values(id=record['pk'], uuid=data,
+                                       active=record['active'])
+        self.braintree_buyer = BraintreeBuyer.from_values(
+            id=record['braintree_pk'], buyer_id=record['pk'],
+            braintree_id=record['braintree_id'],
+            active=record['braintree_active'])
+        self.braintree_buyer.buyer = self.buyer
+
         # Ideally this should be limited by the type of method
         # as well, something we'll need to remember when we add in another
         # payment method. However, we don't know the type until the reply
-        # comes from Braintree.
-        if (self.braintree_buyer.paymethods.filter(active=True).count()
-                >= settings.BRAINTREE_MAX_METHODS):
+        # comes from Braintree. The count in the record can be stale, so
+        # this counts them again.
+        if (BraintreePaymentMethod.objects
+                .filter(braintree_buyer=record['braintree_pk'], active=True)
+                .count() >= settings.BRAINTREE_MAX_METHODS):
             raise forms.ValidationError(
                 'Reached maximum number of payment methods',
                 code='max_size')
@@ -86,16 +98,18 @@ class SubscriptionForm(forms.Form):
     def clean_plan(self):
         data = self.cleaned_data['plan']
 
-        try:
-            obj = SellerProduct.objects.get(public_id=data)
-        except ObjectDoesNotExist:
+        record = sellers_cache.lookup(data)
+        if record is None:
             log.info(
                 'no seller product with braintree plan id: {plan}'
                 .format(plan=data))
             raise forms.ValidationError(
                 'Seller product does not exist.', code='does_not_exist')
 
-        self.seller_product = obj
+        self.seller_product = SellerProduct.from_values(
+            id=record['pk'], public_id=data,
+            external_id=record['external_id'], access=record['access'],
+            seller_id=record['seller_pk'])
         return data
 
     def format_descriptor(self, name):
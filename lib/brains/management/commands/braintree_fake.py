@@ -0,0 +1,59 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from lib.brains.fake import FakeBraintree
+from solitude import fake
+from solitude.logger import getLogger
+
+log = getLogger('s.brains.fake')
+
+
+class Command(BaseCommand):
+    help = ('Runs a fake Braintree and solitude-auth server for benchmarks '
+            'and load tests. Set BRAINTREE_PROXY to its URL.')
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--host', dest='host', default='127.0.0.1',
+            help='Host to listen on, default: 127.0.0.1'
+        ),
+        make_option(
+            '--port', dest='port', type='int', default=8002,
+            help='Port to listen on, default: 8002'
+        ),
+        make_option(
+            '--profile', dest='profile', default='fast',
+            choices=sorted(fake.PROFILES.keys()),
+            help='Latency and error profile, default: fast'
+        ),
+        make_option(
+            '--latency', dest='latency', type='float',
+            help='Mean latency in milliseconds, overrides the profile'
+        ),
+        make_option(
+            '--jitter', dest='jitter', type='float',
+            help='Standard deviation of the latency in milliseconds'
+        ),
+        make_option(
+            '--errors', dest='errors', type='float',
+            help='Fraction of requests that fail, for example 0.05'
+        ),
+        make_option(
+            '--timeouts', dest='timeouts', type='float',
+            help='Fraction of requests that hang'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        profile = fake.get_profile(
+            options['profile'],
+            **dict((k, options[k])
+                   for k in ['latency', 'jitter', 'errors', 'timeouts']))
+        server = fake.server(FakeBraintree(profile), options['host'],
+                             options['port'])
+        log.info('Fake Braintree on http://{0}:{1}/ with {2}'
+                 .format(options['host'], server.server_port, profile))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
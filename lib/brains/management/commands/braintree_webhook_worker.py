@@ -0,0 +1,52 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from lib.brains import webhooks
+from lib.brains.models import BraintreeWebhook
+from solitude.constants import WEBHOOK_FAILED, WEBHOOK_PENDING
+from solitude.logger import getLogger
+
+log = getLogger('s.webhooks')
+
+
+class Command(BaseCommand):
+    help = ('Processes the Braintree webhooks stored when '
+            'BRAINTREE_WEBHOOK_ASYNC is on.')
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--once', action='store_true', dest='once',
+            help='Process the pending webhooks and exit'
+        ),
+        make_option(
+            '--retry-failed', action='store_true', dest='retry_failed',
+            help='Process the webhooks that failed again'
+        ),
+        make_option(
+            '--limit', action='store', type='int', dest='limit', default=100,
+            help='The most webhooks to process at a time, default: 100'
+        ),
+        make_option(
+            '--sleep', action='store', type='float', dest='sleep', default=1,
+            help=('Seconds to wait when there is nothing to process, '
+                  'default: 1')
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            retried = (BraintreeWebhook.objects.filter(status=WEBHOOK_FAILED)
+                       .update(status=WEBHOOK_PENDING,
+                               counter=F('counter') + 1))
+            log.info('Retrying {0} failed webhooks'.format(retried))
+
+        while True:
+            processed = webhooks.process_pending(limit=options['limit'])
+            if processed:
+                log.info('Processed {0} webhooks'.format(processed))
+            if options['once']:
+                return
+            if processed < options['limit']:
+                time.sleep(options['sleep'])
@@ -1,12 +1,20 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from lib.brains.client import get_client
 from lib.brains.errors import BraintreeResultError
+from lib.buyers import cache, closure
 from lib.buyers.models import Buyer
 from solitude.base import getLogger, Model
-from solitude.constants import PAYMENT_METHOD_CARD
+from solitude.constants import (
+    PAYMENT_METHOD_CARD, WEBHOOK_COMPLETED, WEBHOOK_FAILED, WEBHOOK_PENDING,
+    WEBHOOK_RUNNING, WEBHOOK_STATUSES)
 
 log = getLogger('s.brains')
 
@@ -31,6 +39,10 @@ class BraintreeBuyer(Model):
 
 @receiver(Buyer.close_signal, sender=Buyer)
 def close(signal, *args, **kw):
+    """
+    Returns the subscriptions to cancel and payment methods to delete when
+    closing the buyer. See lib.buyers.closure.
+    """
     buyer = kw['buyer']
     try:
         braintree_buyer = BraintreeBuyer.objects.get(buyer=buyer)
@@ -39,22 +51,37 @@ def close(signal, *args, **kw):
         # case continue.
         log.info('No braintree buyer found for buyer: {}'
                  .format(buyer.pk))
-        return
+        return []
 
+    items = []
     for paymethod in braintree_buyer.paymethods.all():
-
         # Find and clear out all subscriptions.
         for subscription in paymethod.subscriptions.filter(active=True):
-            subscription.braintree_cancel()
-            subscription.active = False
-            subscription.save()
-            log.info('Cancelled subscription: {}'.format(subscription.pk))
+            items.append(('braintree:subscription', subscription.pk))
 
         # Delete the payment method from braintree.
-        paymethod.braintree_delete()
-        paymethod.active = False
-        paymethod.save()
-        log.info('Deleted payment method: {}'.format(paymethod.pk))
+        items.append(('braintree:paymethod', paymethod.pk))
+
+    return items
+
+
+# Subscriptions are cancelled before their payment methods are deleted.
+@closure.handler('braintree:subscription', phase=0)
+def close_subscription(pk):
+    subscription = BraintreeSubscription.objects.get(pk=pk)
+    subscription.braintree_cancel()
+    subscription.active = False
+    subscription.save()
+    log.info('Cancelled subscription: {}'.format(subscription.pk))
+
+
+@closure.handler('braintree:paymethod', phase=1)
+def close_paymethod(pk):
+    paymethod = BraintreePaymentMethod.objects.get(pk=pk)
+    paymethod.braintree_delete()
+    paymethod.active = False
+    paymethod.save()
+    log.info('Deleted payment method: {}'.format(paymethod.pk))
 
 
 class BraintreePaymentMethod(Model):
@@ -97,6 +124,23 @@ class BraintreePaymentMethod(Model):
         return result
 
 
+# The buyer cache has the Braintree buyer and the number of active payment
+# methods. Instances from the cache are deferred subclasses, so this can't
+# filter on the sender.
+@receiver(post_save, dispatch_uid='braintree_buyer_cache_invalidate')
+@receiver(post_delete,
+          dispatch_uid='braintree_buyer_cache_invalidate_delete')
+def invalidate_buyer_cache(sender, instance, **kw):
+    if isinstance(instance, BraintreeBuyer):
+        cache.invalidate(instance.buyer.uuid)
+    elif isinstance(instance, BraintreePaymentMethod):
+        # One query for the uuid, rather than loading both rows.
+        for uuid in (Buyer.objects
+                     .filter(braintreebuyer=instance.braintree_buyer_id)
+                     .values_list('uuid', flat=True)):
+            cache.invalidate(uuid)
+
+
 class BraintreeSubscription(Model):
 
     """
@@ -159,3 +203,72 @@ class BraintreeTransaction(Model):
     def get_uri(self):
         return reverse('braintree:mozilla:transaction-detail',
                        kwargs={'pk': self.pk})
+
+
+class BraintreeWebhook(Model):
+
+    """
+    A webhook from Braintree, stored as it was sent so it can be processed
+    after it has been acknowledged. See lib.brains.webhooks.
+    """
+    # Braintree sends a webhook again if it isn't answered quickly enough.
+    # The subscription and the time it was sent identify a repeat.
+    subscription_id = models.CharField(max_length=255, blank=True)
+    timestamp = models.DateTimeField(blank=True, null=True)
+    kind = models.CharField(max_length=255)
+    bt_signature = models.TextField()
+    bt_payload = models.TextField()
+    status = models.PositiveIntegerField(
+        choices=[(v, k) for k, v in WEBHOOK_STATUSES.items()],
+        default=WEBHOOK_PENDING, db_index=True)
+    error = models.CharField(max_length=255, blank=True, null=True)
+
+    class Meta(Model.Meta):
+        db_table = 'braintree_webhook'
+        unique_together = (('subscription_id', 'timestamp'),)
+
+    def claim(self):
+        """
+        Mark the webhook as running, returns False if it already is. A
+        webhook that has been running longer than BRAINTREE_WEBHOOK_TIMEOUT
+        is assumed to have died and can be claimed again.
+        """
+        now = datetime.now()
+        stale = now - timedelta(seconds=settings.BRAINTREE_WEBHOOK_TIMEOUT)
+        claimed = (BraintreeWebhook.objects.filter(pk=self.pk)
+                   .filter(Q(status__in=[WEBHOOK_PENDING, WEBHOOK_FAILED]) |
+                           Q(status=WEBHOOK_RUNNING, modified__lt=stale))
+                   .update(status=WEBHOOK_RUNNING, modified=now,
+                           counter=F('counter') + 1))
+        if claimed:
+            self.status = WEBHOOK_RUNNING
+        return bool(claimed)
+
+    def run(self):
+        """
+        Process the webhook, returns the Processor or None if the webhook
+        was already being processed or failed.
+        """
+        # Imported here because the webhooks use these models.
+        from lib.brains import webhooks
+
+        if not self.claim():
+            log.info('Webhook already running: {0}'.format(self.pk))
+            return
+
+        try:
+            with transaction.atomic():
+                processor = webhooks.Processor(
+                    webhooks.parse(self.bt_payload))
+                processor.process()
+        except Exception, err:
+            log.exception('Webhook failed: {0}'.format(self.pk))
+            self.status = WEBHOOK_FAILED
+            self.error = repr(err)[:255]
+            self.save()
+            return
+
+        self.status = WEBHOOK_COMPLETED
+        self.error = None
+        self.save()
+        return processor
@@ -9,6 +9,7 @@ import requests
 from braintree.error_result import ErrorResult
 from nose.plugins.attrib import attr
 
+from lib.brains import client
 from lib.brains.errors import MockError
 from lib.brains.models import (
     BraintreeBuyer, BraintreePaymentMethod, BraintreeSubscription)
@@ -126,12 +127,16 @@ class BraintreeTest(APITest):
             self.classes[key].return_value = obj
             self.mocks[key] = obj
 
+        # The client is kept between requests, so make sure the next one is
+        # created with the patched gateway classes.
+        client.reset()
         self.addCleanup(self.clean_up_brains)
 
     def clean_up_brains(self):
         # Stop the class mocks.
         for v in self.classes.values():
             v.patcher.stop()
+        client.reset()
 
         # Check that each object mock that was registered was called.
         for k, v in self.mocks.items():
@@ -1,7 +1,17 @@
+import threading
+
 from django.core.exceptions import ImproperlyConfigured
 
+from braintree.environment import Environment
+from mock import patch
+from nose.tools import eq_, ok_
+
+from lib.brains import client
 from lib.brains.client import get_client, Http
+from lib.brains.errors import BraintreeUnavailable
 from lib.brains.tests.base import BraintreeTest
+from solitude import breakers, bulkheads
+from solitude.exceptions import custom_exception_handler
 
 
 class TestClient(BraintreeTest):
@@ -9,8 +19,7 @@ class TestClient(BraintreeTest):
     def test_normal(self):
         with self.settings(BRAINTREE_PRIVATE_KEY='test-key'):
             assert isinstance(
-                get_client().Configuration.instantiate()._http_strategy,
-                Http)
+                get_client().gateway.config.http_strategy(), Http)
 
     def test_missing(self):
         with self.settings(BRAINTREE_MERCHANT_ID=''):
@@ -21,3 +30,101 @@ class TestClient(BraintreeTest):
         with self.settings(BRAINTREE_PROXY='', BRAINTREE_MERCHANT_ID='x'):
             with self.assertRaises(ImproperlyConfigured):
                 get_client()
+
+    def test_cached(self):
+        eq_(get_client(), get_client())
+
+    def test_threads(self):
+        clients = []
+        threads = [
+            threading.Thread(target=lambda: clients.append(get_client()))
+            for x in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        eq_(len(set(clients)), 1)
+
+    def test_settings_changed(self):
+        old = get_client()
+        with self.settings(BRAINTREE_MERCHANT_ID='other'):
+            eq_(get_client().gateway.config.merchant_id, 'other')
+        ok_(get_client() is not old)
+
+    def test_reset(self):
+        old = get_client()
+        client.reset()
+        ok_(get_client() is not old)
+
+    def test_facade(self):
+        gateway = get_client().gateway
+        eq_(get_client().Customer, gateway.customer)
+
+    def test_client_token(self):
+        with patch.object(get_client().gateway.client_token,
+                          'generate') as generate:
+            generate.return_value = 'token'
+            eq_(get_client().ClientToken.generate(), 'token')
+        generate.assert_called_with({'version': 2})
+
+
+class TestHttp(BraintreeTest):
+
+    def test_session(self):
+        eq_(client.get_session(), client.get_session())
+
+    @patch('lib.brains.client.get_session')
+    def test_request(self, get_session):
+        request = get_session.return_value.request
+        request.return_value.status_code = 200
+        request.return_value.text = '<ok/>'
+        with self.settings(BRAINTREE_PROXY='http://m.o:80/auth'):
+            environment = client.AuthEnvironment(Environment.Sandbox)
+        http = Http(get_client().gateway.config, environment)
+        eq_(http.http_do('GET', '/merchants/test/plans', {}, ''),
+            (200, '<ok/>'))
+        args, kwargs = request.call_args
+        eq_(args, ('GET', 'http://m.o:80/auth'))
+        eq_(kwargs['headers']['x-solitude-service'],
+            'https://api.sandbox.braintreegateway.com:443'
+            '/merchants/test/plans')
+
+    @patch('lib.brains.client.get_session')
+    def test_breaker(self, get_session):
+        request = get_session.return_value.request
+        request.return_value.status_code = 503
+        breakers.breakers.clear()
+        self.addCleanup(breakers.breakers.clear)
+        http = Http(get_client().gateway.config)
+
+        with self.settings(CIRCUIT_BREAKERS={
+                'braintree': {'failures': 2, 'reset': 30}}):
+            for x in range(2):
+                http.http_do('POST', '/merchants/test/customers', {}, '')
+            with self.assertRaises(BraintreeUnavailable) as error:
+                http.http_do('POST', '/merchants/test/customers', {}, '')
+            # Other methods are still called.
+            http.http_do('GET', '/merchants/test/plans', {}, '')
+        eq_(request.call_count, 3)
+
+        res = custom_exception_handler(error.exception)
+        eq_(res.status_code, 503)
+        eq_(res.data['braintree']['__all__'][0]['code'],
+            'service_unavailable')
+
+    @patch('lib.brains.client.get_session')
+    def test_bulkhead(self, get_session):
+        http = Http(get_client().gateway.config)
+        with self.settings(BULKHEADS={
+                'braintree': {'size': 1, 'timeout': 0}}):
+            with bulkheads.limit('braintree'):
+                with self.assertRaises(BraintreeUnavailable):
+                    http.http_do('GET', '/merchants/test/plans', {}, '')
+        ok_(not get_session.return_value.request.called)
+
+    def test_method(self):
+        eq_(client.method('POST', '/merchants/test/customers'),
+            'post.customers')
+        eq_(client.method('PUT', '/merchants/test/payment_methods/any/a'),
+            'put.payment_methods')
+        eq_(client.method('GET', '/plans'), 'get.plans')
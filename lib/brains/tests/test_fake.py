@@ -0,0 +1,139 @@
+import base64
+import json
+from decimal import Decimal
+from StringIO import StringIO
+from urlparse import urlparse
+from wsgiref import util
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from braintree.exceptions.server_error import ServerError
+from braintree.util.xml_util import XmlUtil
+from mock import Mock, patch
+from nose.tools import eq_, ok_
+
+from lib.brains import client, webhooks
+from lib.brains.fake import FakeBraintree
+from solitude.fake import Profile
+
+
+class Session(object):
+
+    """Sends requests straight to the WSGI application."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def request(self, method, url, headers=None, data='', **kw):
+        parsed = urlparse(url)
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': parsed.path,
+            'QUERY_STRING': parsed.query,
+            'CONTENT_LENGTH': str(len(data or '')),
+            'wsgi.input': StringIO(data or ''),
+        }
+        for key, value in (headers or {}).items():
+            environ['HTTP_' + key.upper().replace('-', '_')] = value
+        util.setup_testing_defaults(environ)
+
+        response = Mock()
+        start_response = Mock()
+        response.text = ''.join(self.app(environ, start_response))
+        response.content = response.text
+        response.status_code = int(start_response.call_args[0][0][:3])
+        return response
+
+
+@override_settings(BRAINTREE_PROXY='http://fake:8002/braintree')
+class TestFake(TestCase):
+
+    def setUp(self):
+        self.app = FakeBraintree(Profile())
+        patcher = patch('lib.brains.client.get_session')
+        patcher.start().return_value = self.session = Session(self.app)
+        self.addCleanup(patcher.stop)
+        client.reset()
+        self.addCleanup(client.reset)
+
+    def test_customer(self):
+        result = client.get_client().Customer.create()
+        ok_(result.is_success)
+        ok_(result.customer.id)
+        ok_(result.customer.created_at)
+
+    def test_payment_method(self):
+        result = client.get_client().PaymentMethod.create(
+            {'customer_id': 'c', 'payment_method_nonce': 'n'})
+        ok_(result.is_success)
+        eq_(result.payment_method.last_4, '1111')
+        ok_(client.get_client().PaymentMethod.delete(
+            result.payment_method.token).is_success)
+
+    def test_bytes(self):
+        # WSGI servers only write str.
+        res = self.session.request(
+            'POST', 'http://fake/payment_methods',
+            data='<payment-method><customer-id>c</customer-id>'
+                 '</payment-method>')
+        eq_(res.status_code, 201)
+        eq_(type(res.text), str)
+
+    def test_subscription(self):
+        subscriptions = client.get_client().Subscription
+        result = subscriptions.create(
+            {'payment_method_token': 't', 'plan_id': 'mozilla-concrete-brick'})
+        ok_(result.is_success)
+        eq_(result.subscription.payment_method_token, 't')
+        eq_(subscriptions.update(
+            result.subscription.id, {'payment_method_token': 'u'})
+            .subscription.payment_method_token, 'u')
+        eq_(subscriptions.cancel(result.subscription.id).subscription.status,
+            'Canceled')
+
+    def test_client_token(self):
+        ok_(client.get_client().ClientToken.generate())
+
+    def test_plans(self):
+        plans = dict((p.id, p) for p in client.get_client().Plan.all())
+        ok_('mozilla-concrete-brick' in plans)
+
+    def test_errors(self):
+        self.app.profile = Profile(errors=1)
+        with self.assertRaises(ServerError):
+            with patch('random.choice', lambda choices: 500):
+                client.get_client().Customer.create()
+
+    def test_method_profile(self):
+        self.app.profile = Profile(methods={'customer': Profile(errors=1)})
+        ok_(client.get_client().ClientToken.generate())
+        with self.assertRaises(Exception):
+            client.get_client().Customer.create()
+
+    def test_not_found(self):
+        eq_(self.session.request('GET', 'http://fake/nope').status_code, 404)
+
+    def test_parse(self):
+        res = self.session.request('POST', 'http://fake/braintree/parse')
+        eq_(res.status_code, 204)
+
+    def test_verify(self):
+        res = self.session.request(
+            'GET', 'http://fake/braintree/verify?bt_challenge=c')
+        ok_(res.text.startswith('fake-public-key|'))
+
+    def test_webhook(self):
+        res = self.session.request(
+            'GET', 'http://fake/braintree/webhook'
+            '?kind=subscription_charged_successfully&id=sub')
+        data = json.loads(res.text)
+        ok_(data['bt_signature'].startswith('fake-public-key|'))
+        notification = XmlUtil.dict_from_xml(
+            base64.decodestring(data['bt_payload']))['notification']
+        subscription = notification['subject']['subscription']
+        eq_(subscription['id'], 'sub')
+        eq_(subscription['transactions'][0]['status'], 'settled')
+        # The braintree library can read it.
+        parsed = webhooks.parse(data['bt_payload'])
+        eq_(parsed.subscription.transactions[0].amount, Decimal('10.00'))
@@ -2,7 +2,9 @@ from braintree.payment_method_gateway import PaymentMethodGateway
 from braintree.subscription_gateway import SubscriptionGateway
 from nose.tools import eq_
 
-from lib.brains.tests.base import create_subscription, BraintreeTest
+from lib.brains.models import close
+from lib.brains.tests.base import create_subscription, error, BraintreeTest
+from lib.buyers.constants import CLOSE_COMPLETED, CLOSE_FAILED
 from lib.brains.tests.test_subscription import (
     create_method_all, successful_subscription)
 from lib.brains.tests.test_paymethod import successful_method
@@ -24,6 +26,11 @@ class TestClose(BraintreeTest):
         self.buyer.delete()
         self.buyer.close()
 
+    def test_no_braintree_buyer(self):
+        self.method.braintree_buyer.delete()
+        self.buyer.close()
+        eq_(self.buyer.reget().active, False)
+
     def test_close(self):
         self.mocks['pay'].delete.return_value = successful_method()
         self.mocks['sub'].cancel.return_value = successful_subscription()
@@ -37,11 +44,40 @@ class TestClose(BraintreeTest):
         eq_(self.sub.reget().active, False)
 
     def test_listens_signal(self):
-        self.mocks['pay'].delete.return_value = successful_method()
+        res = self.buyer.close_signal.send(
+            buyer=self.buyer, sender=self.buyer.__class__)
+        eq_(dict(res)[close], [('braintree:subscription', self.sub.pk),
+                               ('braintree:paymethod', self.method.pk)])
+
+    def test_fails(self):
+        self.mocks['sub'].cancel.return_value = error()
+
+        closure = self.buyer.close()
+
+        eq_(closure.status, CLOSE_FAILED)
+        eq_(self.buyer.reget().active, True)
+        eq_(self.sub.reget().active, True)
+        # The payment method is not deleted after a subscription failed.
+        eq_(self.method.reget().active, True)
+        item = closure.items.get(kind='braintree:subscription')
+        eq_(item.status, CLOSE_FAILED)
+        assert 'BraintreeResultError' in item.error
+
+    def test_resume(self):
         self.mocks['sub'].cancel.return_value = successful_subscription()
+        self.mocks['pay'].delete.side_effect = [error(), successful_method()]
 
-        self.buyer.close_signal.send(
-            buyer=self.buyer, sender=self.buyer.__class__)
+        first = self.buyer.close()
+        eq_(first.status, CLOSE_FAILED)
+        eq_(self.sub.reget().active, False)
+
+        second = self.buyer.close()
+        eq_(second.pk, first.pk)
+        eq_(second.status, CLOSE_COMPLETED)
+        # The subscription was not cancelled again.
+        eq_(self.mocks['sub'].cancel.call_count, 1)
+        eq_(self.mocks['pay'].delete.call_count, 2)
+        eq_(self.buyer.reget().active, False)
 
     def test_inactive_method(self):
         # If a method is inactive, then we still go and call cancel on
@@ -171,6 +171,12 @@ class TestBraintreeBuyerMethod(BraintreeTest):
         obj = self.create()
         eq_(self.client.get(obj.get_uri()).json['resource_pk'], obj.pk)
 
+    def test_get_queries(self):
+        obj = self.create()
+        # The payment method and braintree buyer.
+        with self.query_budget(2):
+            eq_(self.client.get(obj.get_uri()).status_code, 200)
+
     def test_patch(self):
         obj = self.create()
         res = self.client.patch(obj.get_uri(), data={'active': False})
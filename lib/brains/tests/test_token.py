@@ -1,9 +1,13 @@
 from django.core.urlresolvers import reverse
+from django.test import TestCase
 
 from braintree.client_token_gateway import ClientTokenGateway
-from nose.tools import eq_
+from mock import patch
+from nose.tools import eq_, ok_
 
+from lib.brains import tokens
 from lib.brains.tests.base import BraintreeLiveTestCase, BraintreeTest
+from solitude import metrics
 
 
 class TestToken(BraintreeTest):
@@ -15,6 +19,129 @@ class TestToken(BraintreeTest):
         eq_(res.json['token'], 'a-sample-token')
 
 
+class TestTokenPool(TestCase):
+
+    def setUp(self):
+        self.tokens = iter('token-{0}'.format(x) for x in range(100))
+        patcher = patch('lib.brains.tokens.generate')
+        self.generate = patcher.start()
+        self.generate.side_effect = lambda: next(self.tokens)
+        self.addCleanup(patcher.stop)
+        # Refill on the test thread.
+        patcher = patch('lib.brains.tokens.spawn', lambda func: func())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        metrics.registry.clear()
+        self.pool = tokens.TokenPool(3, 60)
+
+    def count(self, result):
+        return metrics.registry.get(
+            metrics.Counter, 'solitude_braintree_token_total',
+            result=result).value
+
+    def test_no_pool(self):
+        pool = tokens.TokenPool(0, 60)
+        eq_(pool.get(), 'token-0')
+        eq_(pool.get(), 'token-1')
+        eq_(len(pool.tokens), 0)
+
+    def test_miss(self):
+        # The refill is started before the token for this request.
+        eq_(self.pool.get(), 'token-3')
+        eq_(len(self.pool.tokens), 3)
+        eq_(self.count('miss'), 1)
+
+    def test_hit(self):
+        self.pool.refill()
+        eq_(self.pool.get(), 'token-0')
+        # Topped up again.
+        eq_([token for _, token in self.pool.tokens],
+            ['token-1', 'token-2', 'token-3'])
+        eq_(self.count('hit'), 1)
+        eq_(metrics.registry.get(
+            metrics.Histogram,
+            'solitude_braintree_token_refill_seconds').count, 4)
+
+    @patch('lib.brains.tokens.time.time')
+    def test_expired(self, time):
+        time.return_value = 1000
+        self.pool.refill()
+        time.return_value = 1061
+        # The refill is started before the token for this request.
+        eq_(self.pool.get(), 'token-6')
+        eq_(self.count('expired'), 3)
+        eq_(self.count('miss'), 1)
+
+    def test_refill_fails(self):
+        self.generate.side_effect = ValueError
+        with self.assertRaises(ValueError):
+            self.pool.get()
+        ok_(not self.pool.refilling)
+
+    def test_refilling(self):
+        self.pool.refilling = True
+        self.pool.get()
+        eq_(len(self.pool.tokens), 0)
+
+    @patch('lib.brains.tokens.time.time')
+    def test_refresh(self, time):
+        pool = tokens.TokenPool(3, 60, 10)
+        time.return_value = 1000
+        pool.refill()
+        time.return_value = 1045
+        pool.refresh()
+        eq_(self.count('replaced'), 0)
+        # These would expire before the next refresh.
+        time.return_value = 1055
+        pool.refresh()
+        eq_([token for _, token in pool.tokens],
+            ['token-3', 'token-4', 'token-5'])
+        eq_(self.count('replaced'), 3)
+        ok_(not pool.refilling)
+
+    def test_refresh_refilling(self):
+        self.pool.refilling = True
+        self.pool.refresh()
+        eq_(len(self.pool.tokens), 0)
+
+    @patch('lib.brains.tokens.time.time')
+    def test_backoff(self, time):
+        time.return_value = 1000
+        pool = tokens.TokenPool(3, 60, 10)
+        self.generate.side_effect = ValueError
+        pool.refill()
+        eq_(pool.retry_at, 1001)
+        pool.refill()
+        eq_(pool.retry_at, 1002)
+        # Waiting, so the request doesn't start a refill.
+        self.generate.reset_mock()
+        pool.refill_later()
+        pool.refresh()
+        ok_(not self.generate.called)
+
+    @patch('lib.brains.tokens.time.time')
+    def test_backoff_limit(self, time):
+        time.return_value = 1000
+        pool = tokens.TokenPool(3, 60, 10)
+        pool.failures = 10
+        self.generate.side_effect = ValueError
+        pool.refill()
+        eq_(pool.retry_at, 1010)
+
+    @patch('lib.brains.tokens.time.time')
+    def test_backoff_reset(self, time):
+        time.return_value = 1000
+        self.pool.failures, self.pool.retry_at = 2, 1002
+        time.return_value = 1003
+        self.pool.get()
+        eq_((self.pool.failures, self.pool.retry_at), (0, 0))
+
+    def test_clear(self):
+        self.pool.refill()
+        self.pool.clear()
+        eq_(len(self.pool.tokens), 0)
+
+
 class TestLiveToken(BraintreeLiveTestCase):
 
     def test_token(self):
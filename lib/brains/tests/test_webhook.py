@@ -2,14 +2,17 @@ import base64
 from datetime import datetime, timedelta
 from decimal import Decimal
 
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
 from django.test.utils import override_settings
 
 from braintree.webhook_notification import WebhookNotification
 from mock import patch
-from nose.tools import eq_
+from nose.tools import eq_, ok_
 
-from lib.brains.models import BraintreeSubscription, BraintreeTransaction
+from lib.brains import webhooks
+from lib.brains.models import (
+    BraintreeSubscription, BraintreeTransaction, BraintreeWebhook)
 from lib.brains.serializers import serialize_webhook
 from lib.brains.tests.base import (
     BraintreeTest, create_braintree_buyer, create_method, create_seller)
@@ -17,7 +20,8 @@ from lib.brains.webhooks import Processor
 from lib.transactions import constants
 from lib.transactions.models import Transaction
 
-from solitude.utils import shorter
+from solitude.constants import (
+    WEBHOOK_COMPLETED, WEBHOOK_FAILED, WEBHOOK_PENDING, WEBHOOK_RUNNING)
 
 
 def notification(**kwargs):
@@ -121,7 +125,7 @@ class TestWebhookWithSubscription(SubscriptionTest):
         self.req.post.return_value = self.get_response('foo', 204)
 
     def test_post_ok(self):
-        with patch('lib.brains.views.webhook.XmlUtil.dict_from_xml') as attr:
+        with patch('lib.brains.webhooks.XmlUtil.dict_from_xml') as attr:
             attr.return_value = {
                 'notification': {
                     'kind': 'subscription_charged_successfully',
@@ -133,7 +137,7 @@ class TestWebhookWithSubscription(SubscriptionTest):
             eq_(res.json.keys(), ['mozilla', 'braintree'])
 
     def test_post_ignored(self):
-        with patch('lib.brains.views.webhook.XmlUtil.dict_from_xml') as attr:
+        with patch('lib.brains.webhooks.XmlUtil.dict_from_xml') as attr:
             attr.return_value = {
                 'notification': {
                     'kind': '',
@@ -168,8 +172,9 @@ class TestSubscription(SubscriptionTest):
             self.seller_product.pk)
         eq_(hook.data['mozilla']['subscription']['resource_pk'],
             self.braintree_sub.pk)
-        assert (hook.data['mozilla']['transaction']['generic']['uuid']
-                .startswith('bt-' + shorter(Transaction.objects.get().pk)))
+        eq_(hook.data['mozilla']['transaction']['generic']['uuid'],
+            Transaction.objects.get().uuid)
+        ok_(Transaction.objects.get().uuid.startswith('bt-'))
 
     def test_no_transaction(self):
         self.kind = 'subscription_canceled'
@@ -206,6 +211,36 @@ class TestSubscription(SubscriptionTest):
 
         eq_(process.transactions[0].uid_support, 'first:id')
 
+    def test_many_transactions(self):
+        sub = subscription(transactions=[
+            transaction(id='id:{0}'.format(x)) for x in range(10)])
+        self.process(sub)
+        eq_(Transaction.objects.count(), 10)
+        eq_(BraintreeTransaction.objects.count(), 10)
+        eq_(len(set(Transaction.objects.values_list('uuid', flat=True))), 10)
+
+        # The second time they all exist, one query finds them.
+        hook = Processor(notification(subject=sub, kind=self.kind))
+        hook.subscription = self.braintree_sub
+        with self.assertNumQueries(1):
+            hook.update_transactions()
+        eq_(Transaction.objects.count(), 10)
+
+    def test_many_transactions_queries(self):
+        sub = subscription(transactions=[
+            transaction(id='id:{0}'.format(x)) for x in range(10)])
+        hook = Processor(notification(subject=sub, kind=self.kind))
+        hook.subscription = self.braintree_sub
+        # Read the buyer, seller and product before counting.
+        hook.subscription.paymethod.braintree_buyer.buyer
+        hook.subscription.seller_product.seller
+        # Find, create the transactions, get them back and create the
+        # Braintree transactions.
+        with self.assertNumQueries(4):
+            hook.update_transactions()
+        eq_([t.uid_support for t in hook.transactions],
+            ['id:{0}'.format(x) for x in range(10)])
+
     def test_flip(self):
         process = Processor(notification(subject=subscription()))
         process.subscription = self.braintree_sub
@@ -347,3 +382,111 @@ class TestWebhookSubscriptionCancelled(SubscriptionTest):
     def test_subscription_inactive(self):
         Processor(notification(kind=self.kind, subject=self.sub)).process()
         eq_(self.braintree_sub.reget().active, False)
+
+
+def stored():
+    return {
+        'notification': {
+            'kind': 'subscription_charged_successfully',
+            'subject': subscription(id='some-bt:id'),
+            'timestamp': datetime(2015, 10, 1, 12, 0, 0),
+        }
+    }
+
+
+@override_settings(BRAINTREE_PROXY='http://m.o', BRAINTREE_WEBHOOK_ASYNC=True)
+class TestWebhookAsync(SubscriptionTest):
+
+    def setUp(self):
+        super(TestWebhookAsync, self).setUp()
+        self.url = reverse('braintree:webhook')
+        self.patch_webhook_forms()
+        self.req.post.return_value = self.get_response('foo', 204)
+        patcher = patch('lib.brains.webhooks.XmlUtil.dict_from_xml')
+        self.addCleanup(patcher.stop)
+        patcher.start().return_value = stored()
+
+    def test_stored(self):
+        res = self.client.post(self.url, data=example())
+        eq_(res.status_code, 202)
+        webhook = BraintreeWebhook.objects.get()
+        eq_(webhook.subscription_id, 'some-bt:id')
+        eq_(webhook.kind, 'subscription_charged_successfully')
+        eq_(webhook.status, WEBHOOK_PENDING)
+        ok_(not Transaction.objects.exists())
+
+    def test_repeated(self):
+        self.client.post(self.url, data=example())
+        eq_(self.client.post(self.url, data=example()).status_code, 202)
+        eq_(BraintreeWebhook.objects.count(), 1)
+
+    def test_auth_fails(self):
+        self.req.post.return_value = self.get_response('', 403)
+        eq_(self.client.post(self.url, data=example()).status_code, 422)
+        ok_(not BraintreeWebhook.objects.exists())
+
+
+class TestWebhookWorker(SubscriptionTest):
+
+    def setUp(self):
+        super(TestWebhookWorker, self).setUp()
+        patcher = patch('lib.brains.webhooks.XmlUtil.dict_from_xml')
+        self.addCleanup(patcher.stop)
+        patcher.start().return_value = stored()
+        data = example()
+        self.webhook, created = webhooks.store(
+            data['bt_signature'], data['bt_payload'])
+
+    def test_run(self):
+        ok_(self.webhook.run())
+        eq_(self.webhook.reget().status, WEBHOOK_COMPLETED)
+        eq_(Transaction.objects.get().status, constants.STATUS_CHECKED)
+
+    def test_run_once(self):
+        self.webhook.run()
+        eq_(self.webhook.reget().run(), None)
+        eq_(Transaction.objects.count(), 1)
+
+    def test_failed(self):
+        self.braintree_sub.delete()
+        eq_(self.webhook.run(), None)
+        webhook = self.webhook.reget()
+        eq_(webhook.status, WEBHOOK_FAILED)
+        ok_(webhook.error.startswith('DoesNotExist'))
+        ok_(not Transaction.objects.exists())
+
+    def test_stale(self):
+        BraintreeWebhook.objects.filter(pk=self.webhook.pk).update(
+            status=WEBHOOK_RUNNING,
+            modified=datetime.now() - timedelta(hours=1))
+        eq_(webhooks.process_pending(), 1)
+        eq_(self.webhook.reget().status, WEBHOOK_COMPLETED)
+
+    def test_running(self):
+        BraintreeWebhook.objects.filter(pk=self.webhook.pk).update(
+            status=WEBHOOK_RUNNING)
+        eq_(webhooks.process_pending(), 0)
+
+    def test_failed_stops_subscription(self):
+        later = BraintreeWebhook.objects.create(
+            subscription_id=self.webhook.subscription_id,
+            timestamp=self.webhook.timestamp + timedelta(seconds=1),
+            kind=self.webhook.kind, bt_signature='later',
+            bt_payload=self.webhook.bt_payload)
+        self.braintree_sub.delete()
+        eq_(webhooks.process_pending(), 0)
+        eq_(self.webhook.reget().status, WEBHOOK_FAILED)
+        eq_(later.reget().status, WEBHOOK_PENDING)
+
+    def test_command(self):
+        call_command('braintree_webhook_worker', once=True)
+        eq_(self.webhook.reget().status, WEBHOOK_COMPLETED)
+        eq_(webhooks.process_pending(), 0)
+
+    def test_command_retry(self):
+        BraintreeWebhook.objects.filter(pk=self.webhook.pk).update(
+            status=WEBHOOK_FAILED)
+        call_command('braintree_webhook_worker', once=True)
+        eq_(self.webhook.reget().status, WEBHOOK_FAILED)
+        call_command('braintree_webhook_worker', once=True, retry_failed=True)
+        eq_(self.webhook.reget().status, WEBHOOK_COMPLETED)
@@ -0,0 +1,183 @@
+"""
+A pool of client tokens generated ahead of time.
+
+Starting a checkout needs a client token, generating one is a round trip to
+Braintree through solitude-auth. Tokens that aren't for a customer are all
+the same to Braintree, so up to BRAINTREE_TOKEN_POOL_SIZE are generated on
+a background thread and handed out as they are asked for. Tokens older than
+BRAINTREE_TOKEN_MAX_AGE seconds are thrown away. When the pool is empty a
+token is generated while the request waits, as it would be without a pool.
+
+Every BRAINTREE_TOKEN_REFRESH_INTERVAL seconds another thread replaces the
+tokens that would expire before it runs again, so a quiet process doesn't
+end up with a pool of expired tokens. After a refill fails the next one waits
+1, 2, 4 and so on seconds, up to the refresh interval.
+
+With a size of 0 there is no pool, which is what the tests use.
+"""
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from lib.brains.client import get_client
+from solitude import metrics
+from solitude.logger import getLogger
+from solitude.workers import spawn
+
+log = getLogger('s.brains')
+
+
+def generate():
+    return get_client().ClientToken.generate()
+
+
+class TokenPool(object):
+
+    def __init__(self, size, max_age, interval=0):
+        self.size = size
+        self.max_age = max_age
+        self.interval = interval
+        # Tokens and when they were generated, oldest first.
+        self.tokens = deque()
+        self.lock = threading.Lock()
+        self.refilling = False
+        # Refill failures in a row and when the next refill can be tried.
+        self.failures = 0
+        self.retry_at = 0
+        self.thread = None
+
+    def get(self):
+        """
+        Return a token from the pool, or a new one if the pool is empty.
+        """
+        if not self.size:
+            return generate()
+
+        self.start()
+        token = self.take()
+        self.refill_later()
+        if token is None:
+            metrics.incr('solitude_braintree_token_total', result='miss')
+            with metrics.timer('solitude_braintree_token_generate_seconds'):
+                return generate()
+
+        metrics.incr('solitude_braintree_token_total', result='hit')
+        return token
+
+    def take(self):
+        oldest = time.time() - self.max_age
+        with self.lock:
+            while self.tokens:
+                created, token = self.tokens.popleft()
+                if created >= oldest:
+                    self.gauge()
+                    return token
+                metrics.incr('solitude_braintree_token_total',
+                             result='expired')
+            self.gauge()
+
+    def gauge(self):
+        metrics.gauge('solitude_braintree_token_pool', len(self.tokens))
+
+    def refill_later(self):
+        """
+        Start topping the pool up on another thread, unless that's already
+        happening.
+        """
+        with self.lock:
+            if (self.refilling or len(self.tokens) >= self.size or
+                    time.time() < self.retry_at):
+                return
+            self.refilling = True
+        spawn(self.refill)
+
+    def new_token(self):
+        start = time.time()
+        token = generate()
+        metrics.observe('solitude_braintree_token_refill_seconds',
+                        time.time() - start)
+        return time.time(), token
+
+    def refill(self, replace=False):
+        try:
+            if replace:
+                self.replace()
+            while len(self.tokens) < self.size:
+                token = self.new_token()
+                with self.lock:
+                    self.tokens.append(token)
+                    self.gauge()
+        except Exception:
+            log.exception('Refilling the client token pool failed')
+            with self.lock:
+                self.failures += 1
+                self.retry_at = time.time() + min(
+                    2 ** (self.failures - 1), self.interval or self.max_age)
+        else:
+            with self.lock:
+                self.failures = 0
+                self.retry_at = 0
+        finally:
+            with self.lock:
+                self.refilling = False
+
+    def replace(self):
+        """
+        Generate new tokens for the ones that would expire before the next
+        refresh, then swap them in.
+        """
+        oldest = time.time() - self.max_age + self.interval
+        with self.lock:
+            count = sum(1 for created, _ in self.tokens if created < oldest)
+        fresh = [self.new_token() for x in range(count)]
+        with self.lock:
+            while self.tokens and self.tokens[0][0] < oldest:
+                self.tokens.popleft()
+                metrics.incr('solitude_braintree_token_total',
+                             result='replaced')
+            self.tokens.extend(fresh)
+            while len(self.tokens) > self.size:
+                self.tokens.popleft()
+            self.gauge()
+
+    def refresh(self):
+        """
+        Replace the tokens that are about to expire and top the pool up,
+        unless a refill is already happening or is backing off.
+        """
+        with self.lock:
+            if self.refilling or time.time() < self.retry_at:
+                return
+            self.refilling = True
+        self.refill(replace=True)
+
+    def loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception:
+                log.error('Client token refresh failed', exc_info=True)
+
+    def start(self):
+        if not self.interval:
+            return
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self.loop,
+                                           name='solitude-tokens')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def clear(self):
+        with self.lock:
+            self.tokens.clear()
+            self.gauge()
+
+
+pool = TokenPool(settings.BRAINTREE_TOKEN_POOL_SIZE,
+                 settings.BRAINTREE_TOKEN_MAX_AGE,
+                 settings.BRAINTREE_TOKEN_REFRESH_INTERVAL)
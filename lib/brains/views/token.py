@@ -1,9 +1,9 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
-from lib.brains.client import get_client
+from lib.brains.tokens import pool
 
 
 @api_view(['POST'])
 def generate(request):
-    return Response({'token': get_client().ClientToken.generate()})
+    return Response({'token': pool.get()})
@@ -1,13 +1,10 @@
-import base64
+from django.conf import settings
 
-from braintree.util.xml_util import XmlUtil
-from braintree.webhook_notification import WebhookNotification
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
-from lib.brains.client import get_client
+from lib.brains import webhooks
 from lib.brains.forms import WebhookParseForm, WebhookVerifyForm
-from lib.brains.webhooks import Processor
 from solitude.errors import FormError
 from solitude.logger import getLogger
 
@@ -27,17 +24,17 @@ def parse(request):
     if not form.is_valid():
         raise FormError(form.errors)
 
-    # Parse the gateway without doing a validation on this server.
-    # The validation has happened on the solitude-auth server.
-    gateway = get_client().Configuration.instantiate().gateway()
-    payload = base64.decodestring(form.cleaned_data['bt_payload'])
-    attributes = XmlUtil.dict_from_xml(payload)
-    parsed = WebhookNotification(gateway, attributes['notification'])
+    if settings.BRAINTREE_WEBHOOK_ASYNC:
+        webhook, created = webhooks.store(*form.braintree_data)
+        log.info('Stored webhook: {w.kind}, {w.pk}, new: {c}.'
+                 .format(w=webhook, c=created))
+        return Response(status=202)
 
+    parsed = webhooks.parse(form.cleaned_data['bt_payload'])
     log.info('Received webhook: {p.kind}.'.format(p=parsed))
     debug_log.debug(parsed)
 
-    processor = Processor(parsed)
+    processor = webhooks.Processor(parsed)
     processor.process()
     data = processor.data
     return Response(data, status=200 if data else 204)
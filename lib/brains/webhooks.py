@@ -1,17 +1,111 @@
+"""
+Processing webhooks from Braintree.
+
+By default a webhook is processed while Braintree waits for the answer. With
+BRAINTREE_WEBHOOK_ASYNC on, the webhook is stored as a BraintreeWebhook and
+acknowledged straight away. The braintree_webhook_worker command processes
+the stored webhooks. Braintree sends a webhook again if it isn't answered
+quickly, a repeat has the same subscription and timestamp and is only stored
+once.
+"""
+import base64
 import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Q
 
-from lib.brains.models import BraintreeSubscription, BraintreeTransaction
+from braintree.util.xml_util import XmlUtil
+from braintree.webhook_notification import WebhookNotification
+
+from lib.brains.client import get_client
+from lib.brains.models import (
+    BraintreeSubscription, BraintreeTransaction, BraintreeWebhook)
 from lib.brains.serializers import serialize_webhook
 from lib.transactions import constants
 from lib.transactions.models import Transaction
 from solitude.base import getLogger
+from solitude.constants import WEBHOOK_PENDING, WEBHOOK_RUNNING
 from solitude.utils import shorter
+from solitude.workers import WorkerPool
 
 log = getLogger('s.webhooks')
 
+pool = WorkerPool('webhook', 'BRAINTREE_WEBHOOK_WORKERS')
+
+
+def parse(payload):
+    """
+    Parse the payload without doing a validation on this server. The
+    validation has happened on the solitude-auth server.
+    """
+    attributes = XmlUtil.dict_from_xml(base64.decodestring(payload))
+    return WebhookNotification(get_client().gateway,
+                               attributes['notification'])
+
+
+def store(signature, payload):
+    """
+    Store the webhook to be processed later, returns the BraintreeWebhook
+    and whether it was new.
+    """
+    parsed = parse(payload)
+    subscription = getattr(parsed, 'subscription', None)
+    return BraintreeWebhook.objects.get_or_create(
+        subscription_id=subscription.id if subscription else '',
+        timestamp=getattr(parsed, 'timestamp', None),
+        defaults={
+            'kind': parsed.kind,
+            'bt_signature': signature,
+            'bt_payload': payload,
+        })
+
+
+def transaction_uuid():
+    """
+    A short uuid for a transaction, made before it is created so it is only
+    written once. The time keeps it short and the random part unique.
+    """
+    return 'bt-{}-{}'.format(shorter(int(time.time())),
+                             shorter(uuid.uuid4().int >> 64))
+
+
+def _run_all(webhooks):
+    # A webhook can depend on the ones before it for the same subscription,
+    # so stop at the first one that doesn't complete and leave the rest
+    # pending.
+    completed = 0
+    for webhook in webhooks:
+        if webhook.run() is None:
+            break
+        completed += 1
+    return completed
+
+
+def process_pending(limit=100):
+    """
+    Process up to limit pending webhooks, returns how many completed.
+
+    Webhooks for one subscription are run in the order Braintree sent them,
+    stopping at the first one that fails. Different subscriptions are run at
+    the same time in the pool.
+    """
+    stale = datetime.now() - timedelta(
+        seconds=settings.BRAINTREE_WEBHOOK_TIMEOUT)
+    webhooks = (BraintreeWebhook.objects
+                .filter(Q(status=WEBHOOK_PENDING) |
+                        Q(status=WEBHOOK_RUNNING, modified__lt=stale))
+                .order_by('timestamp', 'pk')[:limit])
+    grouped = OrderedDict()
+    for webhook in webhooks:
+        grouped.setdefault(webhook.subscription_id, []).append(webhook)
+
+    futures = [pool.submit(_run_all, group) for group in grouped.values()]
+    return sum(future.result() for future in futures)
+
 
 class Processor(object):
 
@@ -173,11 +267,16 @@ class Processor(object):
         created in solitude. Because of lack of millisecond precision on
         data queries, the best way to find the most recent transaction
         is ordering by id.
+
+        A subscription can have a long history, so the transactions we
+        already have are found in one query and the new ones are created
+        with one insert for each table.
         """
         if not self.subscription:
             raise ValueError('No subscription, call `get_subscription` first.')
 
         their_subscription = self.webhook.subscription
+        wanted = []
         for their_transaction in their_subscription.transactions:
             status = their_transaction.status
             if status not in settings.BRAINTREE_TRANSACTION_STATUSES:
@@ -203,11 +302,18 @@ class Processor(object):
                 reason = their_transaction.gateway_rejection_reason
 
             reason = (their_transaction.status + ' ' + reason).rstrip()
-
-            try:
-                our_transaction = Transaction.objects.get(
-                    uid_support=their_transaction.id,
-                )
+            wanted.append((their_transaction, our_status, reason))
+
+        # One query for all the transactions we already have.
+        existing = dict(
+            (our_transaction.uid_support, our_transaction)
+            for our_transaction in Transaction.objects.filter(
+                uid_support__in=[t.id for t, _, _ in wanted]))
+
+        created = {}
+        for their_transaction, our_status, reason in wanted:
+            our_transaction = existing.get(their_transaction.id)
+            if our_transaction:
                 log.info('Transaction exists: {}'.format(our_transaction.pk))
                 # Just a maybe pointless sanity check that the status they are
                 # sending in their transaction matches our record.
@@ -217,49 +323,64 @@ class Processor(object):
                         .format(their_transaction.status,
                                 our_status,
                                 our_transaction.pk))
+                continue
+
+            if their_transaction.id in created:
+                continue
 
-            except ObjectDoesNotExist:
-                our_transaction = Transaction.objects.create(
-                    amount=their_transaction.amount,
-                    buyer=self.subscription.paymethod.braintree_buyer.buyer,
-                    currency=their_transaction.currency_iso_code,
-                    provider=constants.PROVIDER_BRAINTREE,
-                    seller=self.subscription.seller_product.seller,
-                    seller_product=self.subscription.seller_product,
-                    status=our_status,
-                    status_reason=reason,
-                    type=constants.TYPE_PAYMENT,
-                    uid_support=their_transaction.id
-                )
-
-                # Make the transaction short and helpful
-                # (14 chars, still 4 chars less than the mocks)
-                our_transaction.uuid = (
-                    'bt-{}-{}'.format(
-                        # Should be unique within this db.
-                        shorter(our_transaction.pk),
-                        # If pk is repeated (eg. in tests, dev) should still
-                        # be unique.
-                        shorter(int(time.time())))
-                    )
-                our_transaction.save()
-
-                log.info('Transaction created: {}'.format(our_transaction.pk))
-
-                braintree_transaction = BraintreeTransaction.objects.create(
-                    transaction=our_transaction,
-                    subscription=self.subscription,
-                    paymethod=self.subscription.paymethod,
-                    kind=self.webhook.kind,
-                    billing_period_end_date=(
-                        their_subscription.billing_period_end_date),
-                    billing_period_start_date=(
-                        their_subscription.billing_period_start_date),
-                    next_billing_date=their_subscription.next_billing_date,
-                    next_billing_period_amount=(
-                        their_subscription.next_billing_period_amount),
-                )
-                log.info('BraintreeTransaction created: {}'
-                         .format(braintree_transaction.pk))
-
-            self.transactions.append(our_transaction)
+            created[their_transaction.id] = Transaction(
+                amount=their_transaction.amount,
+                buyer=self.subscription.paymethod.braintree_buyer.buyer,
+                currency=their_transaction.currency_iso_code,
+                provider=constants.PROVIDER_BRAINTREE,
+                seller=self.subscription.seller_product.seller,
+                seller_product=self.subscription.seller_product,
+                status=our_status,
+                status_reason=reason,
+                type=constants.TYPE_PAYMENT,
+                uid_support=their_transaction.id,
+                uuid=transaction_uuid()
+            )
+
+        if created:
+            existing.update(
+                (our_transaction.uid_support, our_transaction)
+                for our_transaction in
+                self.create_transactions(created.values()))
+
+        self.transactions = [existing[their_transaction.id]
+                             for their_transaction, _, _ in wanted]
+
+    def create_transactions(self, transactions):
+        """
+        Create the transactions and a BraintreeTransaction for each of them
+        with one insert each. Returns the created transactions.
+        """
+        Transaction.objects.bulk_create(transactions)
+        # bulk_create doesn't set the primary keys on MySQL, so get the
+        # transactions back by their uuid.
+        transactions = list(Transaction.objects.filter(
+            uuid__in=[t.uuid for t in transactions]))
+        log.info('Transactions created: {}'
+                 .format(', '.join(str(t.pk) for t in transactions)))
+
+        their_subscription = self.webhook.subscription
+        BraintreeTransaction.objects.bulk_create([
+            BraintreeTransaction(
+                # Not transaction=, that would cache this unsaved object on
+                # the transaction.
+                transaction_id=our_transaction.pk,
+                subscription=self.subscription,
+                paymethod=self.subscription.paymethod,
+                kind=self.webhook.kind,
+                billing_period_end_date=(
+                    their_subscription.billing_period_end_date),
+                billing_period_start_date=(
+                    their_subscription.billing_period_start_date),
+                next_billing_date=their_subscription.next_billing_date,
+                next_billing_period_amount=(
+                    their_subscription.next_billing_period_amount),
+            ) for our_transaction in transactions])
+        log.info('BraintreeTransactions created for subscription: {}'
+                 .format(self.subscription.pk))
+        return transactions
@@ -0,0 +1,86 @@
+"""
+A read-through cache of buyers by uuid.
+
+Looking up a buyer by uuid is the most common query solitude does. This keeps
+a small record for each uuid in the cache: the buyer pk, whether they are
+active, their Braintree buyer and how many active payment methods they have.
+
+The record never contains the PIN, new PIN or email. Anything that needs those
+reads the buyer row from the database. The record is only used to decide
+whether to go on with a request, anything that writes rows checks the database
+again first.
+
+Records are deleted when the buyer, Braintree buyer or a payment method is
+saved or deleted and when the buyer is closed, then again once the request
+commits. The lock out and rehash code updates the buyer with queryset updates
+that don't send post_save. That's fine because they only change fields the
+record doesn't have. BUYER_CACHE_TIMEOUT limits how long a record can be stale
+if an invalidation is missed.
+"""
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Sum, When
+
+from solitude.middleware import after_commit
+
+# Stored for a uuid that has no buyer, so unknown uuids don't hit the database
+# every time either.
+MISSING = 'missing'
+
+
+def key(uuid):
+    # Buyer uuids can be any string, memcached keys can't.
+    return 'buyer:uuid:{0}'.format(md5(uuid.encode('utf-8')).hexdigest())
+
+
+def invalidate(uuid):
+    # Until the transaction commits another request can read the old row and
+    # cache it again, so delete it then too.
+    cache.delete(key(uuid))
+    after_commit(cache.delete, key(uuid))
+
+
+def load(uuid):
+    # Imported here because Buyer uses this module.
+    from lib.buyers.models import Buyer
+
+    # One query for the buyer, their Braintree buyer and the active payment
+    # method count.
+    rows = (Buyer.objects.filter(uuid=uuid)
+            .values('pk', 'active', 'braintreebuyer__pk',
+                    'braintreebuyer__braintree_id',
+                    'braintreebuyer__active')
+            .annotate(paymethods=Sum(Case(
+                When(braintreebuyer__paymethods__active=True, then=1),
+                default=0, output_field=IntegerField()))))
+    if not rows:
+        return None
+
+    row = rows[0]
+    return {
+        'pk': row['pk'],
+        'uuid': uuid,
+        'active': row['active'],
+        'braintree_pk': row['braintreebuyer__pk'],
+        'braintree_id': row['braintreebuyer__braintree_id'],
+        'braintree_active': row['braintreebuyer__active'],
+        'paymethods': row['paymethods'] or 0,
+    }
+
+
+def lookup(uuid):
+    """
+    The record for the buyer with this uuid, or None if there isn't one.
+    """
+    if not uuid:
+        return None
+
+    cache_key = key(uuid)
+    record = cache.get(cache_key)
+    if record is None:
+        record = load(uuid) or MISSING
+        cache.set(cache_key, record, settings.BUYER_CACHE_TIMEOUT)
+
+    return None if record == MISSING else record
@@ -0,0 +1,50 @@
+"""
+Closing a buyer's account.
+
+Receivers of Buyer.close_signal return what the buyer has with their payment
+provider that needs cancelling or deleting, as a list of (kind, pk) items. A
+BuyerClosureItem is recorded for each one and the handler registered for the
+kind does the work::
+
+    @closure.handler('braintree:subscription', phase=0)
+    def cancel_subscription(pk):
+        ...
+
+Items are run a phase at a time, with up to BUYER_CLOSE_WORKERS running at
+once. Each item is saved as it finishes. If any fail the closure stops, the
+buyer stays active and closing again runs just the items that haven't
+completed. Once everything is done the buyer is anonymised.
+"""
+from django.conf import settings
+
+from solitude.workers import spawn, WorkerPool
+
+handlers = {}
+
+pool = WorkerPool('close', 'BUYER_CLOSE_WORKERS')
+
+
+def handler(kind, phase=0):
+    """
+    Register func to close items of this kind. Lower phases are run first.
+    """
+    def decorator(func):
+        handlers[kind] = (phase, func)
+        return func
+    return decorator
+
+
+def phase(kind):
+    return handlers[kind][0] if kind in handlers else 0
+
+
+def start(closure):
+    """
+    Run the closure in the background, or straight away if there are no
+    workers, as in the tests.
+    """
+    if not settings.BUYER_CLOSE_WORKERS:
+        closure.run()
+        return
+    # The request carries on using closure, the thread gets its own.
+    spawn(type(closure).objects.get(pk=closure.pk).run)
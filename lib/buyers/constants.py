@@ -3,3 +3,17 @@ BUYER_UUID_ALREADY_EXISTS = 'BUYER_UUID_ALREADY_EXISTS'
 FIELD_REQUIRED = 'FIELD_REQUIRED'
 PIN_4_NUMBERS_LONG = 'PIN_4_NUMBERS_LONG'
 PIN_ONLY_NUMBERS = 'PIN_ONLY_NUMBERS'
+
+# The status of closing a buyer's account and of each item in it.
+CLOSE_PENDING = 0
+CLOSE_RUNNING = 1
+CLOSE_FAILED = 2
+CLOSE_COMPLETED = 3
+
+CLOSE_STATUSES = {
+    'completed': CLOSE_COMPLETED,
+    'failed': CLOSE_FAILED,
+    'pending': CLOSE_PENDING,
+    'running': CLOSE_RUNNING,
+}
+CLOSE_STATUSES_INVERTED = dict((v, k) for k, v in CLOSE_STATUSES.items())
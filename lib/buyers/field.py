@@ -1,7 +1,32 @@
+from django.conf import settings
 from django.contrib.auth.hashers import (check_password, get_hasher,
                                          make_password)
 from django.db.models import CharField, SubfieldBase
 
+from solitude import metrics
+from solitude.errors import ServiceUnavailable
+from solitude.workers import Full, Timeout, WorkerPool
+
+# Hashing PINs is deliberately slow, so it's done in a pool of
+# PIN_HASH_WORKERS threads to bound how much of it happens at once.
+pool = WorkerPool('pin', 'PIN_HASH_WORKERS', 'PIN_HASH_QUEUE')
+
+
+def _run(action, func, *args, **kw):
+    try:
+        with metrics.timer('solitude_pin_seconds', action=action):
+            return pool.run(settings.PIN_HASH_TIMEOUT, func, *args, **kw)
+    except (Full, Timeout):
+        raise ServiceUnavailable('PIN hashing is too busy.')
+
+
+def hash_pin(value, salt):
+    return _run('hash', make_password, value, salt=salt)
+
+
+def check_pin(value, encoded):
+    return _run('check', check_password, value, encoded)
+
 
 class HashField(CharField):
 
@@ -23,7 +48,7 @@ class HashField(CharField):
             # to_python() unless you are doing a .update() in which case
             # to_python()  is not called and the value is passed in raw.
             if not isinstance(value, HashedData):
-                value = make_password(value, salt=self.salt)
+                value = hash_pin(value, self.salt)
             self.salt = False  # dump salt after saving.
         return value
 
@@ -40,7 +65,7 @@ class HashField(CharField):
         # to save the hash, the same value we see is what is put in the DB.
         if not value.startswith(hasher.algorithm):
             self.salt = hasher.salt()
-            value = make_password(value, salt=self.salt)
+            value = hash_pin(value, self.salt)
         return HashedData(value)
 
 
@@ -55,7 +80,28 @@ class HashedData(object):
         if self.value and not other:
             # We can be pretty sure these wont match, exit quickly.
             return False
-        return check_password(other, self.value)
+        return check_pin(other, self.value)
+
+    @property
+    def needs_rehash(self):
+        """
+        True if the hash was made with a different hasher or bcrypt cost
+        than is used now.
+        """
+        if not self.value:
+            return False
+        hasher = get_hasher('default')
+        algorithm, rest = self.value.split('$', 1)
+        if algorithm != hasher.algorithm:
+            return True
+        rounds = getattr(hasher, 'rounds', None)
+        if rounds is None:
+            return False
+        try:
+            # Bcrypt hashes look like: bcrypt$2a$12$..., 12 is the rounds.
+            return int(rest.split('$')[1]) != rounds
+        except (IndexError, ValueError):
+            return False
 
     def __eq__(self, other):
         return self.check(other)
@@ -0,0 +1,159 @@
+"""
+Backends that count PIN failures and lock buyers out, selected with the
+PIN_LOCKOUT_BACKEND setting.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from solitude.logger import getLogger
+
+log = getLogger('s.buyer')
+
+
+def get_lockout():
+    return import_string(settings.PIN_LOCKOUT_BACKEND)()
+
+
+def _expiry(now=None):
+    return ((now or datetime.now()) -
+            timedelta(seconds=settings.PIN_FAILURE_LENGTH))
+
+
+class DatabaseLockout(object):
+
+    """
+    Counts failures on the buyer row. Each step is one conditional UPDATE so
+    there's no race between counting and locking.
+    """
+
+    def locked_out(self, buyer):
+        # A lock out that has expired is left in the database, it is cleared
+        # on the next PIN failure or success. Reads never write.
+        if not buyer.pin_locked_out:
+            return False
+
+        return buyer.pin_locked_out > _expiry()
+
+    def failures(self, buyer):
+        return buyer.pin_failures
+
+    def clear(self, buyer, clear_was_locked=False):
+        updates = {'pin_failures': 0, 'pin_locked_out': None}
+        if clear_was_locked:
+            updates['pin_was_locked_out'] = False
+
+        # Only write if there is something to clear.
+        if all(getattr(buyer, k) == v for k, v in updates.items()):
+            return
+
+        self.update(buyer, updates)
+
+    def update(self, buyer, updates, query=None):
+        """
+        Apply updates to the buyer in the database and on the instance,
+        returning the number of rows changed.
+        """
+        if query is None:
+            query = buyer.__class__.objects.filter(pk=buyer.pk)
+        changed = query.update(counter=F('counter') + 1, **updates)
+        if changed:
+            for k, v in updates.items():
+                setattr(buyer, k, v)
+        return changed
+
+    def lock(self, buyer, failures):
+        """
+        Lock the buyer out, unless they are already. Returns True either way.
+        """
+        now = datetime.now()
+        self.update(buyer, {'pin_failures': failures, 'pin_locked_out': now,
+                            'pin_was_locked_out': True},
+                    query=self.unlocked(buyer, now))
+        return True
+
+    def unlocked(self, buyer, now=None):
+        # Buyers that are currently locked out are not counted.
+        return (buyer.__class__.objects.filter(pk=buyer.pk)
+                .exclude(pin_locked_out__gt=_expiry(now)))
+
+    def incr(self, buyer):
+        now = datetime.now()
+        limit = settings.PIN_FAILURES
+        query = self.unlocked(buyer, now)
+        counter = F('counter') + 1
+
+        # The usual case, a failure under the limit.
+        if query.filter(pin_locked_out=None,
+                        pin_failures__lt=limit - 1).update(
+                pin_failures=F('pin_failures') + 1, counter=counter):
+            buyer.pin_failures += 1
+            return False
+
+        # This failure reaches the limit.
+        if query.filter(pin_locked_out=None,
+                        pin_failures__gte=limit - 1).update(
+                pin_failures=F('pin_failures') + 1, pin_locked_out=now,
+                pin_was_locked_out=True, counter=counter):
+            buyer.pin_failures = max(buyer.pin_failures + 1, limit)
+            buyer.pin_locked_out = now
+            buyer.pin_was_locked_out = True
+            return True
+
+        # The lock out has expired, so this is the first failure again.
+        if limit <= 1:
+            return self.lock(buyer, 1)
+        if self.update(buyer, {'pin_failures': 1, 'pin_locked_out': None},
+                       query=query):
+            return False
+
+        # Nothing matched, so the buyer is locked out.
+        return True
+
+
+class CacheLockout(DatabaseLockout):
+
+    """
+    Counts failures in the cache with an atomic incr, so a burst of failures
+    doesn't queue up on the buyer row. The count expires PIN_FAILURE_LENGTH
+    after the first failure. Only locking out and clearing are written to
+    the database, and if the cache loses the count it starts again from the
+    database.
+    """
+
+    def key(self, buyer):
+        return 'buyer:pin-failures:{0}'.format(buyer.pk)
+
+    def failures(self, buyer):
+        count = cache.get(self.key(buyer))
+        return buyer.pin_failures if count is None else count
+
+    def clear(self, buyer, clear_was_locked=False):
+        cache.delete(self.key(buyer))
+        super(CacheLockout, self).clear(buyer,
+                                        clear_was_locked=clear_was_locked)
+
+    def incr(self, buyer):
+        if self.locked_out(buyer):
+            return True
+
+        key = self.key(buyer)
+        # A lock out that has expired doesn't count.
+        start = 0 if buyer.pin_locked_out else buyer.pin_failures
+        cache.add(key, start, settings.PIN_FAILURE_LENGTH)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            # The key expired or the cache is down.
+            log.warning('PIN failure count not in the cache: {0}'
+                        .format(buyer.pk))
+            return super(CacheLockout, self).incr(buyer)
+
+        if count < settings.PIN_FAILURES:
+            return False
+
+        cache.delete(key)
+        return self.lock(buyer, count)
@@ -0,0 +1,56 @@
+import time
+from optparse import make_option
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+from solitude.utils import percentile
+
+
+class Command(BaseCommand):
+    help = ('Time how long it takes to verify a PIN with each of the '
+            'PASSWORD_HASHERS.')
+    option_list = BaseCommand.option_list + (
+        make_option('--count', action='store', type='int', dest='count',
+                    default=20,
+                    help='Number of verifies for each hasher. Default: 20'),
+        make_option('--rounds', action='store', type='string', dest='rounds',
+                    default='',
+                    help=('Comma separated bcrypt costs to try, instead of '
+                          'BCRYPT_ROUNDS. For example: 10,11,12')),
+    )
+
+    def verify(self, hasher, count):
+        encoded = hasher.encode('1234', hasher.salt())
+        times = []
+        for x in range(count):
+            start = time.time()
+            hasher.verify('1234', encoded)
+            times.append((time.time() - start) * 1000)
+        return times
+
+    def handle(self, *args, **options):
+        rounds = [int(r) for r in options['rounds'].split(',') if r]
+        print '{0:<40} {1:>6} {2:>10} {3:>10}'.format(
+            'hasher', 'rounds', 'p50 (ms)', 'p99 (ms)')
+
+        for hasher in get_hashers():
+            costs = [getattr(hasher, 'rounds', None)]
+            if rounds and costs[0] is not None:
+                costs = rounds
+
+            original = costs[0]
+            for cost in costs:
+                if cost is not None:
+                    hasher.rounds = cost
+                try:
+                    times = self.verify(hasher, options['count'])
+                except NotImplementedError:
+                    # Some hashers can only verify old hashes.
+                    continue
+                finally:
+                    if original is not None:
+                        hasher.rounds = original
+                print '{0:<40} {1:>6} {2:>10.1f} {3:>10.1f}'.format(
+                    hasher.algorithm, cost or '-', percentile(times, 50),
+                    percentile(times, 99))
@@ -1,14 +1,19 @@
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from django.conf import settings
 from django.core.urlresolvers import reverse
-from django.dispatch import Signal
+from django.dispatch import receiver, Signal
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save
 
-from aesfield.field import AESField
-
+from . import cache, closure
+from .constants import (CLOSE_COMPLETED, CLOSE_FAILED, CLOSE_PENDING,
+                        CLOSE_RUNNING, CLOSE_STATUSES)
 from .field import HashField
+from .lockout import get_lockout
+from solitude.aes import AESField
 from solitude.base import Model
 from solitude.logger import getLogger
 
@@ -36,68 +41,200 @@ class Buyer(Model):
 
     @property
     def locked_out(self):
-        if not self.pin_locked_out:
-            return False
-
-        if ((datetime.now() - self.pin_locked_out).seconds >
-                settings.PIN_FAILURE_LENGTH):
-            self.clear_lockout()
-            return False
+        return get_lockout().locked_out(self)
 
-        return True
+    @property
+    def current_pin_failures(self):
+        # With the cache backend pin_failures is only updated on lock out.
+        return get_lockout().failures(self)
 
     def clear_lockout(self, clear_was_locked=False):
-        self.pin_failures = 0
-        self.pin_locked_out = None
-        if clear_was_locked:
-            self.pin_was_locked_out = False
-        self.save()
+        get_lockout().clear(self, clear_was_locked=clear_was_locked)
 
     def incr_lockout(self):
-        # Use F to avoid race conditions, although this means an extra
-        # query to check if we've gone over the limit.
-        self.pin_failures = models.F('pin_failures') + 1
-        self.save()
-
-        failing = self.reget()
-        if failing.pin_failures >= settings.PIN_FAILURES:
-            failing.pin_locked_out = datetime.now()
-            failing.pin_was_locked_out = True
-            failing.save()
-            # Indicate to the caller that we are now locked out.
-            return True
-
-        return False
+        """
+        Count a PIN failure, returns True if the buyer is now locked out.
+        """
+        return get_lockout().incr(self)
 
-    def close(self):
+    def rehash_pin(self, pin):
         """
-        An explicit close command that goes and changes all the associated
-        payment providers for this account and assumes that anything they
-        need to do happens.
+        Store the PIN hashed with the current policy, call this with the
+        PIN after it has been verified.
+        """
+        log.info('Rehashing PIN for: {0}'.format(self.pk))
+        Buyer.objects.filter(pk=self.pk).update(pin=pin,
+                                                counter=F('counter') + 1)
 
-        Warning:
+    def start_close(self):
+        """
+        Get the closure for this account, creating it if needed. A closure
+        that failed is picked up again.
 
-        This is performing multiple actions across the multiple payment
-        providers. Some actions are irreversible. If the action fails, then
-        the entire transaction in solitude will be rolled back. Leaving us in a
-        confusing state.
+        The close signal is sent each time, so anything the payment providers
+        have added since is closed too.
         """
-        log.warning('Anonymising account starting: {}'.format(self.pk))
         if self.uuid.startswith(ANONYMISED):
             raise ValueError('Account already anonymised.')
 
-        self.close_signal.send(
+        closure = (self.closures.exclude(status=CLOSE_COMPLETED)
+                   .order_by('-pk').first())
+        if closure is None:
+            closure = BuyerClosure.objects.create(buyer=self)
+
+        responses = self.close_signal.send(
             buyer=self,
             dispatch_uid='close_account_signal_{}'.format(self.pk),
-            sender=self.__class__
+            sender=Buyer
         )
+        for receiver_, items in responses:
+            for kind, pk in items or []:
+                closure.items.get_or_create(kind=kind, object_pk=pk)
+        return closure
+
+    def close(self):
+        """
+        Close the account and wait for it to finish, returning the
+        BuyerClosure. All the associated payment providers are told to
+        cancel or delete what the buyer has with them and then the account
+        is anonymised.
+
+        If anything fails the account is left active and the closure is
+        marked as failed. The changes already made at the payment providers
+        are recorded, so closing again carries on from where it stopped.
+
+        A buyer that isn't in the database has nothing to close, so it's
+        just anonymised and None is returned.
+        """
+        if self.pk is None:
+            self.anonymise()
+            return None
+
+        result = self.start_close()
+        result.run()
+        return result
 
-        # All succeeds, so go ahead and anonymise the account.
+    def anonymise(self):
+        log.warning('Anonymising account starting: {}'.format(self.pk))
+        old_uuid = self.uuid
         self.active = False
         self.email = ''
         self.uuid = ANONYMISED + str(uuid.uuid4())
         self.save()
+        cache.invalidate(old_uuid)
         log.warning('Anonymising account complete: {}'.format(self.pk))
 
     def get_uri(self):
         return reverse('generic:buyer-detail', kwargs={'pk': self.pk})
+
+
+class BuyerClosure(Model):
+
+    """
+    Closing a buyer's account, see lib.buyers.closure.
+    """
+    buyer = models.ForeignKey(Buyer, related_name='closures')
+    status = models.PositiveIntegerField(
+        choices=[(v, k) for k, v in CLOSE_STATUSES.items()],
+        default=CLOSE_PENDING)
+
+    class Meta(Model.Meta):
+        db_table = 'buyer_closure'
+
+    def claim(self):
+        """
+        Mark the closure as running, returns False if it already is. A
+        closure that has been running longer than BUYER_CLOSE_TIMEOUT is
+        assumed to have died and can be claimed again.
+        """
+        now = datetime.now()
+        stale = now - timedelta(seconds=settings.BUYER_CLOSE_TIMEOUT)
+        claimed = (BuyerClosure.objects.filter(pk=self.pk)
+                   .filter(Q(status__in=[CLOSE_PENDING, CLOSE_FAILED]) |
+                           Q(status=CLOSE_RUNNING, modified__lt=stale))
+                   .update(status=CLOSE_RUNNING, modified=now,
+                           counter=F('counter') + 1))
+        if claimed:
+            self.status = CLOSE_RUNNING
+        return bool(claimed)
+
+    def finish(self, status):
+        self.status = status
+        self.save()
+
+    def run(self):
+        if not self.claim():
+            log.info('Closure already running: {0}'.format(self.pk))
+            return
+
+        log.warning('Closing account: {0}, closure: {1}'
+                    .format(self.buyer_id, self.pk))
+        items = list(self.items.exclude(status=CLOSE_COMPLETED))
+        for phase in sorted(set(closure.phase(i.kind) for i in items)):
+            futures = [closure.pool.submit(item.run) for item in items
+                       if closure.phase(item.kind) == phase]
+            results = [future.result() for future in futures]
+            if not all(results):
+                log.error('Closing account failed: {0}, closure: {1}'
+                          .format(self.buyer_id, self.pk))
+                self.finish(CLOSE_FAILED)
+                return
+
+        self.buyer.anonymise()
+        self.finish(CLOSE_COMPLETED)
+
+    def get_uri(self):
+        return reverse('generic:close', kwargs={'pk': self.buyer_id})
+
+
+class BuyerClosureItem(Model):
+
+    """
+    One thing to cancel or delete at a payment provider when closing.
+    """
+    closure = models.ForeignKey(BuyerClosure, related_name='items')
+    # The handler to run, for example braintree:subscription.
+    kind = models.CharField(max_length=255)
+    # The object the handler is run on.
+    object_pk = models.PositiveIntegerField()
+    status = models.PositiveIntegerField(
+        choices=[(v, k) for k, v in CLOSE_STATUSES.items()],
+        default=CLOSE_PENDING)
+    error = models.CharField(max_length=255, blank=True, null=True)
+
+    class Meta(Model.Meta):
+        db_table = 'buyer_closure_item'
+        unique_together = (('closure', 'kind', 'object_pk'),)
+
+    def run(self):
+        """
+        Run the handler for this item, returns True if it worked.
+        """
+        try:
+            func = closure.handlers[self.kind][1]
+            func(self.object_pk)
+        except Exception, err:
+            log.exception('Closure item failed: {0}'.format(self.pk))
+            self.finish(CLOSE_FAILED, repr(err)[:255])
+            return False
+
+        self.finish(CLOSE_COMPLETED, None)
+        return True
+
+    def finish(self, status, error):
+        self.status = status
+        self.error = error
+        self.save()
+        # Touch the closure so that a long run isn't mistaken for a dead one
+        # and claimed again after BUYER_CLOSE_TIMEOUT.
+        (BuyerClosure.objects.filter(pk=self.closure_id)
+         .update(modified=datetime.now()))
+
+
+# Buyers loaded through the cache are deferred subclasses of Buyer, so this
+# can't filter on the sender.
+@receiver(post_save, dispatch_uid='buyer_cache_invalidate')
+@receiver(post_delete, dispatch_uid='buyer_cache_invalidate_delete')
+def invalidate_cache(sender, instance, **kw):
+    if isinstance(instance, Buyer):
+        cache.invalidate(instance.uuid)
@@ -2,9 +2,11 @@ from django.core.urlresolvers import reverse
 
 from rest_framework import serializers
 
-from lib.buyers.constants import BUYER_UUID_ALREADY_EXISTS, FIELD_REQUIRED
+from lib.buyers.constants import (BUYER_UUID_ALREADY_EXISTS,
+                                  CLOSE_STATUSES, CLOSE_STATUSES_INVERTED,
+                                  FIELD_REQUIRED)
 from lib.buyers.forms import clean_pin
-from lib.buyers.models import Buyer
+from lib.buyers.models import Buyer, BuyerClosure
 from solitude.base import BaseSerializer
 
 
@@ -17,7 +19,8 @@ class BaseBuyerSerializer(BaseSerializer):
 class BuyerSerializer(BaseBuyerSerializer):
     pin_is_locked_out = serializers.BooleanField(
         source='locked_out', read_only=True)
-    pin_failures = serializers.IntegerField(read_only=True)
+    pin_failures = serializers.IntegerField(source='current_pin_failures',
+                                            read_only=True)
     uuid = serializers.CharField(
         error_messages={'required': FIELD_REQUIRED, 'blank': FIELD_REQUIRED},
     )
@@ -96,3 +99,34 @@ class VerifiedSerializer(BaseBuyerSerializer):
 
     def get_locked(self, obj):
         return self.locked
+
+
+class ClosureSerializer(BaseSerializer):
+    status = serializers.SerializerMethodField('get_status')
+    items = serializers.SerializerMethodField('get_items')
+    errors = serializers.SerializerMethodField('get_errors')
+
+    class Meta:
+        model = BuyerClosure
+        fields = [
+            'buyer', 'created', 'errors', 'items', 'modified',
+            'resource_pk', 'resource_uri', 'status'
+        ]
+
+    def get_resource_uri(self, obj):
+        return obj.get_uri()
+
+    def get_status(self, obj):
+        return CLOSE_STATUSES_INVERTED[obj.status]
+
+    def get_items(self, obj):
+        counts = dict((name, 0) for name in CLOSE_STATUSES)
+        for item in obj.items.all():
+            counts[CLOSE_STATUSES_INVERTED[item.status]] += 1
+        return counts
+
+    def get_errors(self, obj):
+        return [item.error for item in obj.items.all() if item.error]
+
+    def transform_buyer(self, obj, value):
+        return reverse('generic:buyer-detail', kwargs={'pk': obj.buyer_id})
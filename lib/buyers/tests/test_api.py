@@ -1,13 +1,17 @@
 from datetime import datetime, timedelta
 
 from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
 
 import mock
 from django_paranoia.signals import warning
 from nose import SkipTest
 from nose.tools import eq_
 
+from lib.buyers import closure
 from lib.buyers.constants import BUYER_UUID_ALREADY_EXISTS, FIELD_REQUIRED
 from lib.buyers.models import Buyer
 from solitude.base import APITest
@@ -77,6 +81,11 @@ class TestBuyer(APITest):
         eq_(data['email'], self.email)
         eq_(data['locale'], 'en-US')
 
+    def test_get_queries(self):
+        obj = self.create()
+        with self.query_budget(1):
+            eq_(self.client.get(obj.get_uri()).status_code, 200)
+
     @mock.patch.object(settings, 'PIN_FAILURES', 1)
     def test_locked_out(self):
         obj = self.create()
@@ -200,7 +209,7 @@ class TestBuyerVerifyPin(APITest):
     def test_failure_counted(self):
         self.client.post(self.list_url, data={'uuid': self.uuid,
                                               'pin': self.pin[::-1]})
-        eq_(self.buyer.reget().pin_failures, 1)
+        eq_(self.buyer.reget().current_pin_failures, 1)
 
     @mock.patch.object(settings, 'PIN_FAILURES', 1)
     @mock.patch('lib.buyers.views.log_cef')
@@ -269,6 +278,21 @@ class TestBuyerVerifyPin(APITest):
                                               'pin': self.pin})
         eq_(self.buyer.reget().pin_was_locked_out, False)
 
+    def test_good_pin_rehashed(self):
+        hasher = get_hasher('default')
+        with mock.patch.object(hasher, 'rounds', hasher.rounds + 1):
+            self.client.post(self.list_url, data={'uuid': self.uuid,
+                                                  'pin': self.pin})
+            assert not self.buyer.reget().pin.needs_rehash
+
+
+@override_settings(PIN_LOCKOUT_BACKEND='lib.buyers.lockout.CacheLockout')
+class TestBuyerVerifyPinCache(TestBuyerVerifyPin):
+
+    def setUp(self):
+        cache.clear()
+        super(TestBuyerVerifyPinCache, self).setUp()
+
 
 class TestBuyerConfirmPin(APITest):
 
@@ -381,8 +405,31 @@ class TestBuyerClose(APITest):
 
     def test_close(self):
         res = self.client.post(self.url)
-        eq_(res.status_code, 204)
+        eq_(res.status_code, 202)
         eq_(self.buyer.reget().active, False, res.content)
+        eq_(res.json['status'], 'completed')
+        eq_(res.json['resource_uri'], self.url)
+
+    def test_status(self):
+        self.client.post(self.url)
+        res = self.client.get(self.url)
+        eq_(res.status_code, 200)
+        eq_(res.json['status'], 'completed')
+        eq_(res.json['buyer'], self.buyer.get_uri())
+
+    def test_status_none(self):
+        eq_(self.client.get(self.url).status_code, 404)
+
+    def test_failed(self):
+        closure.handler('test:fail')(mock.Mock(side_effect=ValueError))
+        self.addCleanup(closure.handlers.pop, 'test:fail')
+        with mock.patch.object(Buyer, 'close_signal') as signal:
+            signal.send.return_value = [(None, [('test:fail', 1)])]
+            res = self.client.post(self.url)
+        eq_(res.status_code, 202)
+        eq_(res.json['status'], 'failed')
+        eq_(res.json['items']['failed'], 1)
+        eq_(self.buyer.reget().active, True)
 
     def test_already_closed(self):
         self.buyer.active = False
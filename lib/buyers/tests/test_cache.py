@@ -0,0 +1,171 @@
+from django.core.cache import cache as django_cache
+from django.test import RequestFactory, TestCase
+from django.test.utils import override_settings
+
+from nose.tools import eq_, ok_
+
+from lib.brains.forms import BuyerForm, PaymentMethodForm
+from lib.brains.models import BraintreeBuyer, BraintreePaymentMethod
+from lib.brains.tests.base import create_braintree_buyer, create_method
+from lib.buyers import cache
+from lib.buyers.forms import PinForm
+from lib.buyers.models import Buyer
+from solitude.constants import PAYMENT_METHOD_CARD
+from solitude.middleware import CommitMiddleware
+
+
+@override_settings(BUYER_CACHE_TIMEOUT=300)
+class TestCache(TestCase):
+
+    def setUp(self):
+        django_cache.clear()
+        self.buyer, self.braintree_buyer = create_braintree_buyer()
+        self.uuid = self.buyer.uuid
+
+    def test_lookup(self):
+        create_method(self.braintree_buyer)
+        record = cache.lookup(self.uuid)
+        eq_(record['pk'], self.buyer.pk)
+        eq_(record['braintree_pk'], self.braintree_buyer.pk)
+        eq_(record['braintree_id'], 'sample:id')
+        eq_(record['paymethods'], 1)
+
+    def test_no_pin(self):
+        self.buyer.pin = '1234'
+        self.buyer.save()
+        record = cache.lookup(self.uuid)
+        ok_('pin' not in record)
+        ok_(self.buyer.reget().pin.value not in str(record))
+
+    def test_cached(self):
+        cache.lookup(self.uuid)
+        with self.assertNumQueries(0):
+            eq_(cache.lookup(self.uuid)['pk'], self.buyer.pk)
+
+    def test_missing(self):
+        eq_(cache.lookup('nope'), None)
+        with self.assertNumQueries(0):
+            eq_(cache.lookup('nope'), None)
+
+    def test_created(self):
+        eq_(cache.lookup('new'), None)
+        Buyer.objects.create(uuid='new')
+        ok_(cache.lookup('new'))
+
+    def test_inactive_paymethod(self):
+        create_method(self.braintree_buyer)
+        method = create_method(self.braintree_buyer)
+        eq_(cache.lookup(self.uuid)['paymethods'], 2)
+        method.active = False
+        method.save()
+        eq_(cache.lookup(self.uuid)['paymethods'], 1)
+
+    def test_paymethod_save_queries(self):
+        method = create_method(self.braintree_buyer).reget()
+        # The update and the buyer uuid.
+        with self.assertNumQueries(2):
+            method.save()
+
+    def test_after_commit(self):
+        middleware = CommitMiddleware()
+        middleware.process_request(RequestFactory().get('/'))
+        record = cache.lookup(self.uuid)
+        self.buyer.active = False
+        self.buyer.save()
+        # Another request caches the row before this one commits.
+        django_cache.set(cache.key(self.uuid), record)
+        middleware.process_response(None, None)
+        eq_(cache.lookup(self.uuid)['active'], False)
+
+    def test_no_braintree(self):
+        buyer = Buyer.objects.create(uuid='no-braintree')
+        record = cache.lookup(buyer.uuid)
+        eq_(record['braintree_pk'], None)
+        eq_(record['paymethods'], 0)
+
+    def test_braintree_created(self):
+        buyer = Buyer.objects.create(uuid='no-braintree')
+        cache.lookup(buyer.uuid)
+        BraintreeBuyer.objects.create(buyer=buyer, braintree_id='new')
+        eq_(cache.lookup(buyer.uuid)['braintree_id'], 'new')
+
+    def test_save(self):
+        cache.lookup(self.uuid)
+        self.buyer.active = False
+        self.buyer.save()
+        eq_(cache.lookup(self.uuid)['active'], False)
+
+    def test_close(self):
+        cache.lookup(self.uuid)
+        self.buyer.close()
+        eq_(cache.lookup(self.uuid), None)
+        ok_(cache.lookup(self.buyer.uuid))
+
+    def test_pin_form(self):
+        form = PinForm({'uuid': self.uuid, 'pin': '1234'})
+        ok_(form.is_valid())
+        eq_(form.cleaned_data['buyer'], self.buyer)
+
+    def test_buyer_form_exists(self):
+        form = BuyerForm({'uuid': self.uuid})
+        ok_(not form.is_valid())
+        eq_(form.errors.as_data()['uuid'][0].code, 'already_exists')
+
+    def test_buyer_form(self):
+        buyer = Buyer.objects.create(uuid='no-braintree')
+        cache.lookup(buyer.uuid)
+        form = BuyerForm({'uuid': buyer.uuid})
+        # Only the check for a Braintree buyer.
+        with self.assertNumQueries(1):
+            ok_(form.is_valid())
+        eq_(form.buyer.pk, buyer.pk)
+
+    def test_paymethod_form(self):
+        cache.lookup(self.uuid)
+        form = PaymentMethodForm({'buyer_uuid': self.uuid, 'nonce': 'n'})
+        # Only the payment method count.
+        with self.assertNumQueries(1):
+            ok_(form.is_valid())
+            eq_(form.braintree_data['customer_id'], 'sample:id')
+        eq_(form.braintree_buyer.pk, self.braintree_buyer.pk)
+
+    def test_paymethod_form_deferred(self):
+        self.buyer.email = 'f@f.c'
+        self.buyer.save()
+        form = PaymentMethodForm({'buyer_uuid': self.uuid, 'nonce': 'n'})
+        ok_(form.is_valid())
+        # Fields not in the cache are loaded from the database.
+        eq_(form.buyer.email, 'f@f.c')
+
+    @override_settings(BRAINTREE_MAX_METHODS=1)
+    def test_paymethod_form_max(self):
+        create_method(self.braintree_buyer)
+        form = PaymentMethodForm({'buyer_uuid': self.uuid, 'nonce': 'n'})
+        ok_(not form.is_valid())
+        eq_(form.errors.as_data()['buyer_uuid'][0].code, 'max_size')
+
+    @override_settings(BRAINTREE_MAX_METHODS=1)
+    def test_paymethod_form_max_stale(self):
+        cache.lookup(self.uuid)
+        # Not saved, so the record still has no payment methods.
+        BraintreePaymentMethod.objects.bulk_create(
+            [BraintreePaymentMethod(braintree_buyer=self.braintree_buyer,
+                                    provider_id='stale',
+                                    type=PAYMENT_METHOD_CARD)])
+        form = PaymentMethodForm({'buyer_uuid': self.uuid, 'nonce': 'n'})
+        ok_(not form.is_valid())
+        eq_(form.errors.as_data()['buyer_uuid'][0].code, 'max_size')
+
+    def test_buyer_form_stale(self):
+        buyer = Buyer.objects.create(uuid='no-braintree')
+        cache.lookup(buyer.uuid)
+        BraintreeBuyer.objects.bulk_create(
+            [BraintreeBuyer(buyer=buyer, braintree_id='stale')])
+        form = BuyerForm({'uuid': buyer.uuid})
+        ok_(not form.is_valid())
+        eq_(form.errors.as_data()['uuid'][0].code, 'already_exists')
+
+    def test_delete(self):
+        cache.lookup(self.uuid)
+        self.braintree_buyer.delete()
+        eq_(cache.lookup(self.uuid)['braintree_pk'], None)
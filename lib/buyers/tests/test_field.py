@@ -0,0 +1,63 @@
+from django.contrib.auth.hashers import get_hasher
+from django.core.management import call_command
+from django.test import TestCase
+
+from mock import patch
+from nose.tools import eq_, ok_
+
+from lib.buyers.field import HashedData
+from lib.buyers.models import Buyer
+from solitude.errors import ServiceUnavailable
+from solitude.workers import Full, Timeout
+
+
+class TestHashedData(TestCase):
+
+    def setUp(self):
+        self.buyer = Buyer.objects.create(uuid='test:uid', pin='1234')
+
+    def test_check(self):
+        pin = self.buyer.reget().pin
+        ok_(pin == '1234')
+        ok_(not pin == '4321')
+
+    def test_no_rehash(self):
+        ok_(not self.buyer.reget().pin.needs_rehash)
+
+    def test_rehash_rounds(self):
+        hasher = get_hasher('default')
+        with patch.object(hasher, 'rounds', hasher.rounds + 1):
+            ok_(self.buyer.reget().pin.needs_rehash)
+
+    def test_rehash_algorithm(self):
+        ok_(HashedData('sha512$salt$hash').needs_rehash)
+
+    def test_rehash_empty(self):
+        ok_(not HashedData('').needs_rehash)
+
+    def test_rehash_pin(self):
+        hasher = get_hasher('default')
+        with patch.object(hasher, 'rounds', hasher.rounds + 1):
+            self.buyer.rehash_pin('1234')
+            buyer = self.buyer.reget()
+            ok_(not buyer.pin.needs_rehash)
+        ok_(buyer.pin == '1234')
+        eq_(buyer.counter, self.buyer.counter + 1)
+
+    @patch('lib.buyers.field.pool.run')
+    def test_timeout(self, run):
+        run.side_effect = Timeout
+        with self.assertRaises(ServiceUnavailable):
+            self.buyer.reget().pin == '1234'
+
+    @patch('lib.buyers.field.pool.run')
+    def test_full(self, run):
+        run.side_effect = Full
+        with self.assertRaises(ServiceUnavailable):
+            self.buyer.reget().pin == '1234'
+
+
+class TestBenchmark(TestCase):
+
+    def test_benchmark(self):
+        call_command('pin_benchmark', count=1, rounds='4,5')
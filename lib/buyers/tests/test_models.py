@@ -2,12 +2,17 @@ from datetime import datetime, timedelta
 
 from django.conf import settings
 from django.dispatch import receiver
+from django.core.cache import cache
 from django.test import TestCase
+from django.test.utils import override_settings
 
 from aesfield.field import EncryptedField
-from nose.tools import eq_
+from mock import patch
+from nose.tools import eq_, ok_
 
-from lib.buyers.models import ANONYMISED, Buyer
+from lib.buyers import closure
+from lib.buyers.constants import CLOSE_COMPLETED, CLOSE_FAILED
+from lib.buyers.models import ANONYMISED, Buyer, BuyerClosure
 
 
 class TestEncryption(TestCase):
@@ -36,6 +41,8 @@ class TestEncryption(TestCase):
 
 
 class TestLockout(TestCase):
+    # The queries to count a failure under the limit.
+    incr_queries = 1
 
     def setUp(self):
         self.uid = 'test:uid'
@@ -51,7 +58,7 @@ class TestLockout(TestCase):
         for x in range(1, settings.PIN_FAILURES + 1):
             res = self.buyer.incr_lockout()
             buyer = self.buyer.reget()
-            eq_(buyer.pin_failures, x)
+            eq_(buyer.current_pin_failures, x)
 
             # On the last pass, we should be locked out.
             if x == settings.PIN_FAILURES:
@@ -63,11 +70,15 @@ class TestLockout(TestCase):
                 assert not buyer.pin_locked_out
 
     def test_clear(self):
-        self.buyer.pin_failues = 1
+        self.buyer.pin_failures = 1
         self.buyer.pin_locked_out = datetime.now()
+        self.buyer.save()
         self.buyer.clear_lockout()
         eq_(self.buyer.pin_failures, 0)
         eq_(self.buyer.pin_locked_out, None)
+        buyer = self.buyer.reget()
+        eq_(buyer.pin_failures, 0)
+        eq_(buyer.pin_locked_out, None)
 
     def test_was_locked_out(self):
         self.buyer.pin_failures = settings.PIN_FAILURES
@@ -101,8 +112,73 @@ class TestLockout(TestCase):
             datetime.now() -
             timedelta(seconds=settings.PIN_FAILURE_LENGTH + 60))
         self.buyer.save()
-        assert not self.buyer.locked_out
-        eq_(self.buyer.reget().pin_locked_out, None)
+        with self.assertNumQueries(0):
+            assert not self.buyer.locked_out
+        # Reading doesn't clear the lock out.
+        assert self.buyer.reget().pin_locked_out
+
+    def test_over_timeout_increment(self):
+        self.buyer.pin_failures = settings.PIN_FAILURES
+        self.buyer.pin_locked_out = (
+            datetime.now() -
+            timedelta(seconds=settings.PIN_FAILURE_LENGTH + 60))
+        self.buyer.save()
+        assert not self.buyer.incr_lockout()
+        buyer = self.buyer.reget()
+        eq_(buyer.current_pin_failures, 1)
+        assert not buyer.locked_out
+
+    def test_increment_locked_out(self):
+        self.buyer.pin_failures = settings.PIN_FAILURES
+        self.buyer.pin_locked_out = datetime.now().replace(microsecond=0)
+        self.buyer.save()
+        assert self.buyer.incr_lockout()
+        buyer = self.buyer.reget()
+        eq_(buyer.pin_failures, settings.PIN_FAILURES)
+        eq_(buyer.pin_locked_out, self.buyer.pin_locked_out)
+
+    def test_increment_queries(self):
+        with self.assertNumQueries(self.incr_queries):
+            assert not self.buyer.incr_lockout()
+
+    def test_increment_counter(self):
+        counter = self.buyer.reget().counter
+        self.buyer.incr_lockout()
+        eq_(self.buyer.reget().counter, counter + 1)
+
+    def test_clear_nothing(self):
+        with self.assertNumQueries(0):
+            self.buyer.clear_lockout()
+
+
+@override_settings(PIN_LOCKOUT_BACKEND='lib.buyers.lockout.CacheLockout')
+class TestCacheLockout(TestLockout):
+    incr_queries = 0
+
+    def setUp(self):
+        cache.clear()
+        super(TestCacheLockout, self).setUp()
+
+    def test_increment_counter(self):
+        counter = self.buyer.reget().counter
+        self.buyer.incr_lockout()
+        buyer = self.buyer.reget()
+        # Nothing is written until the buyer is locked out.
+        eq_(buyer.counter, counter)
+        eq_(buyer.pin_failures, 0)
+        eq_(buyer.current_pin_failures, 1)
+
+    def test_cache_miss(self):
+        self.buyer.pin_failures = settings.PIN_FAILURES - 1
+        self.buyer.save()
+        with patch.object(cache, 'incr', side_effect=ValueError):
+            assert self.buyer.incr_lockout()
+        assert self.buyer.reget().locked_out
+
+    def test_clear_cache(self):
+        self.buyer.incr_lockout()
+        self.buyer.clear_lockout()
+        eq_(self.buyer.reget().current_pin_failures, 0)
 
 
 class TestClose(TestCase):
@@ -134,3 +210,86 @@ class TestClose(TestCase):
 
         self.buyer.close()
         assert self.called
+
+
+class TestClosure(TestCase):
+
+    def setUp(self):
+        self.buyer = Buyer.objects.create(uuid='some:buyer')
+        self.calls = []
+        self.fail = set()
+        # Put back the real handlers afterwards.
+        self.addCleanup(closure.handlers.update, dict(closure.handlers))
+        self.addCleanup(closure.handlers.clear)
+        closure.handlers.clear()
+
+        for kind, phase in (('test:first', 0), ('test:second', 1)):
+            closure.handler(kind, phase=phase)(self.handle(kind))
+
+        @receiver(Buyer.close_signal, sender=Buyer, weak=False,
+                  dispatch_uid='test_closure')
+        def signal(sender, *args, **kw):
+            return [('test:second', 1), ('test:first', 1),
+                    ('test:first', 2)]
+
+        self.addCleanup(Buyer.close_signal.disconnect,
+                        dispatch_uid='test_closure', sender=Buyer)
+
+    def handle(self, kind):
+        def func(pk):
+            if (kind, pk) in self.fail:
+                raise ValueError('nope')
+            self.calls.append((kind, pk))
+        return func
+
+    def test_phases(self):
+        result = self.buyer.close()
+        eq_(result.status, CLOSE_COMPLETED)
+        eq_(sorted(self.calls[:2]), [('test:first', 1), ('test:first', 2)])
+        eq_(self.calls[2], ('test:second', 1))
+        eq_(set(result.items.values_list('status', flat=True)),
+            set([CLOSE_COMPLETED]))
+
+    def test_failed(self):
+        self.fail.add(('test:first', 2))
+        result = self.buyer.close()
+        eq_(result.status, CLOSE_FAILED)
+        eq_(self.calls, [('test:first', 1)])
+        eq_(result.items.get(kind='test:first', object_pk=2).error,
+            "ValueError('nope',)")
+        eq_(self.buyer.reget().active, True)
+
+    def test_resumed(self):
+        self.fail.add(('test:first', 2))
+        first = self.buyer.close()
+        self.fail.clear()
+        second = self.buyer.close()
+        eq_(first.pk, second.pk)
+        eq_(second.status, CLOSE_COMPLETED)
+        eq_(self.calls, [('test:first', 1), ('test:first', 2),
+                         ('test:second', 1)])
+        eq_(self.buyer.reget().active, False)
+
+    def test_no_handler(self):
+        closure.handlers.pop('test:second')
+        eq_(self.buyer.close().status, CLOSE_FAILED)
+
+    def test_running(self):
+        result = self.buyer.start_close()
+        ok_(result.claim())
+        ok_(not result.claim())
+        result.run()
+        eq_(self.calls, [])
+
+    def test_item_touches_closure(self):
+        result = self.buyer.start_close()
+        old = datetime.now() - timedelta(days=1)
+        BuyerClosure.objects.filter(pk=result.pk).update(modified=old)
+        ok_(result.items.all()[0].run())
+        ok_(result.reget().modified > old)
+
+    def test_running_stale(self):
+        result = self.buyer.start_close()
+        ok_(result.claim())
+        with self.settings(BUYER_CLOSE_TIMEOUT=-1):
+            ok_(result.claim())
@@ -1,12 +1,16 @@
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
+from lib.buyers import closure
 from lib.buyers.forms import PinForm
-from lib.buyers.models import Buyer
+from lib.buyers.models import Buyer, BuyerClosure
 from lib.buyers.serializers import (
-    BuyerSerializer, ConfirmedSerializer, VerifiedSerializer)
+    BuyerSerializer, ClosureSerializer, ConfirmedSerializer,
+    VerifiedSerializer)
 from solitude.base import log_cef, NonDeleteModelViewSet
 from solitude.errors import FormError
 from solitude.logger import getLogger
@@ -53,9 +57,9 @@ def verify_pin(request):
 
         if buyer.pin_confirmed:
             # Note that the incr_lockout and clear_lockout methods
-            # trigger saves on the object. You should not do a save
-            # in this view as well for fear of stomping on the save
-            # caused by those methods.
+            # update the database directly. You should not do a save
+            # in this view as well for fear of stomping on those
+            # updates.
             if buyer.locked_out:
                 log_cef('Attempted access to locked out account: %s'
                         % buyer.uuid, request, severity=1)
@@ -71,6 +75,8 @@ def verify_pin(request):
                                 request, severity=1)
                 else:
                     buyer.clear_lockout(clear_was_locked=True)
+                    if buyer.pin.needs_rehash:
+                        buyer.rehash_pin(form.cleaned_data['pin'])
 
         output = VerifiedSerializer(instance=buyer, valid=valid, locked=locked)
         return Response(output.data)
@@ -105,9 +111,20 @@ def reset_confirm_pin(request):
     raise FormError(form.errors)
 
 
-@api_view(['POST'])
+# Each closure item is committed as it completes, so that closing can be
+# resumed, this can't be in the request transaction.
+@transaction.non_atomic_requests
+@api_view(['GET', 'POST'])
 def close(request, pk):
+    if request.method == 'GET':
+        result = (BuyerClosure.objects.filter(buyer=pk)
+                  .order_by('-pk').first())
+        if result is None:
+            raise Http404
+        return Response(ClosureSerializer(result).data)
+
     buyer = get_object_or_404(Buyer, pk=pk, active=True)
     log.info('Closing account for: {}'.format(buyer.pk))
-    buyer.close()
-    return Response(status=204)
+    result = buyer.start_close()
+    closure.start(result)
+    return Response(ClosureSerializer(result).data, status=202)
@@ -8,6 +8,7 @@ from nose.tools import eq_, ok_
 from slumber.exceptions import HttpClientError
 
 from ..views import NoReference, ProxyView
+from solitude import bulkheads
 
 
 class FakeView(ProxyView):
@@ -67,6 +68,14 @@ class TestAPIasProxy(TestCase):
         result.update({'headers': {'x-solitude-service': 'http://zippy:2605'}})
         eq_(self.api.products.get.call_args[1], result)
 
+    def test_bulkhead(self):
+        with self.settings(BULKHEADS={
+                'reference': {'size': 1, 'timeout': 0}}):
+            with bulkheads.limit('reference'):
+                res = self.request('get', '/reference/products', 'products')
+        eq_(res.status_code, 503)
+        ok_(not self.api.products.get.called)
+
     def test_proxy_error_responses(self):
         # Create a scenario where the proxied API raises an HTTP error.
         data = {'error': {'message': 'something not found'}}
@@ -7,8 +7,10 @@ from slumber.exceptions import HttpClientError
 
 import client
 from errors import NoReference
+from solitude import bulkheads, metrics
 from solitude.base import BaseAPIView
 from solitude.logger import getLogger
+from solitude.middleware import server_timing
 
 log = getLogger('s.provider')
 
@@ -79,9 +81,14 @@ class ProxyView(BaseAPIView):
             settings.ZIPPY_CONFIGURATION[self.reference_name]['url'])
 
         try:
-            with statsd.timer('solitude.provider.{ref}.proxy.{method}'
-                              .format(ref=self.reference_name,
-                                      method=method)):
+            with bulkheads.limit(self.reference_name), \
+                    statsd.timer('solitude.provider.{ref}.proxy.{method}'
+                                 .format(ref=self.reference_name,
+                                         method=method)), \
+                    metrics.timer('solitude_provider_request_seconds',
+                                  reference=self.reference_name,
+                                  method=method), \
+                    server_timing(self.reference_name):
                 result = proxied_endpoint(*args, **kwargs)
                 # It looks like the proxied endpoint does not return a status
                 # so we'll assume its a 200. That's not great.
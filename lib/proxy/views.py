@@ -11,6 +11,7 @@ from slumber import url_join
 from curling.lib import sign_request
 from lib.bango.constants import HEADERS_ALLOWED_INVERTED, HEADERS_SERVICE_GET
 from lib.proxy.constants import HEADERS_URL_GET
+from solitude import metrics
 from solitude.base import dump_request, dump_response
 from solitude.logger import getLogger
 
@@ -56,7 +57,9 @@ class Proxy(object):
         method = getattr(requests, self.method)
         try:
             with statsd.timer('solitude.proxy.%s.%s' %
-                              (self.service, self.name)):
+                              (self.service, self.name)), \
+                    metrics.timer('solitude_proxy_request_seconds',
+                                  service=self.service, name=self.name):
                 log.info('Calling service: %s at %s with %s' %
                          (self.service, self.url, self.method))
                 dump_request(request=None, method=self.method, url=self.url,
@@ -0,0 +1,169 @@
+"""
+Seller products looked up by public_id.
+
+The public_id is the JWT iss of an in-app payment, so a product is looked up
+and its secret decrypted at the start of every payment. This keeps a record
+for each public_id with the seller, access, secret and the provider sellers
+in two tiers:
+
+* The Django cache, shared by all processes. The secret is kept encrypted as
+  it is in the database.
+* A small LRU in each process, with the secret decrypted.
+
+Each public_id has a version in the Django cache that changes whenever the
+product, its seller or its provider products are saved, and again once the
+request commits. A record is only used if it was built at the current
+version. The common case is one cache get and no database access or
+decryption.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+
+from solitude.aes import Encrypted
+from solitude.middleware import after_commit
+
+
+class LRU(object):
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            value = self.data.pop(key, None)
+            if value is not None:
+                self.data[key] = value
+            return value
+
+    def set(self, key, value):
+        if not self.size:
+            return
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = value
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+local = LRU(settings.SELLER_PRODUCT_CACHE_SIZE)
+
+
+def _key(kind, public_id):
+    # Public ids can be any string, memcached keys can't.
+    return 'sellerproduct:{0}:{1}'.format(
+        kind, md5(public_id.encode('utf-8')).hexdigest())
+
+
+def version(public_id):
+    key = _key('version', public_id)
+    current = cache.get(key)
+    if current is None:
+        # If another process got there first, use theirs.
+        cache.add(key, uuid.uuid4().hex,
+                  settings.SELLER_PRODUCT_CACHE_TIMEOUT)
+        current = cache.get(key)
+    return current
+
+
+def _invalidate(public_id):
+    cache.set(_key('version', public_id), uuid.uuid4().hex,
+              settings.SELLER_PRODUCT_CACHE_TIMEOUT)
+    cache.delete(_key('record', public_id))
+
+
+def invalidate(public_id):
+    # Until the transaction commits another request can read the old row and
+    # cache it at the new version, so change the version then too.
+    _invalidate(public_id)
+    after_commit(_invalidate, public_id)
+
+
+def load(public_id):
+    # Imported here because the models use this module.
+    from lib.sellers.models import SellerProduct
+
+    # One query for the product, the seller and the provider sellers.
+    rows = (SellerProduct.objects.filter(public_id=public_id)
+            .values('pk', 'access', 'counter', 'external_id', 'secret',
+                    'seller__pk', 'seller__uuid', 'seller__active',
+                    'product__seller_bango__seller__uuid',
+                    'product_reference__seller_reference__seller__uuid'))
+    if not rows:
+        return None
+
+    row = rows[0]
+    return {
+        'pk': row['pk'],
+        'public_id': public_id,
+        'external_id': row['external_id'],
+        'access': row['access'],
+        'counter': row['counter'],
+        # Still encrypted, values() skips the field.
+        'secret': row['secret'],
+        'seller_pk': row['seller__pk'],
+        'seller_uuid': row['seller__uuid'],
+        'seller_active': row['seller__active'],
+        # The same as SellerProduct.supported_providers.
+        'seller_uuids': {
+            'bango': row['product__seller_bango__seller__uuid'],
+            'reference':
+                row['product_reference__seller_reference__seller__uuid'],
+        },
+    }
+
+
+def decrypted(record):
+    # Imported here because the models use this module.
+    from lib.sellers.models import SellerProduct
+
+    field = SellerProduct._meta.get_field('secret')
+    secret = field.to_python(record['secret'])
+    if isinstance(secret, Encrypted):
+        secret = field.decrypt(secret.value)
+    return dict(record, secret=secret)
+
+
+def lookup(public_id):
+    """
+    The record for the product with this public_id with the secret
+    decrypted, or None if there isn't one.
+    """
+    if not public_id:
+        return None
+
+    current = version(public_id)
+    if current is None:
+        # The cache is off or not working.
+        record = load(public_id)
+        return record and decrypted(record)
+
+    entry = local.get(public_id)
+    if entry and entry[0] == current:
+        return entry[1]
+
+    record_key = _key('record', public_id)
+    shared = cache.get(record_key)
+    if shared and shared[0] == current:
+        record = shared[1]
+    else:
+        record = load(public_id)
+        if record is None:
+            # Unknown ids aren't cached, they are likely to be created soon.
+            return None
+        cache.set(record_key, (current, record),
+                  settings.SELLER_PRODUCT_CACHE_TIMEOUT)
+
+    record = decrypted(record)
+    local.set(public_id, (current, record))
+    return record
@@ -1,10 +1,12 @@
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import reverse
 from django.db import models
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 
-from aesfield.field import AESField
-
+from . import cache
 from .constants import ACCESS_CHOICES, ACCESS_PURCHASE
+from solitude.aes import AESField
 from solitude.base import Model
 
 
@@ -116,3 +118,17 @@ class SellerProductReference(Model):
 
     class Meta(Model.Meta):
         db_table = 'seller_product_reference'
+
+
+# Products loaded with defer() are subclasses, so this can't filter on the
+# sender.
+@receiver(post_save, dispatch_uid='seller_product_cache_invalidate')
+def invalidate_cache(sender, instance, **kw):
+    if isinstance(instance, SellerProduct):
+        cache.invalidate(instance.public_id)
+    elif isinstance(instance, Seller):
+        for public_id in (SellerProduct.objects.filter(seller=instance)
+                          .values_list('public_id', flat=True)):
+            cache.invalidate(public_id)
+    elif isinstance(instance, (SellerProductBango, SellerProductReference)):
+        cache.invalidate(instance.seller_product.public_id)
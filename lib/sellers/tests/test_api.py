@@ -1,7 +1,10 @@
+from django.core.cache import cache as django_cache
 from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
 
 from nose.tools import eq_
 
+from lib.sellers import cache
 from lib.sellers.constants import (ACCESS_PURCHASE, ACCESS_SIMULATE,
                                    EXTERNAL_PRODUCT_ID_IS_NOT_UNIQUE)
 from lib.sellers.models import (
@@ -174,6 +177,12 @@ class TestSellerProduct(APITest):
         self.allowed_verbs(self.list_url, ['post', 'get'])
         self.allowed_verbs(url, ['get', 'put', 'patch'])
 
+    def test_get_queries(self):
+        obj, url = self.create_url()
+        # The product, seller and a lookup for each provider product.
+        with self.query_budget(4):
+            eq_(self.client.get(url).status_code, 200)
+
     def test_patch_get_secret(self):
         obj, url = self.create_url()
         res = self.client.patch(url, data={
@@ -233,3 +242,39 @@ class TestSellerProduct(APITest):
         res = self.client.get(self.list_url, {'public_id': self.public_id})
         eq_(res.status_code, 200, res)
         eq_(res.json['objects'][0]['seller_uuids']['bango'], uuid)
+
+
+@override_settings(SELLER_PRODUCT_CACHE_TIMEOUT=300)
+class TestSellerProductPublic(APITest):
+
+    def setUp(self):
+        django_cache.clear()
+        cache.local.clear()
+        self.seller = Seller.objects.create(uuid=uuid)
+        self.product = SellerProduct.objects.create(
+            seller=self.seller, external_id='xyz', public_id='public',
+            secret='hush')
+        self.url = reverse('generic:sellerproduct-public',
+                           kwargs={'public_id': 'public'})
+
+    def test_get(self):
+        res = self.client.get(self.url)
+        eq_(res.status_code, 200)
+        eq_(res.json['resource_pk'], self.product.pk)
+        eq_(res.json['resource_uri'], self.product.get_uri())
+        eq_(res.json['seller_uuid'], uuid)
+        eq_(res.json['secret'], 'hush')
+        eq_(res.json['seller_uuids'], {'bango': None, 'reference': None})
+
+    def test_cached(self):
+        self.client.get(self.url)
+        with self.query_budget(0):
+            eq_(self.client.get(self.url).status_code, 200)
+
+    def test_missing(self):
+        res = self.client.get(reverse('generic:sellerproduct-public',
+                                      kwargs={'public_id': 'nope'}))
+        eq_(res.status_code, 404)
+
+    def test_allowed(self):
+        self.allowed_verbs(self.url, ['get'])
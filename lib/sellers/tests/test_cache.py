@@ -0,0 +1,125 @@
+from django.core.cache import cache as django_cache
+from django.test import RequestFactory, TestCase
+from django.test.utils import override_settings
+
+from mock import patch
+from nose.tools import eq_, ok_
+
+from lib.sellers import cache
+from lib.sellers.models import (
+    Seller, SellerBango, SellerProduct, SellerProductBango)
+from solitude.middleware import CommitMiddleware
+
+
+class TestLRU(TestCase):
+
+    def test_evict(self):
+        lru = cache.LRU(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        eq_(lru.get('a'), 1)
+        eq_(lru.get('b'), None)
+        eq_(lru.get('c'), 3)
+
+    def test_off(self):
+        lru = cache.LRU(0)
+        lru.set('a', 1)
+        eq_(lru.get('a'), None)
+
+
+@override_settings(SELLER_PRODUCT_CACHE_TIMEOUT=300)
+class TestLookup(TestCase):
+
+    def setUp(self):
+        django_cache.clear()
+        cache.local.clear()
+        self.seller = Seller.objects.create(uuid='seller')
+        self.product = SellerProduct.objects.create(
+            seller=self.seller, external_id='xyz', public_id='public',
+            secret='hush')
+
+    def create_bango_product(self):
+        seller_bango = SellerBango.objects.create(
+            seller=self.seller, package_id=1, admin_person_id=1,
+            support_person_id=1, finance_person_id=1)
+        return SellerProductBango.objects.create(
+            seller_bango=seller_bango, seller_product=self.product)
+
+    def test_lookup(self):
+        record = cache.lookup('public')
+        eq_(record['pk'], self.product.pk)
+        eq_(record['seller_uuid'], 'seller')
+        eq_(record['secret'], 'hush')
+        eq_(record['seller_uuids'], self.product.supported_providers())
+
+    def test_missing(self):
+        eq_(cache.lookup('nope'), None)
+
+    def test_cached(self):
+        cache.lookup('public')
+        with self.assertNumQueries(0):
+            eq_(cache.lookup('public')['secret'], 'hush')
+
+    def test_decrypted_once(self):
+        cache.lookup('public')
+        with patch('solitude.aes.decrypt') as decrypt:
+            cache.lookup('public')
+        ok_(not decrypt.called)
+
+    def test_shared_encrypted(self):
+        cache.lookup('public')
+        version, record = django_cache.get(cache._key('record', 'public'))
+        ok_(record['secret'].startswith('aes:'))
+
+    def test_other_process(self):
+        cache.lookup('public')
+        cache.local.clear()
+        with self.assertNumQueries(0):
+            eq_(cache.lookup('public')['secret'], 'hush')
+
+    def test_product_saved(self):
+        cache.lookup('public')
+        self.product.secret = 'new'
+        self.product.save()
+        eq_(cache.lookup('public')['secret'], 'new')
+
+    def test_seller_saved(self):
+        cache.lookup('public')
+        self.seller.uuid = 'new'
+        self.seller.save()
+        eq_(cache.lookup('public')['seller_uuid'], 'new')
+
+    def test_provider_saved(self):
+        cache.lookup('public')
+        self.create_bango_product()
+        eq_(cache.lookup('public')['seller_uuids']['bango'], 'seller')
+
+    def test_stale_version(self):
+        # A record built before the version changed is not used.
+        cache.lookup('public')
+        SellerProduct.objects.filter(pk=self.product.pk).update(access=2)
+        eq_(cache.lookup('public')['access'], 1)
+        cache.invalidate('public')
+        eq_(cache.lookup('public')['access'], 2)
+
+    def test_after_commit(self):
+        middleware = CommitMiddleware()
+        middleware.process_request(RequestFactory().get('/'))
+        self.product.secret = 'rotated'
+        self.product.save()
+        # Another request caches the old row before this one commits.
+        SellerProduct.objects.filter(pk=self.product.pk).update(secret='hush')
+        eq_(cache.lookup('public')['secret'], 'hush')
+        SellerProduct.objects.filter(pk=self.product.pk).update(
+            secret='rotated')
+        middleware.process_response(None, None)
+        eq_(cache.lookup('public')['secret'], 'rotated')
+
+    @override_settings(SELLER_PRODUCT_CACHE_TIMEOUT=0)
+    def test_off(self):
+        django_cache.clear()
+        cache.lookup('public')
+        with self.assertNumQueries(1):
+            eq_(cache.lookup('public')['secret'], 'hush')
@@ -1,3 +1,5 @@
+from django.conf.urls import patterns, url
+
 from rest_framework.routers import DefaultRouter
 
 from lib.sellers import views
@@ -6,4 +8,8 @@ router = DefaultRouter()
 router.register(r'seller', views.SellerViewSet)
 router.register(r'product', views.SellerProductViewSet)
 
-urlpatterns = router.urls
+urlpatterns = patterns(
+    '',
+    url(r'^product/public/(?P<public_id>[^/]+)/$', views.product_public,
+        name='sellerproduct-public'),
+) + router.urls
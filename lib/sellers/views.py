@@ -1,3 +1,10 @@
+from django.core.urlresolvers import reverse
+from django.http import Http404
+
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from lib.sellers import cache
 from lib.sellers.models import Seller, SellerProduct
 from lib.sellers.serializers import SellerProductSerializer, SellerSerializer
 from solitude.base import NonDeleteModelViewSet
@@ -16,3 +23,19 @@ class SellerProductViewSet(NonDeleteModelViewSet):
         'external_id', 'public_id', 'seller__uuid', 'seller__active',
         'seller'
     )
+
+
+@api_view(['GET'])
+def product_public(request, public_id):
+    """
+    The seller product for a public_id with its seller, secret and provider
+    sellers, from the cache when possible.
+    """
+    record = cache.lookup(public_id)
+    if record is None:
+        raise Http404
+
+    data = dict(record, resource_pk=record['pk'], resource_uri=reverse(
+        'generic:sellerproduct-detail', kwargs={'pk': record['pk']}))
+    del data['pk']
+    return Response(data)
@@ -1,4 +1,6 @@
 import logging
+import threading
+import time
 import traceback
 import urlparse
 
@@ -6,26 +8,33 @@ from django.conf import settings
 from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
 from django.views import debug
 
 import requests
-from aesfield.field import AESField
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
 from lib.bango.constants import STATUS_BAD
 from lib.sellers.models import Seller, SellerProduct
 from lib.transactions.constants import STATUS_FAILED
+from solitude import breakers, metrics
+from solitude.aes import decrypt, encrypt
 from solitude.logger import getLogger
+from solitude.workers import spawn, Timeout
 
 log = getLogger('s.services')
 
 
 class StatusObject(object):
 
-    def __init__(self):
+    def __init__(self, running=None):
         self.status = {}
+        self.latency = {}
         self.error = None
+        # The probes still running from earlier checks, by key.
+        self.running = {} if running is None else running
 
     @property
     def is_proxy(self):
@@ -79,8 +88,8 @@ class StatusObject(object):
 
         else:
             # Tuck the encrypt test into settings.
-            test = AESField(aes_key='bango:signature')
-            if test._decrypt(test._encrypt('foo')) != 'foo':
+            if decrypt(encrypt('foo', 'bango:signature'),
+                       'bango:signature') != 'foo':
                 return False
 
         return True
@@ -108,6 +117,128 @@ class StatusObject(object):
 
         return True
 
+    def probes(self):
+        return (('proxies', self.test_proxies),
+                ('db', self.test_db),
+                ('cache', self.test_cache),
+                ('settings', self.test_settings))
+
+    def run(self):
+        """
+        Run all the probes at the same time, giving each one the deadline
+        in SERVICES_STATUS_TIMEOUTS. A probe that errors or misses its
+        deadline is a failure. Latency is recorded in milliseconds.
+        """
+        timeouts = settings.SERVICES_STATUS_TIMEOUTS
+        futures = []
+        with probe_lock:
+            for key, method in self.probes():
+                # A probe that is still running from an earlier check is
+                # waited on rather than started again, so a hung probe
+                # doesn't leave another thread behind on every check.
+                future = self.running.get(key)
+                if future is None or future.done():
+                    future = self.running[key] = spawn(method)
+                futures.append((key, future))
+        start = time.time()
+        for key, future in futures:
+            remaining = timeouts.get(key, 5) - (time.time() - start)
+            try:
+                self.status[key] = bool(future.result(max(remaining, 0)))
+            except Timeout:
+                log.error('Status probe: {0} timed out'.format(key))
+                self.status[key] = False
+            except Exception:
+                log.error('Status probe: {0} failed'.format(key),
+                          exc_info=True)
+                self.status[key] = False
+            elapsed = future.elapsed
+            if elapsed is None:
+                # The probe never got started.
+                elapsed = time.time() - start
+            self.latency[key] = round(elapsed * 1000, 1)
+
+    @property
+    def code(self):
+        if self.is_proxy:
+            if (self.status['settings'] and not
+                    (self.status['db'] and self.status['cache'])):
+                return 200
+            # The proxy should have good settings but not the db or cache.
+            return 500
+        elif self.status['db'] and self.status['cache']:
+            return 200
+        # The db instance should have a good db and cache.
+        return 500
+
+    def data(self):
+        data = self.status.copy()
+        data['latency'] = self.latency
+        # These change between refreshes, so are looked at every time.
+        data['breakers'] = breakers.breakers.data()
+        return data
+
+
+probe_lock = threading.Lock()
+
+
+class StatusRefresher(object):
+
+    """
+    Keeps the last status result around and refreshes it on a background
+    thread every SERVICES_STATUS_INTERVAL seconds, so that nagios hitting
+    the status page doesn't run all the probes on the web worker each time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.first = threading.Lock()
+        self.last = None
+        self.checked = None
+        self.thread = None
+        self.running = {}
+
+    def check(self):
+        obj = StatusObject(self.running)
+        obj.run()
+        with self.lock:
+            self.last = obj
+            self.checked = time.time()
+        return obj
+
+    def loop(self):
+        while True:
+            time.sleep(settings.SERVICES_STATUS_INTERVAL)
+            try:
+                self.check()
+            except Exception:
+                log.error('Status refresh failed', exc_info=True)
+
+    def start(self):
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self.loop,
+                                           name='solitude-status')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def get(self):
+        if not settings.SERVICES_STATUS_INTERVAL:
+            return self.check()
+
+        self.start()
+        if self.last:
+            return self.last
+
+        # Until the first refresh has happened, one request checks and any
+        # others wait for it.
+        with self.first:
+            return self.last or self.check()
+
+
+refresher = StatusRefresher()
+
 
 class TestError(Exception):
     pass
@@ -144,26 +275,21 @@ def logs(request):
 
 @api_view(['GET'])
 def status(request):
-    obj = StatusObject()
-    for key, method in (('proxies', obj.test_proxies),
-                        ('db', obj.test_db),
-                        ('cache', obj.test_cache),
-                        ('settings', obj.test_settings)):
-        obj.status[key] = method()
-
-    if obj.is_proxy:
-        if (obj.status['settings'] and not
-                (obj.status['db'] and obj.status['cache'])):
-            code = 200
-        else:
-            # The proxy should have good settings but not the db or cache.
-            code = 500
-    elif obj.status['db'] and obj.status['cache']:
-        code = 200
-    else:
-        # The db instance should have a good db and cache.
-        code = 500
-    return Response(obj.status, status=code)
+    obj = refresher.get()
+    return Response(obj.data(), status=obj.code)
+
+
+@api_view(['GET'])
+def metrics_list(request):
+    # Scrapers don't do OAuth, so this is skipped for them and they send
+    # METRICS_TOKEN instead.
+    token = request.META.get('HTTP_AUTHORIZATION', '')
+    if not (settings.METRICS_TOKEN and constant_time_compare(
+            token, 'Bearer {0}'.format(settings.METRICS_TOKEN))):
+        raise PermissionDenied
+    # The Prometheus text format, not JSON, so scrapers can read it.
+    return HttpResponse(metrics.registry.render(),
+                        content_type='text/plain; version=0.0.4')
 
 
 @api_view(['GET'])
@@ -1,12 +1,19 @@
+import threading
+import time
+
 from django.conf import settings
 from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
 
 from mock import patch
 from nose.tools import eq_
 
-from lib.services.resources import TestError
+from lib.services.resources import StatusObject, StatusRefresher, TestError
+from solitude import breakers, metrics
 from solitude.base import APITest
+from solitude.workers import spawn
 
 
 @patch.object(settings, 'DEBUG', False)
@@ -49,6 +56,101 @@ class TestStatus(APITest):
                            CACHES={}):
             self.failed(self.client.get(self.list_url), 'settings')
 
+    def test_latency(self):
+        res = self.client.get(self.list_url)
+        eq_(sorted(res.json['latency'].keys()),
+            ['cache', 'db', 'proxies', 'settings'])
+
+    def test_breakers(self):
+        breakers.breakers.clear()
+        self.addCleanup(breakers.breakers.clear)
+        breakers.get('bango', 'GetPackage').record(False)
+        res = self.client.get(self.list_url)
+        eq_(res.json['breakers'],
+            {'bango.GetPackage': {'state': 'closed', 'failures': 1}})
+
+
+@patch('lib.services.resources.StatusObject.test_settings', lambda s: True)
+@patch('lib.services.resources.StatusObject.test_proxies', lambda s: True)
+@patch('lib.services.resources.StatusObject.test_cache', lambda s: True)
+class TestStatusObject(TestCase):
+
+    @patch('lib.services.resources.StatusObject.test_db', lambda s: True)
+    def test_ok(self):
+        obj = StatusObject()
+        obj.run()
+        eq_(obj.code, 200)
+        assert all(obj.status.values())
+        eq_(set(obj.latency.keys()), set(obj.status.keys()))
+
+    def test_deadline(self):
+        def slow(self):
+            time.sleep(1)
+            return True
+
+        with patch.object(StatusObject, 'test_db', slow):
+            with self.settings(SERVICES_STATUS_TIMEOUTS={'db': 0.1}):
+                obj = StatusObject()
+                obj.run()
+        eq_(obj.status['db'], False)
+        eq_(obj.code, 500)
+
+    def test_error(self):
+        def error(self):
+            raise ValueError
+
+        with patch.object(StatusObject, 'test_db', error):
+            obj = StatusObject()
+            obj.run()
+        eq_(obj.status['db'], False)
+
+
+@patch('lib.services.resources.StatusRefresher.start', lambda s: None)
+class TestStatusRefresher(TestCase):
+
+    @patch('lib.services.resources.StatusObject.run')
+    def test_no_interval(self, run):
+        refresher = StatusRefresher()
+        refresher.get()
+        refresher.get()
+        eq_(run.call_count, 2)
+
+    @patch('lib.services.resources.StatusObject.run')
+    def test_first_once(self, run):
+        # Requests that arrive before the first check wait for it.
+        run.side_effect = lambda: time.sleep(0.1)
+        refresher = StatusRefresher()
+        with self.settings(SERVICES_STATUS_INTERVAL=30):
+            futures = [spawn(refresher.get) for x in range(3)]
+            results = set(future.result(1) for future in futures)
+        eq_(run.call_count, 1)
+        eq_(len(results), 1)
+
+    def test_hung_probe(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        calls = []
+
+        def hung(self):
+            calls.append(1)
+            release.wait()
+            return True
+
+        refresher = StatusRefresher()
+        with patch.object(StatusObject, 'test_db', hung):
+            with self.settings(SERVICES_STATUS_TIMEOUTS={'db': 0.01}):
+                refresher.check()
+                eq_(refresher.check().status['db'], False)
+        eq_(len(calls), 1)
+
+    @patch('lib.services.resources.StatusObject.run')
+    def test_interval(self, run):
+        refresher = StatusRefresher()
+        with self.settings(SERVICES_STATUS_INTERVAL=30):
+            refresher.get()
+            refresher.get()
+        eq_(run.call_count, 1)
+
 
 class TestErrors(APITest):
 
@@ -61,3 +163,29 @@ class TestNoop(APITest):
 
     def test_noop(self):
         eq_(self.client.get(reverse('services.request')).status_code, 200)
+
+
+class TestMetrics(APITest):
+
+    def setUp(self):
+        self.url = reverse('services.metrics')
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics(self):
+        metrics.incr('solitude_test_total')
+        res = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer secret')
+        eq_(res.status_code, 200)
+        assert 'solitude_test_total 1' in res.content
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_wrong_token(self):
+        res = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong')
+        eq_(res.status_code, 403)
+
+    def test_no_token(self):
+        eq_(self.client.get(self.url).status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret', REQUIRE_OAUTH=True)
+    def test_no_oauth(self):
+        res = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer secret')
+        eq_(res.status_code, 200)
@@ -17,6 +17,7 @@ class TransactionSerializer(BaseSerializer):
         view_name='generic:sellerproduct-detail', required=False)
     related = PathRelatedField(
         view_name='generic:transaction-detail', required=False)
+    relations = serializers.SerializerMethodField('get_relations')
     uuid = serializers.CharField(required=False)
 
     class Meta:
@@ -29,7 +30,7 @@ class TransactionSerializer(BaseSerializer):
             'uid_pay', 'uid_support', 'uuid'
         ]
 
-    def transform_relations(self, obj, value):
+    def get_relations(self, obj):
         objs = []
         if obj:
             relations = Transaction.objects.filter(related=obj)
@@ -31,11 +31,29 @@ class TestTransaction(APITest):
         eq_(res.status_code, 200)
         eq_(res.json['objects'][0]['uuid'], self.uuid)
 
+    def test_list_pages(self):
+        Transaction.objects.create(uuid='another', provider=1)
+        res = self.client.get(self.list_url, {'limit': 1})
+        eq_(res.status_code, 200)
+        res = self.client.get(res.json['meta']['next'])
+        eq_(res.status_code, 200)
+        eq_(res.json['meta']['page'], 2)
+        eq_(len(res.json['objects']), 1)
+
+    def test_list_unknown(self):
+        res = self.client.get(self.list_url, {'pages': 2})
+        eq_(res.status_code, 400)
+
     def test_get(self):
         res = self.client.get(self.detail_url)
         eq_(res.status_code, 200)
         eq_(res.json['uuid'], self.uuid)
 
+    def test_get_queries(self):
+        # The transaction, seller product and relations.
+        with self.query_budget(3):
+            eq_(self.client.get(self.detail_url).status_code, 200)
+
     def test_status_reason(self):
         data = {'status_reason': 'OOPS'}
         eq_(self.client.patch(self.detail_url, data=data).status_code, 200)
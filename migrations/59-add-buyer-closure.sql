@@ -0,0 +1,25 @@
+CREATE TABLE `buyer_closure` (
+    `id` int(11) unsigned AUTO_INCREMENT NOT NULL PRIMARY KEY,
+    `created` datetime(6) NOT NULL,
+    `modified` datetime(6) NOT NULL,
+    `counter` bigint,
+    `buyer_id` int(11) unsigned NOT NULL,
+    `status` integer UNSIGNED NOT NULL
+) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
+ALTER TABLE `buyer_closure` ADD CONSTRAINT `buyer_id_refs_id_5c1e0b7a` FOREIGN KEY (`buyer_id`) REFERENCES `buyer` (`id`);
+CREATE INDEX `buyer_closure_b5a3e2f1` ON `buyer_closure` (`buyer_id`);
+
+CREATE TABLE `buyer_closure_item` (
+    `id` int(11) unsigned AUTO_INCREMENT NOT NULL PRIMARY KEY,
+    `created` datetime(6) NOT NULL,
+    `modified` datetime(6) NOT NULL,
+    `counter` bigint,
+    `closure_id` int(11) unsigned NOT NULL,
+    `kind` varchar(255) NOT NULL,
+    `object_pk` integer UNSIGNED NOT NULL,
+    `status` integer UNSIGNED NOT NULL,
+    `error` varchar(255),
+    UNIQUE (`closure_id`, `kind`, `object_pk`)
+) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
+ALTER TABLE `buyer_closure_item` ADD CONSTRAINT `closure_id_refs_id_8d2f6c41` FOREIGN KEY (`closure_id`) REFERENCES `buyer_closure` (`id`);
+CREATE INDEX `buyer_closure_item_3c1e6b2d` ON `buyer_closure_item` (`closure_id`);
@@ -0,0 +1,15 @@
+CREATE TABLE `braintree_webhook` (
+    `id` int(11) unsigned AUTO_INCREMENT NOT NULL PRIMARY KEY,
+    `created` datetime(6) NOT NULL,
+    `modified` datetime(6) NOT NULL,
+    `counter` bigint,
+    `subscription_id` varchar(255) NOT NULL,
+    `timestamp` datetime(6),
+    `kind` varchar(255) NOT NULL,
+    `bt_signature` longtext NOT NULL,
+    `bt_payload` longtext NOT NULL,
+    `status` integer UNSIGNED NOT NULL,
+    `error` varchar(255),
+    UNIQUE (`subscription_id`, `timestamp`)
+) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
+CREATE INDEX `braintree_webhook_9acb4454` ON `braintree_webhook` (`status`);
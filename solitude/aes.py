@@ -0,0 +1,129 @@
+"""
+AES encrypted model fields that decrypt lazily.
+
+aesfield decrypts a field whenever a row is loaded and reads the key file on
+every encrypt and decrypt. Rows are often loaded for other reasons and the
+encrypted field is never read, for example a buyer loaded to check their PIN.
+
+This field keeps the ciphertext until the attribute is first read. Saving a
+row without reading the field writes the ciphertext back as it was. The
+storage format is the same as aesfield, so either can read the other's data.
+
+Keys are looked up once per process. This module is also the AES_METHOD, so
+anything else using aesfield gets the cached keys too.
+"""
+from django.conf import settings
+from django.db import models
+from django.utils.encoding import smart_str, smart_unicode
+
+from aesfield.default import lookup as _lookup
+from aesfield.field import EncryptedField
+from m2secret import Secret
+
+_keys = {}
+
+
+def lookup(key=None):
+    """
+    The passphrase for the key in AES_KEYS, read once and kept.
+    """
+    name = key or 'default'
+    # Keyed on the file as well, so changing AES_KEYS gets the new key.
+    cache_key = (name, settings.AES_KEYS.get(name))
+    if cache_key not in _keys:
+        result = _lookup(key)
+        if len(result) < 10:
+            raise ValueError('Passphrase cannot be less than 10 chars.')
+        _keys[cache_key] = result
+    return _keys[cache_key]
+
+
+def encrypt(value, key):
+    secret = Secret()
+    secret.encrypt(smart_str(value), lookup(key))
+    return secret.serialize()
+
+
+def decrypt(value, key):
+    secret = Secret()
+    secret.deserialize(value)
+    return smart_unicode(secret.decrypt(lookup(key)))
+
+
+class Encrypted(object):
+
+    """Ciphertext that hasn't been decrypted yet."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Decrypter(object):
+
+    """Decrypts the value the first time it is read."""
+
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.field.attname]
+        if isinstance(value, Encrypted):
+            value = self.field.decrypt(value.value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = self.field.to_python(value)
+
+
+class AESField(models.TextField):
+
+    description = 'A field that uses AES encryption, decrypted on access.'
+
+    def __init__(self, *args, **kwargs):
+        self.aes_prefix = kwargs.pop('aes_prefix', 'aes:')
+        if not self.aes_prefix:
+            raise ValueError('AES Prefix cannot be null.')
+        self.aes_key = kwargs.pop('aes_key', '')
+        super(AESField, self).__init__(*args, **kwargs)
+
+    def contribute_to_class(self, cls, name, **kw):
+        super(AESField, self).contribute_to_class(cls, name, **kw)
+        setattr(cls, self.name, Decrypter(self))
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(AESField, self).deconstruct()
+        kwargs['aes_key'] = self.aes_key
+        if self.aes_prefix != 'aes:':
+            kwargs['aes_prefix'] = self.aes_prefix
+        return name, path, args, kwargs
+
+    def get_prep_lookup(self, type, value):
+        raise EncryptedField('You cannot do lookups on an encrypted field.')
+
+    def get_db_prep_lookup(self, *args, **kw):
+        raise EncryptedField('You cannot do lookups on an encrypted field.')
+
+    def pre_save(self, instance, add):
+        # Don't decrypt just to encrypt it again.
+        return instance.__dict__.get(self.attname)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if isinstance(value, Encrypted):
+            return self.aes_prefix + value.value
+        if not prepared and value:
+            return self.aes_prefix + encrypt(value, self.aes_key)
+        return value
+
+    def to_python(self, value):
+        if (isinstance(value, basestring) and
+                value.startswith(self.aes_prefix)):
+            return Encrypted(value[len(self.aes_prefix):])
+        return value
+
+    def decrypt(self, value):
+        return decrypt(value, self.aes_key)
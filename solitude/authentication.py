@@ -7,7 +7,7 @@ from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
 from solitude.logger import getLogger
-from solitude.middleware import set_oauth_key
+from solitude.middleware import server_timing, set_oauth_key
 
 log = getLogger('s.auth')
 
@@ -32,6 +32,10 @@ class DummyUser(object):
 class RestOAuthAuthentication(BaseAuthentication):
 
     def authenticate(self, request):
+        with server_timing('auth'):
+            return self._authenticate(request)
+
+    def _authenticate(self, request):
         if request.META['PATH_INFO'] in settings.SKIP_OAUTH:
             log.debug('Skipping OAuth because of SKIP_OAUTH')
             return (DummyUser(), None)
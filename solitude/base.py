@@ -1,16 +1,19 @@
 import functools
 import json
 import warnings
+from contextlib import contextmanager
 from hashlib import md5
 
 from django import test
 from django.conf import settings
-from django.db import models
+from django.db import connection, DEFAULT_DB_ALIAS, models
 from django.db.models import F
 from django.db.models.query import QuerySet
+from django.db.models.query_utils import deferred_class_factory
 from django.forms import model_to_dict
 from django.http import Http404
 from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
 from django.utils.decorators import method_decorator
 from django.views.decorators.http import etag
 
@@ -143,6 +146,25 @@ class APITest(test.TestCase):
             assert res.status_code in (401, 405), (
                 '%s: %s not 401 or 405' % (verb.upper(), res.status_code))
 
+    @contextmanager
+    def query_budget(self, num):
+        """
+        Fail if the block runs more than num queries. Savepoints are not
+        counted, they depend on the database and how the test is wrapped.
+
+        Use it to lock in the queries a view makes, for example::
+
+            with self.query_budget(2):
+                self.client.get(url)
+        """
+        with CaptureQueriesContext(connection) as context:
+            yield
+        queries = [q['sql'] for q in context.captured_queries
+                   if 'SAVEPOINT' not in q['sql']]
+        assert len(queries) <= num, (
+            '{0} queries run, the budget is {1}:\n{2}'
+            .format(len(queries), num, '\n'.join(queries)))
+
     def get_errors(self, content, field):
         return json.loads(content)[field]
 
@@ -287,6 +309,19 @@ class Model(models.Model):
     def reget(self):
         return self.__class__.objects.get(pk=self.pk)
 
+    @classmethod
+    def from_values(cls, **values):
+        """
+        An instance built from values we already have, for example from a
+        cache. The other fields are deferred and loaded from the database if
+        they are used. Saving it only saves the fields given.
+        """
+        deferred = [f.attname for f in cls._meta.concrete_fields
+                    if f.attname not in values]
+        names = values.keys()
+        return (deferred_class_factory(cls, deferred)
+                .from_db(DEFAULT_DB_ALIAS, names, [values[n] for n in names]))
+
     def save(self, *args, **kw):
         if self.pk:
             self.counter = F('counter') + 1
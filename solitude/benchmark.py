@@ -0,0 +1,451 @@
+"""
+End to end benchmarks of the API, run them with the benchmark command.
+
+Each scenario is a sequence of API calls like the ones in samples/. They are
+run against solitude in this process, on a test database with the fake
+upstreams in solitude.fake, or against a solitude served somewhere else.
+The time and queries of each request are recorded by endpoint and reported
+as requests per second, percentiles, queries per request and how much the
+memory of the process grew.
+
+A run can be saved and later runs compared against it, see compare.
+"""
+import json
+import resource
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+import requests
+
+from lib.bango.utils import sign
+from lib.transactions.constants import PROVIDER_BANGO, STATUS_RECEIVED
+from solitude.logger import getLogger
+from solitude.utils import percentile
+
+log = getLogger('s.benchmark')
+
+PLAN = 'mozilla-concrete-brick'
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def rss():
+    """
+    The resident memory of this process in KB.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    # Not Linux, the best there is is the peak.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+@contextmanager
+def test_database():
+    """
+    A new test database for the block, benchmarks create a lot of data and
+    shouldn't touch the real database.
+    """
+    old_name = connection.creation.create_test_db(verbosity=0,
+                                                  autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+class Endpoint(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.times = []
+        self.queries = []
+
+    def summary(self):
+        times = sorted(self.times)
+        total = sum(times)
+        ms = lambda value: round(value * 1000, 2)
+        return {
+            'requests': len(times),
+            'rps': round(len(times) / total, 1) if total else None,
+            'mean': ms(total / len(times)),
+            'p50': ms(percentile(times, 50)),
+            'p95': ms(percentile(times, 95)),
+            'p99': ms(percentile(times, 99)),
+            'queries': (round(float(sum(self.queries)) / len(self.queries), 1)
+                        if self.queries else None),
+        }
+
+
+class API(object):
+
+    """
+    Makes requests to solitude and records them by endpoint. Requests
+    without a name, like creating fixtures, aren't recorded.
+    """
+
+    def __init__(self):
+        self.endpoints = OrderedDict()
+        self.recording = True
+
+    def send(self, method, path, body):
+        """
+        Returns the status, content, seconds and number of queries, if
+        known, of the request.
+        """
+        raise NotImplementedError
+
+    def call(self, name, method, path, data=None):
+        body = json.dumps(data) if data is not None else ''
+        status, content, seconds, queries = self.send(method, path, body)
+        if status >= 400:
+            raise BenchmarkError('{0} {1}: {2} {3}'.format(
+                method.upper(), path, status, content[:500]))
+
+        if name and self.recording:
+            endpoint = self.endpoints.setdefault(name, Endpoint(name))
+            endpoint.times.append(seconds)
+            if queries is not None:
+                endpoint.queries.append(queries)
+        return json.loads(content) if content else {}
+
+    def get(self, name, path):
+        return self.call(name, 'get', path)
+
+    def post(self, name, path, data):
+        return self.call(name, 'post', path, data)
+
+
+class Local(API):
+
+    """Calls solitude in this process."""
+
+    def __init__(self):
+        super(Local, self).__init__()
+        self.client = Client()
+
+    def send(self, method, path, body):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.time()
+            res = self.client.generic(method.upper(), path, body,
+                                      content_type='application/json')
+            seconds = time.time() - start
+        return res.status_code, res.content, seconds, len(queries)
+
+
+class Remote(API):
+
+    """
+    Calls a solitude served at url. It must not require OAuth and the
+    queries it runs aren't known.
+    """
+
+    def __init__(self, url):
+        super(Remote, self).__init__()
+        self.url = url.rstrip('/')
+        self.session = requests.session()
+
+    def send(self, method, path, body):
+        start = time.time()
+        res = self.session.request(
+            method.upper(), self.url + path, data=body,
+            headers={'Content-Type': 'application/json'})
+        return res.status_code, res.content, time.time() - start, None
+
+
+class Scenario(object):
+
+    """
+    setup creates what every iteration needs, run is one iteration and
+    should name the requests it wants recorded.
+    """
+    name = None
+
+    def setup(self, api):
+        pass
+
+    def run(self, api):
+        raise NotImplementedError
+
+
+def new_uuid(prefix):
+    return '{0}:{1}'.format(prefix, uuid.uuid4().hex)
+
+
+class BuyerScenario(Scenario):
+    name = 'buyer'
+
+    def run(self, api):
+        api.post('buyer.create', reverse('generic:buyer-list'),
+                 {'uuid': new_uuid('benchmark'), 'pin': '1234'})
+
+
+class PinScenario(Scenario):
+    name = 'pin'
+
+    def setup(self, api):
+        self.uuid = new_uuid('benchmark')
+        api.post(None, reverse('generic:buyer-list'),
+                 {'uuid': self.uuid, 'pin': '1234'})
+        api.post(None, reverse('generic:confirm'),
+                 {'uuid': self.uuid, 'pin': '1234'})
+
+    def run(self, api):
+        res = api.post('pin.verify', reverse('generic:verify'),
+                       {'uuid': self.uuid, 'pin': '1234'})
+        if not res.get('valid'):
+            raise BenchmarkError('PIN did not verify: {0}'.format(res))
+
+
+class BangoScenario(Scenario):
+
+    """
+    A seller setting up Bango and being paid, like samples/bango-basic.py.
+    """
+    name = 'bango'
+
+    def run(self, api):
+        seller = api.post('seller.create', reverse('generic:seller-list'),
+                          {'uuid': new_uuid('benchmark')})
+        package = api.post('bango.package.create',
+                           reverse('bango:package-list'), {
+                               'seller': seller['resource_uri'],
+                               'adminEmailAddress': 'admin@place.com',
+                               'supportEmailAddress': 'support@place.com',
+                               'financeEmailAddress': 'finance@place.com',
+                               'paypalEmailAddress': 'paypal@place.com',
+                               'vendorName': 'Some Company',
+                               'companyName': 'Some Company, LLC',
+                               'address1': '111 Somewhere',
+                               'addressCity': 'Pleasantville',
+                               'addressState': 'CA',
+                               'addressZipCode': '11111',
+                               'addressPhone': '4445551111',
+                               'countryIso': 'USA',
+                               'currencyIso': 'USD',
+                           })
+        api.get('bango.package.get', package['resource_uri'])
+
+        product = api.post('seller.product.create',
+                           reverse('generic:sellerproduct-list'), {
+                               'seller': seller['resource_uri'],
+                               'external_id': new_uuid('benchmark'),
+                               'public_id': new_uuid('benchmark'),
+                               'secret': 'n',
+                               'access': 1,
+                           })
+        bango_product = api.post('bango.product.create',
+                                 reverse('bango:product-list'), {
+                                     'seller_bango': package['resource_uri'],
+                                     'seller_product': product['resource_uri'],
+                                     'name': 'A name for the number',
+                                     'packageId': package['package_id'],
+                                     'categoryId': 1,
+                                 })
+
+        transaction_uuid = new_uuid('benchmark')
+        api.post('transaction.create', reverse('generic:transaction-list'), {
+            'provider': PROVIDER_BANGO,
+            'seller': seller['resource_uri'],
+            'seller_product': product['resource_uri'],
+            'status': STATUS_RECEIVED,
+            'uuid': transaction_uuid,
+        })
+        billing = api.post('bango.billing', reverse('bango:billing'), {
+            'pageTitle': 'Benchmark',
+            'prices': [{'price': 1, 'currency': 'EUR', 'method': 2}],
+            'redirect_url_onerror': 'https://nowhere.com/error',
+            'redirect_url_onsuccess': 'https://nowhere.com/success',
+            'seller_product_bango': bango_product['resource_uri'],
+            'transaction_uuid': transaction_uuid,
+            'user_uuid': new_uuid('benchmark'),
+        })
+        api.post('bango.notification', reverse('bango:notification'), {
+            'moz_transaction': transaction_uuid,
+            'moz_signature': sign(transaction_uuid),
+            'billing_config_id': billing['billingConfigurationId'],
+            'bango_trans_id': uuid.uuid4().hex,
+            'bango_response_code': 'OK',
+            'bango_response_message': 'Success',
+            'amount': '0.99',
+            'currency': 'EUR',
+            'bango_token': 'benchmark',
+        })
+
+
+class BraintreeScenario(Scenario):
+
+    """
+    A buyer subscribing with Braintree and being charged for it.
+    """
+    name = 'braintree'
+
+    def setup(self, api):
+        products = api.get(None, '{0}?public_id={1}'.format(
+            reverse('generic:sellerproduct-list'), PLAN))
+        if products['objects']:
+            return
+        seller = api.post(None, reverse('generic:seller-list'),
+                          {'uuid': new_uuid('benchmark')})
+        api.post(None, reverse('generic:sellerproduct-list'), {
+            'seller': seller['resource_uri'],
+            'external_id': PLAN,
+            'public_id': PLAN,
+        })
+
+    def run(self, api):
+        # Imported here because it imports payments_config, which only the
+        # Braintree code needs.
+        from lib.brains.fake import FakeBraintree
+
+        buyer_uuid = new_uuid('benchmark')
+        api.post('buyer.create', reverse('generic:buyer-list'),
+                 {'uuid': buyer_uuid})
+        api.post('braintree.customer', reverse('braintree:customer'),
+                 {'uuid': buyer_uuid})
+        method = api.post(
+            'braintree.paymethod', reverse('braintree:paymethod'),
+            {'buyer_uuid': buyer_uuid, 'nonce': 'benchmark'})
+        subscription = api.post(
+            'braintree.subscription', reverse('braintree:subscription'),
+            {'paymethod': method['mozilla']['resource_uri'], 'plan': PLAN})
+        # Signed with the keys of the fake, which accepts any signature.
+        webhook = FakeBraintree(None).webhook(
+            'subscription_charged_successfully',
+            subscription['braintree']['id'])
+        api.post('braintree.webhook', reverse('braintree:webhook'), webhook)
+
+
+class TransactionsScenario(Scenario):
+
+    """
+    Paging through all the transactions of a seller.
+    """
+    name = 'transactions'
+    count = 100
+
+    def setup(self, api):
+        seller = api.post(None, reverse('generic:seller-list'),
+                          {'uuid': new_uuid('benchmark')})
+        for x in range(self.count):
+            api.post(None, reverse('generic:transaction-list'), {
+                'provider': PROVIDER_BANGO,
+                'seller': seller['resource_uri'],
+                'uuid': new_uuid('benchmark'),
+            })
+        self.path = '{0}?seller={1}'.format(
+            reverse('generic:transaction-list'), seller['resource_pk'])
+
+    def run(self, api):
+        path = self.path
+        while path:
+            path = api.get('transaction.list', path)['meta']['next']
+
+
+SCENARIOS = OrderedDict((scenario.name, scenario) for scenario in [
+    BuyerScenario, PinScenario, BangoScenario, BraintreeScenario,
+    TransactionsScenario])
+
+
+def run(api, names, iterations, warmup=0):
+    """
+    Run the scenarios and return the results, which can be saved as JSON.
+    """
+    scenarios = OrderedDict()
+    rss_start = None
+    for name in names:
+        scenario = SCENARIOS[name]()
+        log.info('Running: {0}'.format(name))
+        scenario.setup(api)
+        api.recording = False
+        for x in range(warmup):
+            scenario.run(api)
+        api.recording = True
+
+        if rss_start is None:
+            rss_start = rss()
+        before = sum(len(e.times) for e in api.endpoints.values())
+        start = time.time()
+        for x in range(iterations):
+            scenario.run(api)
+        seconds = time.time() - start
+        count = sum(len(e.times) for e in api.endpoints.values()) - before
+        scenarios[name] = {
+            'iterations': iterations,
+            'requests': count,
+            'seconds': round(seconds, 3),
+            'rps': round(count / seconds, 1) if seconds else None,
+        }
+
+    rss_end = rss()
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'scenarios': scenarios,
+        'endpoints': OrderedDict((name, endpoint.summary()) for name, endpoint
+                                 in api.endpoints.items()),
+        'rss': {'start': rss_start, 'end': rss_end,
+                'growth': rss_end - (rss_start or rss_end)},
+    }
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    The regressions in results compared to the baseline: endpoints whose
+    p95 got slower or that run more queries, and scenarios with fewer
+    requests per second. threshold is how much worse, as a fraction, a
+    time has to be to count.
+    """
+    regressions = []
+    for name, new in results['endpoints'].items():
+        old = baseline['endpoints'].get(name)
+        if not old:
+            continue
+        if old['p95'] and new['p95'] > old['p95'] * (1 + threshold):
+            regressions.append('{0}: p95 {1}ms, was {2}ms'.format(
+                name, new['p95'], old['p95']))
+        if (old['queries'] is not None and new['queries'] is not None and
+                new['queries'] > old['queries']):
+            regressions.append('{0}: {1} queries, was {2}'.format(
+                name, new['queries'], old['queries']))
+
+    for name, new in results['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if old and old['rps'] and new['rps'] < old['rps'] * (1 - threshold):
+            regressions.append('{0}: {1} requests/s, was {2}'.format(
+                name, new['rps'], old['rps']))
+    return regressions
+
+
+def report(results):
+    """
+    The results as lines of text.
+    """
+    lines = ['{0:<24} {1:>8} {2:>8} {3:>8} {4:>8} {5:>8} {6:>8}'.format(
+        'endpoint', 'requests', 'rps', 'p50 ms', 'p95 ms', 'p99 ms',
+        'queries')]
+    for name, data in results['endpoints'].items():
+        lines.append(
+            '{0:<24} {requests:>8} {rps:>8} {p50:>8} {p95:>8} {p99:>8} '
+            '{1:>8}'.format(
+                name, '-' if data['queries'] is None else data['queries'],
+                **data))
+    lines.append('')
+    for name, data in results['scenarios'].items():
+        lines.append('{0}: {requests} requests in {seconds}s, {rps} '
+                     'requests/s'.format(name, **data))
+    lines.append('RSS: {start}KB to {end}KB, grew {growth}KB'.format(
+        **results['rss']))
+    return lines
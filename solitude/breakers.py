@@ -0,0 +1,128 @@
+"""
+Circuit breakers for the calls solitude makes to payment providers.
+
+There's a breaker for each method of each upstream. After the number of
+failures in a row set in CIRCUIT_BREAKERS the breaker opens and calls are
+refused straight away, rather than each one waiting on an upstream that is
+down. Once the reset time has passed one call is let through to probe the
+upstream: if it works the breaker closes, if not it opens again.
+
+An upstream that isn't in CIRCUIT_BREAKERS, or has failures of 0, never
+opens its breakers, which is what the tests use.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from solitude import metrics
+from solitude.logger import getLogger
+
+log = getLogger('s.breakers')
+
+CLOSED = 'closed'
+HALF_OPEN = 'half-open'
+OPEN = 'open'
+
+# The value of the solitude_breaker_state gauge.
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class Breaker(object):
+
+    def __init__(self, upstream, method):
+        self.upstream = upstream
+        self.method = method
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = None
+        self.probing = False
+
+    @property
+    def config(self):
+        config = settings.CIRCUIT_BREAKERS.get(self.upstream, {})
+        return config.get('failures', 0), config.get('reset', 30)
+
+    def allow(self):
+        """
+        Return True if the call can go ahead. Records a rejection if not.
+        """
+        threshold, reset = self.config
+        with self.lock:
+            if self.state == OPEN and time.time() - self.opened >= reset:
+                self.set_state(HALF_OPEN)
+            if self.state == CLOSED or not threshold:
+                return True
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+
+        metrics.incr('solitude_breaker_rejected_total',
+                     upstream=self.upstream, method=self.method)
+        return False
+
+    def record(self, success):
+        """
+        Record the result of a call that was allowed.
+        """
+        threshold, reset = self.config
+        with self.lock:
+            self.probing = False
+            if success:
+                self.failures = 0
+                if self.state != CLOSED:
+                    log.info('Closing breaker: {0}'.format(self))
+                    self.set_state(CLOSED)
+                return
+
+            self.failures += 1
+            if threshold and (self.state == HALF_OPEN or
+                              self.failures >= threshold):
+                if self.state != OPEN:
+                    log.error('Opening breaker: {0} after {1} failures'
+                              .format(self, self.failures))
+                self.opened = time.time()
+                self.set_state(OPEN)
+
+    def set_state(self, state):
+        self.state = state
+        metrics.gauge('solitude_breaker_state', STATE_VALUES[state],
+                      upstream=self.upstream, method=self.method)
+
+    def data(self):
+        with self.lock:
+            return {'state': self.state, 'failures': self.failures}
+
+    def __str__(self):
+        return '{0}.{1}'.format(self.upstream, self.method)
+
+
+class Breakers(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.breakers = {}
+
+    def get(self, upstream, method):
+        key = (upstream, method)
+        with self.lock:
+            if key not in self.breakers:
+                self.breakers[key] = Breaker(upstream, method)
+            return self.breakers[key]
+
+    def data(self):
+        """
+        The state of the breakers that have been used, for the status page.
+        """
+        with self.lock:
+            breakers = self.breakers.values()
+        return dict((str(breaker), breaker.data()) for breaker in breakers)
+
+    def clear(self):
+        with self.lock:
+            self.breakers.clear()
+
+
+breakers = Breakers()
+get = breakers.get
@@ -0,0 +1,130 @@
+"""
+Limits on how many calls each upstream gets at once from this process.
+
+Calls to Bango, Braintree and the zippy providers tie up a thread until they
+answer, so a slow upstream could take every thread. Each upstream in
+BULKHEADS gets a limit on the calls in progress, and a lower one for each
+OAuth consumer so one client can't use all of it. A call waits up to the
+timeout for room and is then refused with Full, a 503.
+
+Upstreams that aren't in BULKHEADS aren't limited, which is what the tests
+use.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from solitude import metrics
+from solitude.errors import ServiceUnavailable
+from solitude.logger import getLogger
+from solitude.middleware import get_oauth_key
+
+log = getLogger('s.bulkheads')
+
+
+class Full(ServiceUnavailable):
+    default_detail = 'Too many calls in progress, try again later.'
+
+
+class Bulkhead(object):
+
+    """
+    A semaphore that reads its size when it is acquired, so the settings
+    can change.
+    """
+
+    def __init__(self, upstream, consumer=None):
+        self.upstream = upstream
+        self.consumer = consumer
+        self.condition = threading.Condition()
+        self.active = 0
+
+    @property
+    def labels(self):
+        labels = {'upstream': self.upstream}
+        if self.consumer:
+            labels['consumer'] = self.consumer
+        return labels
+
+    def acquire(self, size, timeout):
+        """
+        Wait up to timeout seconds for fewer than size calls to be in
+        progress. Returns False if there's still no room.
+        """
+        start = time.time()
+        with self.condition:
+            while size and self.active >= size:
+                remaining = start + timeout - time.time()
+                if remaining <= 0:
+                    metrics.incr('solitude_bulkhead_rejected_total',
+                                 **self.labels)
+                    return False
+                self.condition.wait(remaining)
+            self.active += 1
+            metrics.gauge('solitude_bulkhead_active', self.active,
+                          **self.labels)
+        metrics.observe('solitude_bulkhead_wait_seconds', time.time() - start,
+                        **self.labels)
+        return True
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            metrics.gauge('solitude_bulkhead_active', self.active,
+                          **self.labels)
+            self.condition.notify()
+
+
+class Bulkheads(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bulkheads = {}
+
+    def get(self, upstream, consumer=None):
+        key = (upstream, consumer)
+        with self.lock:
+            if key not in self.bulkheads:
+                self.bulkheads[key] = Bulkhead(upstream, consumer)
+            return self.bulkheads[key]
+
+    @contextmanager
+    def limit(self, upstream, consumer=None):
+        """
+        Run the block once there's room for another call to upstream, from
+        consumer or the OAuth consumer of this request. Raises Full if there
+        isn't room within the timeout.
+        """
+        config = settings.BULKHEADS.get(upstream)
+        if not config:
+            yield
+            return
+
+        consumer = consumer or get_oauth_key()
+        acquired = []
+        try:
+            # The consumer's slot first, so a consumer waiting on its own
+            # limit doesn't hold a slot the other consumers could use.
+            for bulkhead, size in (
+                    (self.get(upstream, consumer), config.get('consumer', 0)),
+                    (self.get(upstream), config.get('size', 0))):
+                if not bulkhead.acquire(size, config.get('timeout', 1)):
+                    log.error('Bulkhead full: {0} for {1}'
+                              .format(upstream, consumer))
+                    raise Full('Too many calls to {0} in progress, try '
+                               'again later.'.format(upstream))
+                acquired.append(bulkhead)
+            yield
+        finally:
+            for bulkhead in acquired:
+                bulkhead.release()
+
+    def clear(self):
+        with self.lock:
+            self.bulkheads.clear()
+
+
+bulkheads = Bulkheads()
+limit = bulkheads.limit
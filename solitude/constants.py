@@ -15,3 +15,16 @@ SINGLE_PAYMENT_METHOD = (
     (PAYMENT_METHOD_OPERATOR, PAYMENT_METHOD_OPERATOR),
     (PAYMENT_METHOD_OPERATOR, PAYMENT_METHOD_CARD)
 )
+
+# The status of a Braintree webhook waiting to be processed.
+WEBHOOK_PENDING = 0
+WEBHOOK_RUNNING = 1
+WEBHOOK_FAILED = 2
+WEBHOOK_COMPLETED = 3
+
+WEBHOOK_STATUSES = {
+    'completed': WEBHOOK_COMPLETED,
+    'failed': WEBHOOK_FAILED,
+    'pending': WEBHOOK_PENDING,
+    'running': WEBHOOK_RUNNING,
+}
@@ -1,6 +1,6 @@
 from collections import defaultdict
 
-from rest_framework.exceptions import ParseError
+from rest_framework.exceptions import APIException, ParseError
 
 
 class ErrorFormatter(object):
@@ -31,3 +31,12 @@ class FormError(ParseError):
 class InvalidQueryParams(ParseError):
     status_code = 400
     default_detail = 'Incorrect query parameters.'
+
+
+class ServiceUnavailable(APIException):
+    status_code = 503
+    default_detail = 'Service unavailable, try again later.'
+
+    def __init__(self, detail=None):
+        # APIException in this version of rest framework doesn't do this.
+        self.detail = detail or self.default_detail
@@ -0,0 +1,123 @@
+"""
+Helpers for the fake upstream servers used to benchmark and load test
+solitude without network access, see lib.brains.fake and lib.bango.fake.
+
+A Profile says how slow and unreliable the fake upstream is. Latency is
+drawn from a normal distribution, a fraction of the requests fail and a
+fraction hang for longer than a client should wait.
+"""
+import random
+import SocketServer
+import time
+from wsgiref.simple_server import make_server, WSGIRequestHandler, WSGIServer
+
+from solitude.logger import getLogger
+
+log = getLogger('s.fake')
+
+OK = 'ok'
+ERROR = 'error'
+TIMEOUT = 'timeout'
+
+
+class Profile(object):
+
+    def __init__(self, latency=0, jitter=0, errors=0, timeouts=0,
+                 timeout=60, methods=None):
+        # Milliseconds.
+        self.latency = latency
+        self.jitter = jitter
+        # Fractions of the requests, between 0 and 1.
+        self.errors = errors
+        self.timeouts = timeouts
+        # Seconds a request that times out hangs for.
+        self.timeout = timeout
+        # Profiles for particular methods, if they behave differently.
+        self.methods = methods or {}
+
+    def __repr__(self):
+        return ('<Profile latency={0.latency} jitter={0.jitter} '
+                'errors={0.errors} timeouts={0.timeouts}>'.format(self))
+
+    def copy(self, **kw):
+        values = dict(self.__dict__, **kw)
+        return Profile(**values)
+
+    def method(self, name):
+        return self.methods.get(name, self)
+
+    def outcome(self):
+        chance = random.random()
+        if chance < self.timeouts:
+            return TIMEOUT
+        if chance < self.timeouts + self.errors:
+            return ERROR
+        return OK
+
+    def delay(self):
+        return max(0, random.gauss(self.latency, self.jitter)) / 1000.0
+
+    def wait(self):
+        """
+        Sleep like the upstream would and return the outcome of the request.
+        """
+        outcome = self.outcome()
+        time.sleep(self.timeout if outcome == TIMEOUT else self.delay())
+        return outcome
+
+
+PROFILES = {
+    # As fast as possible, for measuring solitude itself.
+    'fast': Profile(),
+    # Roughly what the upstreams look like on a good day.
+    'typical': Profile(latency=150, jitter=50),
+    'slow': Profile(latency=800, jitter=400, errors=0.01),
+    'flaky': Profile(latency=150, jitter=100, errors=0.1, timeouts=0.02),
+}
+
+
+def get_profile(name, **overrides):
+    """
+    The named profile, with any values that aren't None replaced.
+    """
+    overrides = dict((k, v) for k, v in overrides.items() if v is not None)
+    return PROFILES[name].copy(**overrides)
+
+
+def with_methods(profile, specs):
+    """
+    The profile with a profile for each method in specs, which look like:
+    GetPackage=latency:300,jitter:100,errors:0.1. Values that aren't given
+    are the same as profile.
+    """
+    methods = dict(profile.methods)
+    for spec in specs or []:
+        name, _, values = spec.partition('=')
+        overrides = {}
+        for value in filter(None, values.split(',')):
+            key, _, number = value.partition(':')
+            if key not in ('latency', 'jitter', 'errors', 'timeouts',
+                           'timeout'):
+                raise ValueError('Unknown profile value: {0}'.format(key))
+            overrides[key] = float(number)
+        methods[name] = profile.copy(methods={}, **overrides)
+    return profile.copy(methods=methods)
+
+
+class ThreadedServer(SocketServer.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class Handler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
+
+
+def server(app, host='127.0.0.1', port=0):
+    """
+    A threaded WSGI server for app, call serve_forever to start it. With a
+    port of 0 a free port is used, it's in server.server_port.
+    """
+    return make_server(host, port, app, server_class=ThreadedServer,
+                       handler_class=Handler)
@@ -26,6 +26,10 @@ class StrictQueryFilter(DjangoFilterBackend):
     def filter_queryset(self, request, queryset, view):
         requested = set(request.QUERY_PARAMS.keys())
         allowed = set(getattr(view, 'filter_fields', []))
+        # The next and prev links of a page use these.
+        for param in ('page_kwarg', 'paginate_by_param'):
+            if getattr(view, param, None):
+                allowed.add(getattr(view, param))
         difference = requested.difference(allowed)
         if difference:
             raise InvalidQueryParams(
@@ -0,0 +1,123 @@
+import json
+import threading
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from lib.bango.fake import FakeBango
+from lib.brains import client as brains_client
+from lib.brains.fake import FakeBraintree
+from solitude import benchmark, fake
+from solitude.logger import getLogger
+
+log = getLogger('s.benchmark')
+
+
+class Command(BaseCommand):
+    help = ('Runs end to end benchmarks of the API and reports the requests '
+            'per second, latency percentiles, queries and memory growth of '
+            'each endpoint. By default solitude runs in this process on a '
+            'test database, with fake Bango and Braintree servers.')
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--scenario', dest='scenarios', action='append',
+            choices=benchmark.SCENARIOS.keys(),
+            help='Scenario to run, can be repeated. Default: all of them, '
+                 'which are: {0}'.format(', '.join(benchmark.SCENARIOS))
+        ),
+        make_option(
+            '--iterations', dest='iterations', type='int', default=50,
+            help='Times to run each scenario, default: 50'
+        ),
+        make_option(
+            '--warmup', dest='warmup', type='int', default=5,
+            help='Times to run each scenario before recording, default: 5'
+        ),
+        make_option(
+            '--url', dest='url',
+            help='Benchmark the solitude served here instead, it must not '
+                 'require OAuth'
+        ),
+        make_option(
+            '--profile', dest='profile', default='fast',
+            choices=sorted(fake.PROFILES.keys()),
+            help='Latency and error profile of the fake upstreams, '
+                 'default: fast'
+        ),
+        make_option(
+            '--output', dest='output',
+            help='Write the results to this file as JSON, to use as a '
+                 'baseline later'
+        ),
+        make_option(
+            '--baseline', dest='baseline',
+            help='Compare the results to the JSON in this file and fail if '
+                 'any got worse'
+        ),
+        make_option(
+            '--threshold', dest='threshold', type='float', default=0.2,
+            help='How much worse a time can get before it is a regression, '
+                 'default: 0.2 for 20%'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or benchmark.SCENARIOS.keys()
+        if options['url']:
+            results = benchmark.run(benchmark.Remote(options['url']), names,
+                                    options['iterations'], options['warmup'])
+        else:
+            results = self.run_local(names, options)
+
+        for line in benchmark.report(results):
+            self.stdout.write(line)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                regressions = benchmark.compare(
+                    results, json.load(baseline), options['threshold'])
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(regression)
+                raise CommandError('{0} regressions against {1}'.format(
+                    len(regressions), options['baseline']))
+            self.stdout.write('No regressions against {0}'.format(
+                options['baseline']))
+
+    def run_local(self, names, options):
+        profile = fake.get_profile(options['profile'])
+        servers = [fake.server(FakeBango(profile)),
+                   fake.server(FakeBraintree(profile))]
+        for server in servers:
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+        bango, braintree = ['http://127.0.0.1:{0}'.format(s.server_port)
+                            for s in servers]
+
+        try:
+            with benchmark.test_database(), override_settings(
+                    ALLOWED_HOSTS=['testserver'],
+                    BANGO_MOCK=False,
+                    BANGO_PROXY=bango + '/',
+                    BRAINTREE_MERCHANT_ID=(settings.BRAINTREE_MERCHANT_ID or
+                                           'benchmark'),
+                    BRAINTREE_PROXY=braintree + '/braintree',
+                    BRAINTREE_WEBHOOK_ASYNC=False,
+                    # The fake can't know which transaction a token is for.
+                    CHECK_BANGO_TOKEN=False,
+                    REQUIRE_OAUTH=False):
+                brains_client.reset()
+                return benchmark.run(benchmark.Local(), names,
+                                     options['iterations'], options['warmup'])
+        finally:
+            brains_client.reset()
+            for server in servers:
+                server.shutdown()
+                server.server_close()
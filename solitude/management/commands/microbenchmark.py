@@ -0,0 +1,47 @@
+import json
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from solitude import benchmark, microbenchmark
+
+
+class Command(BaseCommand):
+    help = ('Times serializers, forms, signing and the other code that runs '
+            'on most requests, on a test database. Reports the best, median '
+            'and worst time of a call in microseconds.')
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--filter', dest='filter', default='',
+            help='Only run benchmarks whose name contains this'
+        ),
+        make_option(
+            '--repeat', dest='repeat', type='int', default=5,
+            help='Times to repeat each benchmark, default: 5'
+        ),
+        make_option(
+            '--min-time', dest='min_time', type='float', default=0.2,
+            help='Seconds each repeat should take at least, default: 0.2'
+        ),
+        make_option(
+            '--output', dest='output',
+            help='Write the results to this file as JSON'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        names = [name for name in microbenchmark.BENCHMARKS
+                 if options['filter'] in name]
+        # The notification form would otherwise ask Bango about the token.
+        with benchmark.test_database(), override_settings(
+                CHECK_BANGO_TOKEN=False):
+            results = microbenchmark.run(names, options['repeat'],
+                                         options['min_time'])
+
+        for line in microbenchmark.report(results):
+            self.stdout.write(line)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
@@ -0,0 +1,43 @@
+import pstats
+from datetime import datetime
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from solitude.profiling import profiles
+
+
+class Command(BaseCommand):
+    help = ('List the request profiles in PROFILE_DIR, or aggregate them with '
+            '--aggregate.')
+    option_list = BaseCommand.option_list + (
+        make_option('--view', action='store', type='string', dest='view',
+                    default='',
+                    help='Only profiles for views containing this.'),
+        make_option('--aggregate', action='store_true', dest='aggregate',
+                    default=False,
+                    help='Combine the profiles and print the stats.'),
+        make_option('--sort', action='store', type='string', dest='sort',
+                    default='cumulative',
+                    help='How to sort the stats. Default: cumulative'),
+        make_option('--limit', action='store', type='int', dest='limit',
+                    default=30,
+                    help='Number of functions to show. Default: 30'),
+    )
+
+    def handle(self, *args, **options):
+        found = profiles(view=options['view'])
+        if not found:
+            raise CommandError('No profiles found.')
+
+        if not options['aggregate']:
+            for profile in found:
+                print '{0}  {1}  {2}'.format(
+                    datetime.fromtimestamp(profile.created)
+                    .strftime('%Y-%m-%d %H:%M:%S'),
+                    profile.transaction_id, profile.view)
+            return
+
+        print 'Aggregating {0} profiles.'.format(len(found))
+        stats = pstats.Stats(*[p.path for p in found])
+        stats.sort_stats(options['sort']).print_stats(options['limit'])
@@ -0,0 +1,182 @@
+"""
+A small in-process metrics registry.
+
+Statsd is fire and forget, so there's no way to look at what a single process
+is doing. This keeps counters, gauges and fixed bucket histograms in memory
+and renders them in the Prometheus text format at /services/metrics/.
+
+Recording is cheap: a dict lookup and a short lock on the metric.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+           float('inf'))
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{0}="{1}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    kind = 'counter'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def incr(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def render(self, name, labels):
+        return ['{0}{1} {2}'.format(name, _format_labels(labels),
+                                    _format_value(self.value))]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value):
+        with self.lock:
+            self.value = value
+
+
+class Histogram(object):
+    kind = 'histogram'
+
+    def __init__(self, buckets=BUCKETS):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q):
+        """
+        Estimate the q quantile (0 to 1) from the buckets, interpolating
+        inside the bucket the same way Prometheus does.
+        """
+        with self.lock:
+            counts, count = list(self.counts), self.count
+        if not count:
+            return None
+
+        rank = q * count
+        seen = 0
+        lower = 0
+        for bound, bucket in zip(self.buckets, counts):
+            if bucket and seen + bucket >= rank:
+                if bound == float('inf'):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / bucket
+            seen += bucket
+            lower = bound
+        return lower
+
+    def render(self, name, labels):
+        with self.lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        lines = []
+        cumulative = 0
+        for bound, bucket in zip(self.buckets, counts):
+            cumulative += bucket
+            lines.append('{0}_bucket{1} {2}'.format(
+                name, _format_labels(labels, [('le', _format_value(bound))]),
+                cumulative))
+        lines.append('{0}_sum{1} {2}'.format(name, _format_labels(labels),
+                                             _format_value(total)))
+        lines.append('{0}_count{1} {2}'.format(name, _format_labels(labels),
+                                               count))
+        return lines
+
+
+class Registry(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.kinds = {}
+
+    def get(self, cls, metric_name, **labels):
+        key = (metric_name, _labels(labels))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                kind = self.kinds.setdefault(metric_name, cls)
+                metric = self.metrics.setdefault(key, kind())
+        if type(metric) is not cls:
+            raise ValueError('{0} is already a {1}'
+                             .format(metric_name, metric.kind))
+        return metric
+
+    def incr(self, metric_name, amount=1, **labels):
+        self.get(Counter, metric_name, **labels).incr(amount)
+
+    def gauge(self, metric_name, value, **labels):
+        self.get(Gauge, metric_name, **labels).set(value)
+
+    def observe(self, metric_name, value, **labels):
+        self.get(Histogram, metric_name, **labels).observe(value)
+
+    @contextmanager
+    def timer(self, metric_name, **labels):
+        """
+        Record how long the block takes, in seconds, into a histogram.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(metric_name, time.time() - start, **labels)
+
+    def clear(self):
+        with self.lock:
+            self.metrics.clear()
+            self.kinds.clear()
+
+    def render(self):
+        with self.lock:
+            items = sorted(self.metrics.items())
+            kinds = dict(self.kinds)
+        lines = []
+        last = None
+        for (name, labels), metric in items:
+            if name != last:
+                lines.append('# TYPE {0} {1}'.format(name, kinds[name].kind))
+                last = name
+            lines.extend(metric.render(name, labels))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+incr = registry.incr
+gauge = registry.gauge
+observe = registry.observe
+timer = registry.timer
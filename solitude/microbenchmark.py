@@ -0,0 +1,257 @@
+"""
+Microbenchmarks of the code that runs on most requests, run them with the
+microbenchmark command.
+
+Each benchmark is a function that is given the fixtures and returns the
+callable to time. The callable is run enough times for a repeat to take at
+least min_time and the best and median of the repeats are reported, the
+best is the most stable measure of what the code costs. The garbage
+collector is off while timing, as in timeit.
+"""
+import platform
+import random
+import time
+import timeit
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.test import RequestFactory
+
+from rest_framework.request import Request
+
+from lib.bango.forms import CreateBillingConfigurationForm, NotificationForm
+from lib.bango.utils import sign, verify_sig
+from lib.buyers.models import Buyer
+from lib.buyers.serializers import BuyerSerializer
+from lib.sellers.models import (Seller, SellerBango, SellerProduct,
+                                SellerProductBango)
+from lib.transactions import constants
+from lib.transactions.models import Transaction
+from lib.transactions.serializers import TransactionSerializer
+from lib.transactions.views import TransactionViewSet
+from solitude.base import etag_func
+from solitude.filter import StrictQueryFilter
+from solitude.logger import getLogger
+from solitude.processor import sanitise
+
+log = getLogger('s.benchmark')
+
+BENCHMARKS = OrderedDict()
+
+
+def register(name):
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+class Fixtures(object):
+
+    """The objects the benchmarks use, created once."""
+
+    def __init__(self, count=100):
+        self.seller = Seller.objects.create(uuid='benchmark:seller')
+        self.product = SellerProduct.objects.create(
+            seller=self.seller, external_id='benchmark', secret='hush',
+            public_id='benchmark')
+        seller_bango = SellerBango.objects.create(
+            seller=self.seller, package_id=1, admin_person_id=1,
+            support_person_id=1, finance_person_id=1)
+        SellerProductBango.objects.create(
+            seller_product=self.product, seller_bango=seller_bango,
+            bango_id='benchmark')
+
+        for x in range(count):
+            Buyer.objects.create(uuid='benchmark:buyer:{0}'.format(x),
+                                 email='buyer{0}@example.com'.format(x))
+        self.buyers = list(Buyer.objects.filter(uuid__startswith='benchmark'))
+
+        Transaction.objects.bulk_create(
+            Transaction(amount=1, currency='USD', seller=self.seller,
+                        seller_product=self.product,
+                        provider=constants.PROVIDER_BANGO,
+                        status=constants.STATUS_RECEIVED,
+                        uuid='benchmark:transaction:{0}'.format(x))
+            for x in range(count))
+        self.transactions = list(Transaction.objects.filter(
+            uuid__startswith='benchmark'))
+        self.transaction = self.transactions[0]
+
+
+@register('serializer.transaction.1')
+def transaction_serializer(fixtures):
+    transaction = fixtures.transaction
+    return lambda: TransactionSerializer(transaction).data
+
+
+@register('serializer.transaction.100')
+def transaction_serializer_many(fixtures):
+    transactions = fixtures.transactions
+    return lambda: TransactionSerializer(transactions, many=True).data
+
+
+@register('serializer.buyer.1')
+def buyer_serializer(fixtures):
+    buyer = fixtures.buyers[0]
+    return lambda: BuyerSerializer(buyer).data
+
+
+@register('serializer.buyer.100')
+def buyer_serializer_many(fixtures):
+    buyers = fixtures.buyers
+    return lambda: BuyerSerializer(buyers, many=True).data
+
+
+def valid(form):
+    if not form.is_valid():
+        raise ValueError('Invalid benchmark data: {0}'.format(form.errors))
+    return form
+
+
+@register('form.billing')
+def billing_form(fixtures):
+    data = {
+        'pageTitle': 'Benchmark',
+        'prices': [{'price': 1, 'currency': 'EUR', 'method': 2},
+                   {'price': 2, 'currency': 'USD', 'method': 2}],
+        'redirect_url_onerror': 'https://nowhere.com/error',
+        'redirect_url_onsuccess': 'https://nowhere.com/success',
+        'transaction_uuid': fixtures.transaction.uuid,
+        'user_uuid': 'benchmark:buyer:0',
+    }
+    valid(CreateBillingConfigurationForm(data))
+    return lambda: CreateBillingConfigurationForm(data).is_valid()
+
+
+@register('form.notification')
+def notification_form(fixtures):
+    request = RequestFactory().post('/bango/notification/')
+    data = {
+        'moz_transaction': fixtures.transaction.uuid,
+        'moz_signature': sign(fixtures.transaction.uuid),
+        'billing_config_id': '1234',
+        'bango_trans_id': '56789',
+        'bango_response_code': 'OK',
+        'bango_response_message': 'Success',
+        'amount': '0.99',
+        'currency': 'EUR',
+        'bango_token': 'benchmark',
+    }
+    valid(NotificationForm(request, data))
+    return lambda: NotificationForm(request, data).is_valid()
+
+
+@register('bango.sign')
+def bango_sign(fixtures):
+    message = str(uuid.uuid4())
+    return lambda: sign(message)
+
+
+@register('bango.verify_sig')
+def bango_verify_sig(fixtures):
+    message = str(uuid.uuid4())
+    signature = sign(message)
+    return lambda: verify_sig(signature, message)
+
+
+@register('hashfield.hash')
+def hash_field(fixtures):
+    field = Buyer._meta.get_field('pin')
+    return lambda: field.to_python('1234')
+
+
+@register('etag_func.100')
+def etag(fixtures):
+    request = RequestFactory().get('/generic/transaction/')
+    seller = fixtures.seller
+    return lambda: etag_func(request, Transaction.objects.filter(
+        seller=seller))
+
+
+@register('filter.strict')
+def strict_filter(fixtures):
+    request = Request(RequestFactory().get(
+        '/generic/transaction/',
+        {'seller': fixtures.seller.pk, 'provider': 1, 'page': 2}))
+    view = TransactionViewSet()
+    queryset = Transaction.objects.all()
+    return lambda: StrictQueryFilter().filter_queryset(request, queryset,
+                                                       view)
+
+
+def large_payload(width=20, depth=3):
+    """
+    Nested dictionaries with width keys on each level, some of them
+    sensitive.
+    """
+    sensitive = list(settings.SENSITIVE_DATA_KEYS)
+    data = {}
+    for x in range(width):
+        key = sensitive[x % len(sensitive)] if x % 5 == 0 else 'key-%s' % x
+        data[key] = (large_payload(width, depth - 1) if depth > 1
+                     and x % 4 == 1 else 'value-%s' % x)
+    return data
+
+
+@register('sanitise.large')
+def sanitise_large(fixtures):
+    data = large_payload()
+    return lambda: sanitise(data)
+
+
+def measure(func, repeat=5, min_time=0.2):
+    """
+    Time func, returns the number of calls in each repeat and the time of
+    a call in each repeat, fastest first.
+    """
+    timer = timeit.Timer(func)
+    # Warm any caches up.
+    func()
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time or number >= 10 ** 6:
+            break
+        number *= 10
+    return number, sorted(t / number for t in timer.repeat(repeat, number))
+
+
+def run(names, repeat=5, min_time=0.2):
+    """
+    Run the benchmarks and return the results, which can be saved as JSON.
+    Times are in microseconds.
+    """
+    # Anything random the benchmarks use is the same on every run.
+    random.seed(0)
+    fixtures = Fixtures()
+    benchmarks = OrderedDict()
+    for name in names:
+        log.info('Running: {0}'.format(name))
+        number, times = measure(BENCHMARKS[name](fixtures), repeat, min_time)
+        us = lambda value: round(value * 10 ** 6, 2)
+        benchmarks[name] = {
+            'number': number,
+            'repeat': repeat,
+            'best': us(times[0]),
+            'median': us(times[len(times) // 2]),
+            'worst': us(times[-1]),
+        }
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'benchmarks': benchmarks,
+    }
+
+
+def report(results):
+    """
+    The results as lines of text.
+    """
+    lines = ['{0:<28} {1:>10} {2:>12} {3:>12} {4:>12}'.format(
+        'benchmark', 'calls', 'best us', 'median us', 'worst us')]
+    for name, data in results['benchmarks'].items():
+        lines.append('{0:<28} {number:>10} {best:>12} {median:>12} '
+                     '{worst:>12}'.format(name, **data))
+    return lines
@@ -1,4 +1,12 @@
+import random
 import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+from solitude import metrics
 
 _local = threading.local()
 
@@ -15,6 +23,99 @@ def set_oauth_key(key):
     _local.OAUTH_KEY = key
 
 
+def get_context():
+    """
+    The request values of this thread: the consumer, TRANSACTION_ID and
+    Server-Timing. Pass them to set_context to use them on another thread.
+    """
+    return _local.__dict__.copy()
+
+
+def set_context(context):
+    _local.__dict__.clear()
+    _local.__dict__.update(context)
+
+
+def view_name(view_func):
+    return '{0}.{1}'.format(
+        view_func.__module__,
+        getattr(view_func, '__name__', view_func.__class__.__name__))
+
+
+class QueryLog(object):
+
+    """
+    The queries run on the default database between start and stop. This
+    turns on the debug cursor, which records the SQL and time of each query.
+    """
+
+    def start(self):
+        log = connection.queries_log
+        self.last = log[-1] if log else None
+        self.force_debug = connection.force_debug_cursor
+        connection.force_debug_cursor = True
+        return self
+
+    def stop(self):
+        connection.force_debug_cursor = self.force_debug
+        # The log drops the oldest queries once it is full, so look for the
+        # last query from before start rather than counting from where it was.
+        queries = []
+        for query in reversed(connection.queries_log):
+            if query is self.last:
+                break
+            queries.append(query)
+        return queries[::-1]
+
+
+@contextmanager
+def server_timing(name):
+    """
+    Add the time spent in the block to the Server-Timing header under name.
+    Does nothing unless the request asked for Server-Timing.
+    """
+    timings = getattr(_local, 'SERVER_TIMING', None)
+    if timings is None:
+        yield
+        return
+
+    start = time.time()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0) + time.time() - start
+
+
+def after_commit(func, *args):
+    """
+    Call func once the request's transaction has committed, or now if there
+    isn't one. Django 1.8 has no transaction.on_commit, so this relies on
+    CommitMiddleware running after ATOMIC_REQUESTS has committed the view.
+    """
+    pending = getattr(_local, 'AFTER_COMMIT', None)
+    if pending is None or not connection.in_atomic_block:
+        func(*args)
+        return
+    pending.append((func, args))
+
+
+class CommitMiddleware(object):
+
+    """
+    Run what the request asked for with after_commit.
+    """
+
+    def process_request(self, request):
+        _local.AFTER_COMMIT = []
+
+    def process_response(self, request, response):
+        pending = getattr(_local, 'AFTER_COMMIT', None) or []
+        _local.AFTER_COMMIT = None
+        for func, args in pending:
+            func(*args)
+        return response
+
+
 class LoggerMiddleware(object):
 
     def process_request(self, request):
@@ -23,3 +124,164 @@ class LoggerMiddleware(object):
         # yet so this sets the value to anon. When authentication is completed
         # that will update the oauth_key with the authenticated value.
         set_oauth_key(getattr(request, 'OAUTH_KEY', '<anon>'))
+
+
+class MetricsMiddleware(object):
+
+    """
+    Record the time spent in each view, by view and HTTP method, into the
+    in-process metrics registry.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_view = view_name(view_func)
+        request._metrics_start = time.time()
+
+    def process_response(self, request, response):
+        view = getattr(request, '_metrics_view', None)
+        if view:
+            metrics.observe('solitude_view_seconds',
+                            time.time() - request._metrics_start,
+                            view=view, method=request.method)
+            metrics.incr('solitude_view_responses_total', view=view,
+                         method=request.method, status=response.status_code)
+        return response
+
+
+class ServerTimingMiddleware(object):
+
+    """
+    If the request has a Solitude-Server-Timing header and comes from one of
+    the SERVER_TIMING_CONSUMERS, add a Server-Timing header to the response
+    splitting the time into the db, upstream calls, auth and rendering.
+    """
+    header = 'HTTP_SOLITUDE_SERVER_TIMING'
+
+    def process_request(self, request):
+        _local.SERVER_TIMING = None
+        if not request.META.get(self.header):
+            return
+
+        # The consumer isn't authenticated until the view runs, that's
+        # checked in process_response. Until then this stops anyone else
+        # turning on the debug cursor.
+        from solitude.authentication import get_oauth_consumer_key_from_header
+        consumer = get_oauth_consumer_key_from_header(
+            request.META.get('HTTP_AUTHORIZATION'))
+        if consumer not in settings.SERVER_TIMING_CONSUMERS:
+            return
+
+        _local.SERVER_TIMING = {}
+        request._server_timing = (time.time(), QueryLog().start())
+
+    def process_template_response(self, request, response):
+        if getattr(request, '_server_timing', None):
+            start = time.time()
+
+            def rendered(response):
+                timings = getattr(_local, 'SERVER_TIMING', None)
+                if timings is not None:
+                    timings['render'] = time.time() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def process_response(self, request, response):
+        timings = getattr(_local, 'SERVER_TIMING', None)
+        _local.SERVER_TIMING = None
+        if not getattr(request, '_server_timing', None):
+            return response
+
+        start, query_log = request._server_timing
+        queries = query_log.stop()
+        # The consumer is only known once the view has authenticated.
+        if get_oauth_key() not in settings.SERVER_TIMING_CONSUMERS:
+            return response
+
+        timings['db'] = sum(float(q['time']) for q in queries)
+        timings['total'] = time.time() - start
+        response['Server-Timing'] = ', '.join(
+            '{0};dur={1:.1f}'.format(name, timings[name] * 1000)
+            for name in sorted(timings))
+        return response
+
+
+class ProfileMiddleware(object):
+
+    """
+    Run a sample of requests, PROFILE_SAMPLE_RATE, under the profiler. A
+    request can also ask for it by sending a Solitude-Profile header that
+    matches PROFILE_TOKEN. See solitude.profiling.
+
+    The profiler starts in process_view and stops when the response or
+    exception comes back, so Django still calls the view, in a transaction
+    if ATOMIC_REQUESTS is on. Put this last so only the view is profiled.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        token = request.META.get('HTTP_SOLITUDE_PROFILE')
+        if not ((settings.PROFILE_TOKEN and token == settings.PROFILE_TOKEN)
+                or random.random() < settings.PROFILE_SAMPLE_RATE):
+            return
+
+        # Imported here, solitude.profiling logs and the logger imports this.
+        from solitude import profiling
+        request._profile = (view_name(view_func), profiling.start())
+
+    def process_exception(self, request, exception):
+        self.save(request)
+
+    def process_response(self, request, response):
+        self.save(request)
+        return response
+
+    def save(self, request):
+        profile = getattr(request, '_profile', None)
+        if not profile:
+            return
+
+        from solitude import profiling
+        del request._profile
+        view, profiler = profile
+        profiling.save(profiler, get_transaction_id(), view)
+
+
+class QueryCountMiddleware(object):
+
+    """
+    Count the queries and the time spent in the database for a sample of
+    requests, QUERY_COUNT_SAMPLE_RATE, or all of them under DEBUG. The
+    slowest queries of a request that has one slower than SLOW_QUERY_TIME
+    seconds are logged.
+
+    Counting uses the debug cursor, which keeps the SQL and time of every
+    query of the request, so it isn't done for every request.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not (settings.DEBUG or
+                random.random() < settings.QUERY_COUNT_SAMPLE_RATE):
+            return
+        request._query_log = (view_name(view_func), QueryLog().start())
+
+    def process_response(self, request, response):
+        if not getattr(request, '_query_log', None):
+            return response
+
+        view, query_log = request._query_log
+        queries = query_log.stop()
+        times = sorted(((float(q['time']), q['sql']) for q in queries),
+                       reverse=True)
+        metrics.incr('solitude_db_queries_total', len(queries), view=view)
+        metrics.observe('solitude_db_seconds', sum(t for t, _ in times),
+                        view=view)
+
+        if times and times[0][0] >= settings.SLOW_QUERY_TIME:
+            # Imported here, the logger imports this.
+            from solitude.logger import getLogger
+            slowest = '; '.join('{0:.3f}s {1}'.format(*slow)
+                                for slow in times[:settings.SLOW_QUERY_LOG])
+            getLogger('s.db').warning(
+                'Slow queries in: {0}, {1} queries, slowest: {2}'
+                .format(view, len(queries), slowest))
+        return response
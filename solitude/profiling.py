@@ -0,0 +1,91 @@
+"""
+Profiles of requests, written to PROFILE_DIR.
+
+Each profile is a cProfile dump named after the time, the TRANSACTION_ID and
+the view, for example::
+
+    1445000000.12-webpay:abc-lib.bango.views.billing.CreateBillingConfigurationView.prof
+
+Only the newest PROFILE_MAX_FILES are kept.
+"""
+import cProfile
+import os
+import re
+import time
+
+from django.conf import settings
+
+from solitude.logger import getLogger
+
+log = getLogger('s.profiling')
+
+unsafe = re.compile(r'[^\w.:]')
+
+
+class Profile(object):
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.path = os.path.join(settings.PROFILE_DIR, filename)
+        created, self.transaction_id, view = (
+            filename.rsplit('.', 1)[0].split('-', 2))
+        self.created = float(created)
+        self.view = view
+
+
+def profiles(view=None):
+    """
+    All the profiles, oldest first. Optionally only those for a view.
+    """
+    try:
+        filenames = os.listdir(settings.PROFILE_DIR)
+    except OSError:
+        return []
+
+    found = []
+    for filename in filenames:
+        if not filename.endswith('.prof'):
+            continue
+        try:
+            profile = Profile(filename)
+        except ValueError:
+            continue
+        if view and view not in profile.view:
+            continue
+        found.append(profile)
+    return sorted(found, key=lambda p: p.created)
+
+
+def rotate():
+    for profile in profiles()[:-settings.PROFILE_MAX_FILES or None]:
+        try:
+            os.remove(profile.path)
+        except OSError:
+            # Another process got there first.
+            pass
+
+
+def start():
+    """
+    Start profiling the calling thread, stop it with save.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def save(profiler, transaction_id, view):
+    """
+    Stop the profiler and write the profile out.
+    """
+    profiler.disable()
+    filename = '{0:.2f}-{1}-{2}.prof'.format(
+        time.time(), unsafe.sub('_', transaction_id or '-'),
+        unsafe.sub('_', view))
+    try:
+        if not os.path.exists(settings.PROFILE_DIR):
+            os.makedirs(settings.PROFILE_DIR)
+        profiler.dump_stats(os.path.join(settings.PROFILE_DIR, filename))
+        rotate()
+    except (IOError, OSError):
+        log.exception('Could not write profile: {0}'.format(filename))
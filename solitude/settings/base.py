@@ -198,6 +198,10 @@ AES_KEYS = {
     'bango:signature': 'solitude/settings/sample.key',
 }
 
+# Looks up the AES_KEYS for aesfield, this one reads each key once. See
+# solitude.aes.
+AES_METHOD = 'solitude.aes'
+
 # The header that passes the real URL to the solitude-auth server.
 AUTH_SERVICE = 'x-solitude-service'
 
@@ -214,6 +218,11 @@ BASE_PASSWORD_HASHERS = (
     'django.contrib.auth.hashers.UnsaltedMD5PasswordHasher',
 )
 
+# The bcrypt cost. Each one added doubles the time to hash or check a PIN.
+# PINs hashed with a different cost are rehashed when they are next verified.
+# Use the pin_benchmark command to see how long each cost takes.
+BCRYPT_ROUNDS = 12
+
 # Set up bcrypt.
 HMAC_KEYS = {
     '2011-01-01': 'please change me',
@@ -221,6 +230,35 @@ HMAC_KEYS = {
 from django_sha2 import get_password_hashers
 PASSWORD_HASHERS = get_password_hashers(BASE_PASSWORD_HASHERS, HMAC_KEYS)
 
+# The most calls each process makes to an upstream at once, size in all and
+# consumer for each OAuth consumer. A call waits up to timeout seconds for
+# room and then gets a 503. Upstreams not listed here aren't limited, the
+# zippy providers are listed by their reference. See solitude.bulkheads.
+BULKHEADS = {
+    'bango': {'size': 10, 'consumer': 5, 'timeout': 2},
+    'braintree': {'size': 10, 'consumer': 5, 'timeout': 2},
+    'reference': {'size': 10, 'consumer': 5, 'timeout': 2},
+}
+
+# Closing a buyer runs up to BUYER_CLOSE_WORKERS calls to the payment
+# providers at once. A closure still running after BUYER_CLOSE_TIMEOUT
+# seconds is assumed to have died and can be started again. See
+# lib.buyers.closure.
+BUYER_CLOSE_TIMEOUT = 60 * 10
+BUYER_CLOSE_WORKERS = 4
+
+# How long in seconds buyers looked up by uuid are kept in the cache. See
+# lib.buyers.cache.
+BUYER_CACHE_TIMEOUT = 60 * 5
+
+# After this many failed calls in a row to a method of an upstream, calls to
+# that method are refused with a 503 for reset seconds. Then one call is let
+# through to see if the upstream is back. See solitude.breakers.
+CIRCUIT_BREAKERS = {
+    'bango': {'failures': 5, 'reset': 30},
+    'braintree': {'failures': 5, 'reset': 30},
+}
+
 # Access the cleansed settings values.
 CLEANSED_SETTINGS_ACCESS = False
 
@@ -245,6 +283,11 @@ DUMP_REQUESTS = False
 # Remove traces of jinja and jingo from solitude.
 JINJA_CONFIG = lambda: ''
 
+# /services/metrics/ doesn't use OAuth, so scrapers can read it. Instead they
+# send this in an Authorization: Bearer header. Leave empty to turn the
+# metrics off.
+METRICS_TOKEN = ''
+
 MINIFY_BUNDLES = {}
 
 # New Relic is configured here.
@@ -256,14 +299,72 @@ PIN_FAILURES = 5
 # The amount of time before you can try it again in seconds.
 PIN_FAILURE_LENGTH = 300
 
+# The number of threads hashing and checking PINs and how long in seconds a
+# request will wait for them before giving up with a 503. Once PIN_HASH_QUEUE
+# PINs are waiting for a thread, more get a 503 straight away.
+PIN_HASH_QUEUE = 40
+PIN_HASH_TIMEOUT = 5
+PIN_HASH_WORKERS = 4
+
+# Where PIN failures are counted. The default counts them on the buyer in the
+# database. lib.buyers.lockout.CacheLockout counts them in the cache and only
+# writes to the database when the buyer is locked out or cleared.
+PIN_LOCKOUT_BACKEND = 'lib.buyers.lockout.DatabaseLockout'
+
+# Where request profiles are written to and how many are kept. See
+# solitude.profiling.
+PROFILE_DIR = os.path.join('/tmp', 'solitude-profiles')
+PROFILE_MAX_FILES = 500
+
+# The fraction of requests to profile, 0.01 is 1 in 100.
+PROFILE_SAMPLE_RATE = 0
+
+# A request with a Solitude-Profile header with this value will be profiled.
+# Leave empty to turn that off.
+PROFILE_TOKEN = ''
+
 PROJECT_MODULE = 'solitude'
 
+# The fraction of requests that have their queries counted, 0.01 is 1 in 100.
+# Under DEBUG they all are. Counting turns on the debug cursor for the
+# request, which keeps the SQL and time of each query.
+QUERY_COUNT_SAMPLE_RATE = 0.01
+
 # If this flag is set, any communication will require OAuth signing of the
 # request. Without this, OAuth is optional. This should be True for production.
 REQUIRE_OAUTH = True
 
+# Seller products looked up by public_id are kept in the Django cache for this
+# many seconds, and the last SELLER_PRODUCT_CACHE_SIZE are also kept in each
+# process. See lib.sellers.cache.
+SELLER_PRODUCT_CACHE_SIZE = 1000
+SELLER_PRODUCT_CACHE_TIMEOUT = 60 * 5
+
+# OAuth keys that may ask for a Server-Timing header on responses, by sending
+# a Solitude-Server-Timing header. For example: ('webpay',).
+SERVER_TIMING_CONSUMERS = ()
+
+# How often in seconds the /services/status/ probes are refreshed in the
+# background. Set to 0 to run the probes on every request.
+SERVICES_STATUS_INTERVAL = 30
+
+# The deadline in seconds for each of the /services/status/ probes, a probe
+# that takes longer than this is reported as a failure.
+SERVICES_STATUS_TIMEOUTS = {
+    'cache': 1,
+    'db': 2,
+    'proxies': 5,
+    'settings': 1,
+}
+
 # URLs that should not require oauth autentication, for example Nagios checks.
-SKIP_OAUTH = (reverse_lazy('services.status'),)
+SKIP_OAUTH = (reverse_lazy('services.metrics'),
+              reverse_lazy('services.status'))
+
+# If a query in a counted request takes longer than this in seconds, the
+# slowest SLOW_QUERY_LOG queries of that request are logged to s.db.
+SLOW_QUERY_TIME = 0.5
+SLOW_QUERY_LOG = 3
 
 if SOLITUDE_PROXY:
     # The proxy runs with no database access. And just a couple of libraries.
@@ -272,6 +373,7 @@ if SOLITUDE_PROXY:
     )
     MIDDLEWARE_CLASSES = (
         'solitude.middleware.LoggerMiddleware',
+        'solitude.middleware.MetricsMiddleware',
         'django_statsd.middleware.GraphiteMiddleware',
     )
 else:
@@ -285,11 +387,17 @@ else:
     )
     MIDDLEWARE_CLASSES = (
         'solitude.middleware.LoggerMiddleware',
+        'solitude.middleware.CommitMiddleware',
         'django.middleware.common.CommonMiddleware',
         'django.middleware.http.ConditionalGetMiddleware',
+        'solitude.middleware.ServerTimingMiddleware',
+        'solitude.middleware.MetricsMiddleware',
+        'solitude.middleware.QueryCountMiddleware',
         'django_statsd.middleware.GraphiteMiddleware',
         'django_paranoia.middleware.Middleware',
-        'django.middleware.security.SecurityMiddleware'
+        'django.middleware.security.SecurityMiddleware',
+        # Last, so that only the view is profiled.
+        'solitude.middleware.ProfileMiddleware',
     )
 
 STATSD_CLIENT = 'django_statsd.clients.normal'
@@ -424,6 +532,25 @@ SEND_USER_ID_TO_BANGO = True
 # The API can indeed be slow, see bug 883389.
 BANGO_TIMEOUT = 30
 
+# Bango methods that only read are tried up to BANGO_RETRY_ATTEMPTS times in
+# all. A failed call is retried after a random pause of up to
+# BANGO_RETRY_BACKOFF seconds, doubled for each failure. A call that hasn't
+# answered by the p95 of the method is tried again alongside, until there
+# have been enough calls for a p95 BANGO_HEDGE_DELAY seconds is used. After
+# BANGO_RETRY_DEADLINE seconds without an answer the call fails. See
+# lib.bango.client.retry.
+BANGO_RETRY_ATTEMPTS = 3
+BANGO_RETRY_BACKOFF = 0.1
+BANGO_HEDGE_DELAY = 1
+BANGO_RETRY_DEADLINE = 15
+
+# Packages from GetPackage are kept in the cache and used for
+# BANGO_PACKAGE_CACHE_TIMEOUT seconds. For BANGO_PACKAGE_CACHE_STALE seconds
+# after that they are still used while they are fetched again in the
+# background. Set the timeout to 0 to turn it off. See lib.bango.cache.
+BANGO_PACKAGE_CACHE_TIMEOUT = 60 * 5
+BANGO_PACKAGE_CACHE_STALE = 60 * 60
+
 # Time in days after which Bango statuses will be cleaned by the
 # `clean_statuses` command.
 BANGO_STATUSES_LIFETIME = 30
@@ -510,3 +637,23 @@ BRAINTREE_TRANSACTION_STATUSES = (
 
 # An arbitrary limit on the number of payment methods.
 BRAINTREE_MAX_METHODS = 5
+
+# The number of kept alive connections to BRAINTREE_PROXY in each process.
+BRAINTREE_POOL_SIZE = 10
+
+# Store webhooks and acknowledge them straight away, rather than processing
+# them while Braintree waits. The braintree_webhook_worker command processes
+# them with up to BRAINTREE_WEBHOOK_WORKERS at once. A webhook still running
+# after BRAINTREE_WEBHOOK_TIMEOUT seconds is assumed to have died. See
+# lib.brains.webhooks.
+BRAINTREE_WEBHOOK_ASYNC = False
+BRAINTREE_WEBHOOK_TIMEOUT = 60 * 5
+BRAINTREE_WEBHOOK_WORKERS = 4
+
+# Keep up to BRAINTREE_TOKEN_POOL_SIZE client tokens generated ahead of time
+# in each process, throwing them away after BRAINTREE_TOKEN_MAX_AGE seconds.
+# Every BRAINTREE_TOKEN_REFRESH_INTERVAL seconds the ones about to expire are
+# replaced, 0 turns that off. See lib.brains.tokens.
+BRAINTREE_TOKEN_POOL_SIZE = 5
+BRAINTREE_TOKEN_MAX_AGE = 60 * 60
+BRAINTREE_TOKEN_REFRESH_INTERVAL = 60 * 5
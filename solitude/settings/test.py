@@ -28,6 +28,27 @@ DEBUG_PROPAGATE_EXCEPTIONS = False
 
 DUMP_REQUESTS = False
 
+# Close buyers and process webhooks on the test thread.
+BUYER_CLOSE_WORKERS = 0
+BRAINTREE_WEBHOOK_WORKERS = 0
+# Generate client tokens when they are asked for.
+BRAINTREE_TOKEN_POOL_SIZE = 0
+# Tests that make upstreams fail shouldn't affect the next test.
+CIRCUIT_BREAKERS = {}
+# Don't limit the calls to upstreams.
+BULKHEADS = {}
+# Call Bango once, on the test thread.
+BANGO_RETRY_ATTEMPTS = 1
+
+# The cache isn't cleared between tests, the cache tests turn these on.
+BUYER_CACHE_TIMEOUT = 0
+SELLER_PRODUCT_CACHE_TIMEOUT = 0
+BANGO_PACKAGE_CACHE_TIMEOUT = 0
+
+# Keep hashing fast and on the test thread.
+BCRYPT_ROUNDS = 4
+PIN_HASH_WORKERS = 0
+
 HMAC_KEYS = {'2011-01-01': 'cheesecake'}
 from django_sha2 import get_password_hashers
 PASSWORD_HASHERS = get_password_hashers(BASE_PASSWORD_HASHERS, HMAC_KEYS)
@@ -60,6 +81,9 @@ CHECK_BANGO_TOKEN = True
 
 REQUIRE_OAUTH = False
 
+# Run the status probes on each request.
+SERVICES_STATUS_INTERVAL = 0
+
 # Live server tests require this, otherwise they will fail. There is no static
 # content on our site, so meh.
 STATIC_URL = '/'
@@ -10,7 +10,7 @@ from lib.buyers.models import Buyer
 from solitude.base import APITest
 from solitude.errors import InvalidQueryParams
 from solitude.filter import StrictQueryFilter
-from solitude.utils import shorter
+from solitude.utils import percentile, shorter
 
 
 class TestHeaders(APITest):
@@ -105,3 +105,17 @@ class TestShorter(TestCase):
 
     def test_shorter(self):
         eq_(shorter(40000), 'nUs')
+
+
+class TestPercentile(TestCase):
+
+    def test_percentile(self):
+        values = range(1, 101)
+        eq_(percentile(values, 50), 50)
+        eq_(percentile(values, 95), 95)
+        eq_(percentile(values, 99), 99)
+        eq_(percentile([3], 99), 3)
+        eq_(percentile([], 50), None)
+
+    def test_unsorted(self):
+        eq_(percentile([3, 1, 2], 50), 2)
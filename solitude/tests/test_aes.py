@@ -0,0 +1,102 @@
+import os
+import tempfile
+
+from django.db import connection
+from django.test import TestCase
+
+from aesfield.field import AESField as OldAESField
+from mock import patch
+from nose.tools import eq_, ok_
+
+from lib.buyers.models import Buyer
+from lib.sellers.models import Seller, SellerProduct
+from solitude import aes
+
+
+class TestLookup(TestCase):
+
+    def setUp(self):
+        aes._keys.clear()
+
+    def test_cached(self):
+        with patch('solitude.aes._lookup') as _lookup:
+            _lookup.return_value = 'a' * 10
+            eq_(aes.lookup('bango:signature'), 'a' * 10)
+            eq_(aes.lookup('bango:signature'), 'a' * 10)
+        eq_(_lookup.call_count, 1)
+
+    def test_changed(self):
+        tmp = tempfile.NamedTemporaryFile(mode='w', delete=False)
+        tmp.write('some other secret')
+        tmp.close()
+        self.addCleanup(lambda: os.unlink(tmp.name))
+        old = aes.lookup('bango:signature')
+        with self.settings(AES_KEYS={'bango:signature': tmp.name}):
+            eq_(aes.lookup('bango:signature'), 'some other secret')
+        eq_(aes.lookup('bango:signature'), old)
+
+    def test_short(self):
+        with patch('solitude.aes._lookup') as _lookup:
+            _lookup.return_value = 'a'
+            with self.assertRaises(ValueError):
+                aes.lookup('bango:signature')
+
+
+class TestField(TestCase):
+
+    def setUp(self):
+        self.buyer = Buyer.objects.create(uuid='lazy', email='f@f.c')
+
+    def raw(self):
+        cursor = connection.cursor()
+        cursor.execute('SELECT email FROM buyer WHERE id = %s',
+                       [self.buyer.pk])
+        return cursor.fetchone()[0]
+
+    def test_encrypted(self):
+        ok_(self.raw().startswith('aes:'))
+        ok_('f@f.c' not in self.raw())
+
+    def test_lazy(self):
+        with patch('solitude.aes.decrypt') as decrypt:
+            decrypt.return_value = u'f@f.c'
+            buyer = Buyer.objects.get(pk=self.buyer.pk)
+            ok_(not decrypt.called)
+            eq_(buyer.email, 'f@f.c')
+            eq_(buyer.email, 'f@f.c')
+        eq_(decrypt.call_count, 1)
+
+    def test_save_unread(self):
+        raw = self.raw()
+        buyer = Buyer.objects.get(pk=self.buyer.pk)
+        with patch('solitude.aes.encrypt') as encrypt:
+            buyer.save()
+        ok_(not encrypt.called)
+        eq_(self.raw(), raw)
+        eq_(Buyer.objects.get(pk=self.buyer.pk).email, 'f@f.c')
+
+    def test_save_changed(self):
+        buyer = Buyer.objects.get(pk=self.buyer.pk)
+        buyer.email = 'b@b.c'
+        buyer.save()
+        eq_(Buyer.objects.get(pk=self.buyer.pk).email, 'b@b.c')
+
+    def test_empty(self):
+        buyer = Buyer.objects.create(uuid='empty')
+        eq_(Buyer.objects.get(pk=buyer.pk).email, None)
+
+    def test_deferred(self):
+        buyer = Buyer.objects.defer('email').get(pk=self.buyer.pk)
+        eq_(buyer.email, 'f@f.c')
+
+    def test_compatible(self):
+        # Data written by aesfield can be read and the other way around.
+        old = OldAESField(aes_key='buyeremail:key')
+        eq_(aes.decrypt(old._encrypt('f@f.c'), 'buyeremail:key'), 'f@f.c')
+        eq_(old.to_python(self.raw()), 'f@f.c')
+
+    def test_product(self):
+        seller = Seller.objects.create(uuid='seller')
+        product = SellerProduct.objects.create(seller=seller, public_id='p',
+                                               external_id='e', secret='s')
+        eq_(SellerProduct.objects.get(pk=product.pk).secret, 's')
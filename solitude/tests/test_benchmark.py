@@ -0,0 +1,112 @@
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from mock import Mock, patch
+from nose.tools import eq_, ok_
+
+from lib.brains import client
+from lib.brains.fake import FakeBraintree
+from lib.brains.tests.test_fake import Session
+from solitude import benchmark
+from solitude.base import APITest
+from solitude.fake import Profile
+
+
+def results(p95=10, queries=2, rps=100):
+    return {
+        'endpoints': {'buyer.create': {
+            'requests': 10, 'rps': rps, 'mean': p95, 'p50': p95, 'p95': p95,
+            'p99': p95, 'queries': queries}},
+        'scenarios': {'buyer': {
+            'iterations': 10, 'requests': 10, 'seconds': 0.1, 'rps': rps}},
+        'rss': {'start': 1000, 'end': 1100, 'growth': 100},
+    }
+
+
+class TestStats(TestCase):
+
+    def test_summary(self):
+        endpoint = benchmark.Endpoint('buyer.create')
+        endpoint.times = [0.01, 0.03, 0.02]
+        endpoint.queries = [2, 3, 4]
+        summary = endpoint.summary()
+        eq_(summary['requests'], 3)
+        eq_(summary['p50'], 20)
+        eq_(summary['p99'], 30)
+        eq_(summary['rps'], 50)
+        eq_(summary['queries'], 3)
+
+    def test_rss(self):
+        ok_(benchmark.rss() > 0)
+
+    def test_compare_same(self):
+        eq_(benchmark.compare(results(), results()), [])
+
+    def test_compare_within_threshold(self):
+        eq_(benchmark.compare(results(p95=11, rps=90), results()), [])
+
+    def test_compare_slower(self):
+        eq_(benchmark.compare(results(p95=13), results()),
+            ['buyer.create: p95 13ms, was 10ms'])
+
+    def test_compare_queries(self):
+        eq_(benchmark.compare(results(queries=3), results()),
+            ['buyer.create: 3 queries, was 2'])
+
+    def test_compare_rps(self):
+        eq_(benchmark.compare(results(rps=50), results()),
+            ['buyer: 50 requests/s, was 100'])
+
+    def test_compare_new(self):
+        baseline = results()
+        baseline['endpoints'] = {}
+        baseline['scenarios'] = {}
+        eq_(benchmark.compare(results(), baseline), [])
+
+    def test_report(self):
+        lines = benchmark.report(results())
+        ok_(lines[1].startswith('buyer.create'))
+        ok_('grew 100KB' in lines[-1])
+
+
+@override_settings(CHECK_BANGO_TOKEN=False)
+class TestRun(APITest):
+
+    def test_run(self):
+        res = benchmark.run(benchmark.Local(), ['buyer', 'pin', 'bango'], 2,
+                            warmup=1)
+        eq_(res['scenarios'].keys(), ['buyer', 'pin', 'bango'])
+        eq_(res['endpoints']['buyer.create']['requests'], 2)
+        eq_(res['endpoints']['bango.notification']['requests'], 2)
+        ok_(res['endpoints']['pin.verify']['queries'])
+
+    @patch.object(benchmark.TransactionsScenario, 'count', 21)
+    def test_transactions(self):
+        res = benchmark.run(benchmark.Local(), ['transactions'], 1)
+        # Twenty on a page.
+        eq_(res['endpoints']['transaction.list']['requests'], 2)
+
+    def test_error(self):
+        with self.assertRaises(benchmark.BenchmarkError):
+            benchmark.Local().post('buyer.create', '/generic/buyer/', {})
+
+
+@override_settings(BRAINTREE_PROXY='http://fake/braintree')
+class TestBraintree(APITest):
+
+    def setUp(self):
+        session = Session(FakeBraintree(Profile()))
+        patcher = patch('lib.brains.client.get_session')
+        patcher.start().return_value = session
+        self.addCleanup(patcher.stop)
+        # solitude-auth checks the webhooks.
+        patcher = patch('lib.brains.forms.requests', Mock(
+            post=lambda url, data: session.request('POST', url)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        client.reset()
+        self.addCleanup(client.reset)
+
+    def test_run(self):
+        res = benchmark.run(benchmark.Local(), ['braintree'], 1)
+        eq_(res['endpoints']['braintree.webhook']['requests'], 1)
@@ -0,0 +1,87 @@
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from mock import patch
+from nose.tools import eq_, ok_
+
+from solitude import breakers, metrics
+
+
+@override_settings(CIRCUIT_BREAKERS={'bango': {'failures': 2, 'reset': 30}})
+@patch('solitude.breakers.time.time', lambda: 1000)
+class TestBreaker(TestCase):
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.breaker = breakers.Breaker('bango', 'GetPackage')
+
+    def fail(self, times=2):
+        for x in range(times):
+            ok_(self.breaker.allow())
+            self.breaker.record(False)
+
+    def state(self):
+        return metrics.registry.get(
+            metrics.Gauge, 'solitude_breaker_state', upstream='bango',
+            method='GetPackage').value
+
+    def test_closed(self):
+        self.fail(times=1)
+        eq_(self.breaker.state, breakers.CLOSED)
+        ok_(self.breaker.allow())
+
+    def test_success_resets(self):
+        self.fail(times=1)
+        self.breaker.record(True)
+        self.fail(times=1)
+        eq_(self.breaker.state, breakers.CLOSED)
+
+    def test_opens(self):
+        self.fail()
+        eq_(self.breaker.state, breakers.OPEN)
+        ok_(not self.breaker.allow())
+        eq_(self.state(), 2)
+        eq_(metrics.registry.get(
+            metrics.Counter, 'solitude_breaker_rejected_total',
+            upstream='bango', method='GetPackage').value, 1)
+
+    def test_half_open(self):
+        self.fail()
+        with patch('solitude.breakers.time.time', lambda: 1030):
+            ok_(self.breaker.allow())
+            eq_(self.breaker.state, breakers.HALF_OPEN)
+            # Only one call probes.
+            ok_(not self.breaker.allow())
+            self.breaker.record(True)
+            eq_(self.breaker.state, breakers.CLOSED)
+            ok_(self.breaker.allow())
+        eq_(self.state(), 0)
+
+    def test_half_open_fails(self):
+        self.fail()
+        with patch('solitude.breakers.time.time', lambda: 1030):
+            ok_(self.breaker.allow())
+            self.breaker.record(False)
+            eq_(self.breaker.state, breakers.OPEN)
+            ok_(not self.breaker.allow())
+
+    @override_settings(CIRCUIT_BREAKERS={})
+    def test_off(self):
+        self.fail(times=10)
+        eq_(self.breaker.state, breakers.CLOSED)
+
+    def test_data(self):
+        self.fail(times=1)
+        eq_(self.breaker.data(), {'state': 'closed', 'failures': 1})
+
+
+class TestBreakers(TestCase):
+
+    def test_get(self):
+        registry = breakers.Breakers()
+        breaker = registry.get('braintree', 'post.customers')
+        ok_(registry.get('braintree', 'post.customers') is breaker)
+        eq_(registry.data(), {'braintree.post.customers':
+                              {'state': 'closed', 'failures': 0}})
+        registry.clear()
+        eq_(registry.data(), {})
@@ -0,0 +1,109 @@
+import threading
+import time
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from nose.tools import eq_, ok_
+
+from solitude import bulkheads, metrics
+
+
+class TestBulkhead(TestCase):
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.bulkhead = bulkheads.Bulkhead('bango')
+
+    def test_acquire(self):
+        ok_(self.bulkhead.acquire(2, 0))
+        ok_(self.bulkhead.acquire(2, 0))
+        ok_(not self.bulkhead.acquire(2, 0))
+        eq_(metrics.registry.get(
+            metrics.Gauge, 'solitude_bulkhead_active',
+            upstream='bango').value, 2)
+        eq_(metrics.registry.get(
+            metrics.Counter, 'solitude_bulkhead_rejected_total',
+            upstream='bango').value, 1)
+
+    def test_release(self):
+        ok_(self.bulkhead.acquire(1, 0))
+        self.bulkhead.release()
+        ok_(self.bulkhead.acquire(1, 0))
+
+    def test_waits(self):
+        ok_(self.bulkhead.acquire(1, 0))
+        timer = threading.Timer(0.01, self.bulkhead.release)
+        timer.start()
+        ok_(self.bulkhead.acquire(1, 5))
+        timer.join()
+
+    def test_unlimited(self):
+        for x in range(5):
+            ok_(self.bulkhead.acquire(0, 0))
+
+    def test_labels(self):
+        eq_(bulkheads.Bulkhead('bango', 'key').labels,
+            {'upstream': 'bango', 'consumer': 'key'})
+
+
+@override_settings(BULKHEADS={
+    'bango': {'size': 2, 'consumer': 1, 'timeout': 0}})
+class TestLimit(TestCase):
+
+    def setUp(self):
+        self.bulkheads = bulkheads.Bulkheads()
+
+    def test_limit(self):
+        with self.bulkheads.limit('bango', 'a'):
+            with self.assertRaises(bulkheads.Full):
+                with self.bulkheads.limit('bango', 'a'):
+                    pass
+            with self.bulkheads.limit('bango', 'b'):
+                with self.assertRaises(bulkheads.Full):
+                    with self.bulkheads.limit('bango', 'c'):
+                        pass
+        eq_(self.bulkheads.get('bango').active, 0)
+        eq_(self.bulkheads.get('bango', 'a').active, 0)
+
+    @override_settings(BULKHEADS={
+        'bango': {'size': 2, 'consumer': 1, 'timeout': 5}})
+    def test_consumer_waiting(self):
+        waiting = threading.Thread(target=self.call, args=('a',))
+        with self.bulkheads.limit('bango', 'a'):
+            waiting.start()
+            # Give it time to start waiting.
+            time.sleep(0.05)
+            # The waiting call for a doesn't hold the slot b needs.
+            eq_(self.bulkheads.get('bango').active, 1)
+            start = time.time()
+            with self.bulkheads.limit('bango', 'b'):
+                pass
+            ok_(time.time() - start < 1)
+        waiting.join()
+        eq_(self.bulkheads.get('bango').active, 0)
+
+    def call(self, consumer):
+        with self.bulkheads.limit('bango', consumer):
+            pass
+
+    def test_released_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.bulkheads.limit('bango', 'a'):
+                raise ValueError
+        eq_(self.bulkheads.get('bango').active, 0)
+
+    def test_oauth_consumer(self):
+        with self.bulkheads.limit('bango'):
+            eq_(self.bulkheads.get('bango', '<anon>').active, 1)
+
+    def test_not_limited(self):
+        with self.bulkheads.limit('braintree'):
+            with self.bulkheads.limit('braintree'):
+                pass
+        eq_(self.bulkheads.bulkheads, {})
+
+    def test_error(self):
+        error = bulkheads.Full('Too many.')
+        eq_(error.status_code, 503)
+        eq_(error.detail, 'Too many.')
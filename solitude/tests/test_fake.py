@@ -0,0 +1,51 @@
+from unittest import TestCase
+
+from mock import patch
+from nose.tools import eq_
+
+from solitude import fake
+
+
+class TestProfile(TestCase):
+
+    def test_outcome(self):
+        profile = fake.Profile(errors=0.2, timeouts=0.1)
+        with patch('random.random', lambda: 0.05):
+            eq_(profile.outcome(), fake.TIMEOUT)
+        with patch('random.random', lambda: 0.25):
+            eq_(profile.outcome(), fake.ERROR)
+        with patch('random.random', lambda: 0.5):
+            eq_(profile.outcome(), fake.OK)
+
+    def test_delay(self):
+        eq_(fake.Profile().delay(), 0)
+        with patch('random.gauss', lambda mu, sigma: -10):
+            eq_(fake.Profile(latency=5, jitter=20).delay(), 0)
+        with patch('random.gauss', lambda mu, sigma: 250):
+            eq_(fake.Profile(latency=250).delay(), 0.25)
+
+    def test_method(self):
+        slow = fake.Profile(latency=100)
+        profile = fake.Profile(methods={'GetPackage': slow})
+        eq_(profile.method('GetPackage'), slow)
+        eq_(profile.method('CreatePackage'), profile)
+
+    def test_get_profile(self):
+        profile = fake.get_profile('flaky', errors=0.5, latency=None)
+        eq_(profile.errors, 0.5)
+        eq_(profile.latency, fake.PROFILES['flaky'].latency)
+        eq_(fake.PROFILES['flaky'].errors, 0.1)
+
+    def test_with_methods(self):
+        profile = fake.with_methods(
+            fake.Profile(latency=100, errors=0.1),
+            ['GetPackage=latency:300,jitter:50', 'CheckToken='])
+        eq_(profile.method('GetPackage').latency, 300)
+        eq_(profile.method('GetPackage').jitter, 50)
+        eq_(profile.method('GetPackage').errors, 0.1)
+        eq_(profile.method('CheckToken').latency, 100)
+        eq_(profile.method('CreatePackage'), profile)
+
+    def test_with_methods_unknown(self):
+        with self.assertRaises(ValueError):
+            fake.with_methods(fake.Profile(), ['GetPackage=speed:1'])
@@ -0,0 +1,66 @@
+from django.test import TestCase
+
+from nose.tools import eq_, ok_, raises
+
+from solitude.metrics import Histogram, Registry
+
+
+class TestHistogram(TestCase):
+
+    def test_buckets(self):
+        hist = Histogram(buckets=(0.1, 1, float('inf')))
+        for value in (0.05, 0.5, 0.5, 20):
+            hist.observe(value)
+        eq_(hist.counts, [1, 2, 1])
+        eq_(hist.count, 4)
+        eq_(round(hist.sum, 2), 21.05)
+
+    def test_quantile(self):
+        hist = Histogram(buckets=(1, 2, float('inf')))
+        for value in (0.5, 0.5, 1.5, 1.5):
+            hist.observe(value)
+        eq_(hist.quantile(0.5), 1)
+        eq_(hist.quantile(1), 2)
+
+    def test_quantile_empty(self):
+        eq_(Histogram().quantile(0.5), None)
+
+
+class TestRegistry(TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter(self):
+        self.registry.incr('calls', code='ok')
+        self.registry.incr('calls', code='ok')
+        self.registry.incr('calls', code='fail')
+        out = self.registry.render()
+        ok_('# TYPE calls counter' in out)
+        ok_('calls{code="ok"} 2' in out)
+        ok_('calls{code="fail"} 1' in out)
+
+    def test_timer(self):
+        with self.registry.timer('call_seconds', method='foo'):
+            pass
+        out = self.registry.render()
+        ok_('# TYPE call_seconds histogram' in out)
+        ok_('call_seconds_bucket{method="foo",le="+Inf"} 1' in out)
+        ok_('call_seconds_count{method="foo"} 1' in out)
+
+    def test_timer_error(self):
+        try:
+            with self.registry.timer('call_seconds'):
+                raise ValueError
+        except ValueError:
+            pass
+        ok_('call_seconds_count 1' in self.registry.render())
+
+    def test_escape(self):
+        self.registry.incr('calls', name='a"b')
+        ok_('calls{name="a\\"b"} 1' in self.registry.render())
+
+    @raises(ValueError)
+    def test_kind(self):
+        self.registry.incr('calls')
+        self.registry.observe('calls', 1)
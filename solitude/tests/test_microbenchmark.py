@@ -0,0 +1,44 @@
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from mock import Mock
+from nose.tools import eq_, ok_
+
+from solitude import microbenchmark
+from solitude.base import APITest
+
+
+class TestMeasure(TestCase):
+
+    def test_measure(self):
+        func = Mock()
+        number, times = microbenchmark.measure(func, repeat=3, min_time=0)
+        eq_(number, 1)
+        eq_(len(times), 3)
+        eq_(times, sorted(times))
+        # Once to warm up, once to find the number and once per repeat.
+        eq_(func.call_count, 5)
+
+    def test_report(self):
+        lines = microbenchmark.report({'benchmarks': {'bango.sign': {
+            'number': 10, 'repeat': 3, 'best': 1, 'median': 2, 'worst': 3}}})
+        ok_(lines[1].startswith('bango.sign'))
+
+    def test_large_payload(self):
+        data = microbenchmark.large_payload(width=5, depth=2)
+        eq_(len(data), 5)
+        ok_(isinstance(data['key-1'], dict))
+
+
+@override_settings(CHECK_BANGO_TOKEN=False)
+class TestBenchmarks(APITest):
+
+    def test_all(self):
+        fixtures = microbenchmark.Fixtures(count=2)
+        for name, benchmark in microbenchmark.BENCHMARKS.items():
+            benchmark(fixtures)()
+
+    def test_run(self):
+        res = microbenchmark.run(['bango.sign'], repeat=2, min_time=0)
+        eq_(res['benchmarks'].keys(), ['bango.sign'])
+        ok_(res['benchmarks']['bango.sign']['best'] > 0)
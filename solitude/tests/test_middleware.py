@@ -1,9 +1,28 @@
+from collections import deque
+
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Template
+from django.template.response import SimpleTemplateResponse
 from django.test import RequestFactory, TestCase
+from django.test.utils import override_settings
 
-from nose.tools import eq_
+from mock import patch
+from nose.tools import eq_, ok_
 
+from lib.sellers.models import Seller
+from solitude import metrics
+from solitude.base import APITest
 from solitude.logger import get_oauth_key, get_transaction_id
-from solitude.middleware import LoggerMiddleware
+from solitude.middleware import (after_commit, CommitMiddleware,
+                                 LoggerMiddleware, MetricsMiddleware,
+                                 QueryCountMiddleware, QueryLog,
+                                 ServerTimingMiddleware, server_timing,
+                                 set_oauth_key)
+
+
+def fake_view(request):
+    pass
 
 
 class TestMiddleware(TestCase):
@@ -20,3 +39,176 @@ class TestMiddleware(TestCase):
         LoggerMiddleware().process_request(req)
         eq_(get_oauth_key(), 'bar')
         eq_(get_transaction_id(), 'foo')
+
+
+class TestCommitMiddleware(TestCase):
+
+    def test_no_request(self):
+        called = []
+        after_commit(called.append, 1)
+        eq_(called, [1])
+
+    def test_request(self):
+        called = []
+        middleware = CommitMiddleware()
+        middleware.process_request(RequestFactory().get('/'))
+        # Tests run in a transaction, like a request with ATOMIC_REQUESTS.
+        after_commit(called.append, 1)
+        eq_(called, [])
+        eq_(middleware.process_response(None, 'response'), 'response')
+        eq_(called, [1])
+        after_commit(called.append, 2)
+        eq_(called, [1, 2])
+
+
+class TestMetricsMiddleware(TestCase):
+
+    def setUp(self):
+        metrics.registry.clear()
+
+    def test_view(self):
+        req = RequestFactory().get('/')
+        middleware = MetricsMiddleware()
+        middleware.process_view(req, fake_view, (), {})
+        middleware.process_response(req, HttpResponse())
+        out = metrics.registry.render()
+        ok_('solitude_view_seconds_count{method="GET",'
+            'view="solitude.tests.test_middleware.fake_view"} 1' in out)
+        ok_('solitude_view_responses_total{method="GET",status="200",'
+            'view="solitude.tests.test_middleware.fake_view"} 1' in out)
+
+    def test_no_view(self):
+        MetricsMiddleware().process_response(RequestFactory().get('/'),
+                                             HttpResponse())
+        eq_(metrics.registry.render(), '\n')
+
+
+@override_settings(SERVER_TIMING_CONSUMERS=['webpay'])
+class TestServerTimingMiddleware(TestCase):
+
+    def setUp(self):
+        self.middleware = ServerTimingMiddleware()
+
+    def call(self, consumer='webpay', **headers):
+        req = RequestFactory().get('/', HTTP_AUTHORIZATION=self.auth(consumer),
+                                   **headers)
+        self.middleware.process_request(req)
+        set_oauth_key(consumer)
+        with server_timing('bango'):
+            Seller.objects.exists()
+        return self.middleware.process_response(req, HttpResponse())
+
+    def auth(self, consumer):
+        return 'OAuth oauth_consumer_key="{0}"'.format(consumer)
+
+    def timings(self, res):
+        return dict(t.split(';dur=') for t in res['Server-Timing'].split(', '))
+
+    def test_timing(self):
+        res = self.call(HTTP_SOLITUDE_SERVER_TIMING='1')
+        eq_(sorted(self.timings(res).keys()), ['bango', 'db', 'total'])
+
+    def test_not_asked(self):
+        ok_(not self.call().has_header('Server-Timing'))
+
+    def test_not_allowed(self):
+        res = self.call(consumer='other', HTTP_SOLITUDE_SERVER_TIMING='1')
+        ok_(not res.has_header('Server-Timing'))
+
+    def test_not_allowed_no_queries(self):
+        req = RequestFactory().get('/', HTTP_AUTHORIZATION=self.auth('other'),
+                                   HTTP_SOLITUDE_SERVER_TIMING='1')
+        self.middleware.process_request(req)
+        ok_(not connection.force_debug_cursor)
+        ok_(not getattr(req, '_server_timing', None))
+
+    def test_claimed_consumer(self):
+        # Claiming to be an allowed consumer isn't enough.
+        req = RequestFactory().get('/', HTTP_AUTHORIZATION=self.auth('webpay'),
+                                   HTTP_SOLITUDE_SERVER_TIMING='1')
+        self.middleware.process_request(req)
+        set_oauth_key('other')
+        res = self.middleware.process_response(req, HttpResponse())
+        ok_(not res.has_header('Server-Timing'))
+
+    def test_render(self):
+        req = RequestFactory().get('/', HTTP_AUTHORIZATION=self.auth('webpay'),
+                                   HTTP_SOLITUDE_SERVER_TIMING='1')
+        self.middleware.process_request(req)
+        set_oauth_key('webpay')
+        res = self.middleware.process_template_response(
+            req, SimpleTemplateResponse(Template('')))
+        res.render()
+        res = self.middleware.process_response(req, res)
+        ok_('render' in self.timings(res))
+
+
+class TestQueryLog(TestCase):
+
+    def test_queries(self):
+        Seller.objects.exists()
+        query_log = QueryLog().start()
+        Seller.objects.exists()
+        eq_(len(query_log.stop()), 1)
+        ok_(not connection.force_debug_cursor)
+
+    def test_full(self):
+        # Once the log is full the oldest queries are dropped.
+        with patch.object(connection, 'queries_log', deque(maxlen=3)):
+            Seller.objects.exists()
+            Seller.objects.exists()
+            query_log = QueryLog().start()
+            for x in range(4):
+                Seller.objects.exists()
+            eq_(len(query_log.stop()), 3)
+
+
+@override_settings(QUERY_COUNT_SAMPLE_RATE=1)
+class TestQueryCountMiddleware(TestCase):
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.middleware = QueryCountMiddleware()
+
+    def call(self):
+        req = RequestFactory().get('/')
+        self.middleware.process_view(req, fake_view, (), {})
+        Seller.objects.exists()
+        Seller.objects.exists()
+        return self.middleware.process_response(req, HttpResponse())
+
+    def test_count(self):
+        self.call()
+        ok_('solitude_db_queries_total{'
+            'view="solitude.tests.test_middleware.fake_view"} 2'
+            in metrics.registry.render())
+
+    @override_settings(QUERY_COUNT_SAMPLE_RATE=0, DEBUG=False)
+    def test_not_sampled(self):
+        self.call()
+        ok_('solitude_db_queries_total' not in metrics.registry.render())
+
+    @override_settings(SLOW_QUERY_TIME=0)
+    @patch('solitude.logger.getLogger')
+    def test_slow(self, getLogger):
+        self.call()
+        ok_(getLogger.return_value.warning.called)
+
+    @override_settings(SLOW_QUERY_TIME=10)
+    @patch('solitude.logger.getLogger')
+    def test_not_slow(self, getLogger):
+        self.call()
+        ok_(not getLogger.return_value.warning.called)
+
+
+class TestQueryBudget(APITest):
+
+    def test_within(self):
+        with self.query_budget(1):
+            Seller.objects.exists()
+
+    def test_over(self):
+        with self.assertRaises(AssertionError):
+            with self.query_budget(1):
+                Seller.objects.exists()
+                Seller.objects.exists()
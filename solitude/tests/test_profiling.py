@@ -0,0 +1,134 @@
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import override_settings
+
+from mock import patch
+from nose.tools import eq_, raises
+from rest_framework.response import Response
+
+from lib.buyers.views import BuyerViewSet
+from solitude import profiling
+from solitude.base import APITest
+from solitude.middleware import ProfileMiddleware
+
+
+def view(request):
+    return 'response'
+
+
+def write(transaction_id, view):
+    profiling.save(profiling.start(), transaction_id, view)
+
+
+class TestProfiling(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.override = override_settings(PROFILE_DIR=self.dir,
+                                          PROFILE_MAX_FILES=2)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.dir)
+
+    def test_save(self):
+        write('webpay:some-id', 'some.view')
+        profile, = profiling.profiles()
+        eq_(profile.transaction_id, 'webpay:some_id')
+        eq_(profile.view, 'some.view')
+        assert os.path.exists(profile.path)
+
+    @patch('solitude.profiling.time.time')
+    def test_rotate(self, time):
+        for created in range(3):
+            time.return_value = created
+            write('-', 'view{0}'.format(created))
+        eq_([p.view for p in profiling.profiles()], ['view1', 'view2'])
+
+    def test_filter(self):
+        write('-', 'bango.billing')
+        write('-', 'bango.notification')
+        eq_([p.view for p in profiling.profiles(view='billing')],
+            ['bango.billing'])
+
+    def test_no_dir(self):
+        with self.settings(PROFILE_DIR=os.path.join(self.dir, 'nope')):
+            eq_(profiling.profiles(), [])
+
+    def test_command(self):
+        write('-', 'bango.billing')
+        call_command('profiles', aggregate=True, view='billing')
+
+    @raises(CommandError)
+    def test_command_none(self):
+        call_command('profiles')
+
+
+@override_settings(PROFILE_SAMPLE_RATE=0, PROFILE_TOKEN='secret')
+@patch('solitude.profiling.save')
+@patch('solitude.profiling.start')
+class TestProfileMiddleware(TestCase):
+
+    def setUp(self):
+        self.middleware = ProfileMiddleware()
+
+    def call(self, **headers):
+        req = RequestFactory().get('/', **headers)
+        eq_(self.middleware.process_view(req, view, (), {}), None)
+        return req
+
+    def test_not_profiled(self, start, save):
+        req = self.call()
+        self.middleware.process_response(req, 'response')
+        assert not start.called
+        assert not save.called
+
+    def test_token(self, start, save):
+        req = self.call(HTTP_SOLITUDE_PROFILE='secret')
+        assert start.called
+        eq_(self.middleware.process_response(req, 'response'), 'response')
+        eq_(save.call_args[0][0], start.return_value)
+        eq_(save.call_args[0][2], 'solitude.tests.test_profiling.view')
+
+    def test_wrong_token(self, start, save):
+        self.call(HTTP_SOLITUDE_PROFILE='wrong')
+        assert not start.called
+
+    def test_sampled(self, start, save):
+        with self.settings(PROFILE_SAMPLE_RATE=1):
+            self.call()
+        assert start.called
+
+    def test_exception(self, start, save):
+        req = self.call(HTTP_SOLITUDE_PROFILE='secret')
+        eq_(self.middleware.process_exception(req, ValueError()), None)
+        self.middleware.process_response(req, 'response')
+        eq_(save.call_count, 1)
+
+
+class TestProfileRequest(APITest):
+
+    def depth(self, **headers):
+        depths = []
+
+        def list(view, request):
+            depths.append(len(connection.savepoint_ids))
+            return Response([])
+
+        with patch.object(BuyerViewSet, 'list', list):
+            self.client.get('/generic/buyer/', **headers)
+        return depths[0]
+
+    @override_settings(PROFILE_TOKEN='secret')
+    @patch('solitude.profiling.save')
+    def test_view_atomic(self, save):
+        # Django still calls the view, in the request transaction.
+        eq_(self.depth(HTTP_SOLITUDE_PROFILE='secret'), self.depth())
+        eq_(save.call_count, 1)
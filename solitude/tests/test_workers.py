@@ -0,0 +1,104 @@
+import threading
+import time
+from functools import partial
+
+from django.test import TestCase
+
+from nose.tools import eq_, ok_
+
+from solitude import metrics
+from solitude.middleware import get_oauth_key, set_oauth_key
+from solitude.workers import Full, spawn, Timeout, WorkerPool
+
+
+def thread_name():
+    return threading.current_thread().name
+
+
+class TestSpawn(TestCase):
+
+    def test_result(self):
+        eq_(spawn(thread_name).result(1), 'solitude-thread_name')
+
+    def test_partial(self):
+        eq_(spawn(partial(thread_name)).result(1), 'solitude-partial')
+
+    def test_context(self):
+        set_oauth_key('some-consumer')
+        try:
+            eq_(spawn(get_oauth_key).result(1), 'some-consumer')
+        finally:
+            set_oauth_key('<anon>')
+
+    def test_error(self):
+        with self.assertRaises(ZeroDivisionError):
+            spawn(lambda: 1 / 0).result(1)
+
+    def test_timeout(self):
+        with self.assertRaises(Timeout):
+            spawn(time.sleep, 1).result(0.01)
+
+
+class TestWorkerPool(TestCase):
+
+    def setUp(self):
+        metrics.registry.clear()
+
+    def test_inline(self):
+        eq_(WorkerPool('test', 0).run(1, thread_name),
+            threading.current_thread().name)
+
+    def test_threads(self):
+        pool = WorkerPool('test', 2)
+        ok_(pool.run(1, thread_name).startswith('solitude-test-'))
+        eq_(len(pool.threads), 2)
+        ok_('solitude_pool_wait_seconds_count{pool="test"} 1'
+            in metrics.registry.render())
+
+    def test_timeout(self):
+        pool = WorkerPool('test', 1)
+        pool.submit(time.sleep, 0.5)
+        with self.assertRaises(Timeout):
+            pool.run(0.01, thread_name)
+        ok_('solitude_pool_timeouts_total{pool="test"} 1'
+            in metrics.registry.render())
+
+    def test_abandoned(self):
+        pool = WorkerPool('test', 1)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        pool.submit(release.wait)
+        ran = []
+        with self.assertRaises(Timeout):
+            pool.run(0.01, ran.append, 1)
+        release.set()
+        pool.run(1, thread_name)
+        eq_(ran, [])
+        ok_('solitude_pool_skipped_total{pool="test"} 1'
+            in metrics.registry.render())
+
+    def test_full(self):
+        pool = WorkerPool('test', 1, queue_size=1)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        pool.submit(release.wait)
+        # Wait for the worker to take the first off the queue.
+        while pool.queue.qsize():
+            time.sleep(0.001)
+        pool.submit(thread_name)
+        with self.assertRaises(Full):
+            pool.submit(thread_name)
+        ok_('solitude_pool_rejected_total{pool="test"} 1'
+            in metrics.registry.render())
+
+    def test_settings(self):
+        pool = WorkerPool('test', 'PIN_HASH_WORKERS')
+        with self.settings(PIN_HASH_WORKERS=1):
+            ok_(pool.run(1, thread_name).startswith('solitude-test-'))
+        eq_(pool.run(1, thread_name), threading.current_thread().name)
+
+    def test_cancel_started(self):
+        future = spawn(time.sleep, 0.1)
+        while future.started is None:
+            time.sleep(0.001)
+        ok_(not future.cancel())
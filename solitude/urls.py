@@ -11,6 +11,7 @@ services_patterns = patterns(
     url(r'^error/', 'error', name='services.error'),
     url(r'^logs/', 'logs', name='services.log'),
     url(r'^status/', 'status', name='services.status'),
+    url(r'^metrics/', 'metrics_list', name='services.metrics'),
     url(r'^request/', 'request_resource', name='services.request'),
     url(r'^failures/transactions/', 'transactions_failures',
         name='services.failures.transactions'),
@@ -1,3 +1,5 @@
+import math
+
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
@@ -18,6 +20,18 @@ def shorter(integer):
     return ''.join(reversed(output))
 
 
+def percentile(values, pct):
+    """
+    The nearest rank percentile of values, pct is from 0 to 100. Returns None
+    if there are no values.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    rank = int(math.ceil(pct / 100.0 * len(values))) - 1
+    return values[max(0, rank)]
+
+
 def validate_settings():
     """
     Validate that if not in DEBUG mode, key settings have been changed.
@@ -0,0 +1,231 @@
+import Queue
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from solitude import metrics
+from solitude.logger import getLogger
+from solitude.middleware import get_context, set_context
+
+log = getLogger('s.workers')
+
+
+class Timeout(Exception):
+
+    """The result was not ready within the time allowed."""
+
+
+class Full(Exception):
+
+    """The pool has as much work queued as it is allowed."""
+
+
+class Future(object):
+
+    """
+    The result of some work running on another thread.
+
+    Python 2.7 doesn't have concurrent.futures, this is just enough of it
+    for solitude.
+    """
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._result = None
+        self._exc_info = None
+        self.started = None
+        self.finished = None
+
+    def done(self):
+        return self._done.is_set()
+
+    def cancel(self):
+        """
+        Stop the work from being run, if it hasn't started. Returns True if
+        it won't be run.
+        """
+        with self._lock:
+            if self.started is None:
+                self._cancelled = True
+            return self._cancelled
+
+    def cancelled(self):
+        return self._cancelled
+
+    @property
+    def elapsed(self):
+        """Time in seconds the work has taken so far."""
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+    def run(self, func, *args, **kw):
+        with self._lock:
+            if self._cancelled:
+                return
+            self.started = time.time()
+        try:
+            self._result = func(*args, **kw)
+        except:
+            self._exc_info = sys.exc_info()
+        finally:
+            self.finished = time.time()
+            self._done.set()
+
+    def result(self, timeout=None):
+        """
+        Wait for the result up to timeout seconds. Raises Timeout if the work
+        has not finished, or re-raises the exception the work raised.
+        """
+        if not self._done.wait(timeout):
+            raise Timeout()
+        if self._exc_info:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+
+def func_name(func):
+    # Partials and mocks don't have a __name__.
+    return getattr(func, '__name__', type(func).__name__)
+
+
+def _thread_run(future, func, args, kw, context=None):
+    try:
+        if context is not None:
+            set_context(context)
+        future.run(func, *args, **kw)
+    finally:
+        # Database connections are per thread, don't leave them lying around.
+        # Daemon threads can still be running as the interpreter exits and
+        # the module globals are cleared.
+        if connections is not None:
+            connections.close_all()
+
+
+def spawn(func, *args, **kw):
+    """
+    Run func on a new daemon thread, returning a Future. The thread gets the
+    request values of the calling thread, so the logs, the consumer and
+    Server-Timing are the same as if func ran on the calling thread.
+    """
+    future = Future()
+    thread = threading.Thread(target=_thread_run,
+                              args=(future, func, args, kw, get_context()),
+                              name='solitude-{0}'.format(func_name(func)))
+    thread.daemon = True
+    thread.start()
+    return future
+
+
+def setting(value):
+    """
+    Value, or the setting it names. Settings are read when they are used, so
+    they can be overridden.
+    """
+    if isinstance(value, basestring):
+        return getattr(settings, value)
+    return value
+
+
+class WorkerPool(object):
+
+    """
+    A fixed number of threads working through a queue, so that expensive
+    work is bounded no matter how many requests want it. The depth of the
+    queue and the time spent waiting in it are recorded in the metrics.
+
+    size and queue_size are numbers or the names of settings. Once
+    queue_size jobs are waiting, more are refused with Full rather than
+    queued behind work that can't be done in time. A queue_size of 0 is
+    unbounded.
+
+    With a size of 0 the work is done straight away on the calling thread,
+    which is what the tests use.
+    """
+
+    def __init__(self, name, size, queue_size=0):
+        self.name = name
+        self._size = size
+        self._queue_size = queue_size
+        self.queue = Queue.Queue()
+        self.lock = threading.Lock()
+        self.threads = []
+
+    @property
+    def size(self):
+        return setting(self._size)
+
+    @property
+    def queue_size(self):
+        return setting(self._queue_size)
+
+    def start(self):
+        with self.lock:
+            while len(self.threads) < self.size:
+                thread = threading.Thread(
+                    target=self.work,
+                    name='solitude-{0}-{1}'.format(self.name,
+                                                   len(self.threads)))
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+
+    def work(self):
+        while True:
+            queued, future, func, args, kw = self.queue.get()
+            metrics.gauge('solitude_pool_queue_depth', self.queue.qsize(),
+                          pool=self.name)
+            if future.cancelled():
+                # Whoever wanted it has given up.
+                metrics.incr('solitude_pool_skipped_total', pool=self.name)
+                continue
+            metrics.observe('solitude_pool_wait_seconds',
+                            time.time() - queued, pool=self.name)
+            _thread_run(future, func, args, kw)
+
+    def submit(self, func, *args, **kw):
+        """
+        Queue func to be run, returning a Future. Raises Full if the queue
+        is full.
+        """
+        future = Future()
+        size = self.size
+        if not size:
+            future.run(func, *args, **kw)
+            return future
+
+        if len(self.threads) < size:
+            self.start()
+        with self.lock:
+            queue_size = self.queue_size
+            if queue_size and self.queue.qsize() >= queue_size:
+                metrics.incr('solitude_pool_rejected_total', pool=self.name)
+                log.error('Pool {0} queue is full, refusing {1}'
+                          .format(self.name, func_name(func)))
+                raise Full()
+            self.queue.put((time.time(), future, func, args, kw))
+        metrics.gauge('solitude_pool_queue_depth', self.queue.qsize(),
+                      pool=self.name)
+        return future
+
+    def run(self, timeout, func, *args, **kw):
+        """
+        Run func in the pool and wait up to timeout seconds for the result.
+        Raises Timeout if the pool can't get it done in time, in which case
+        it won't be started, or Full if it can't be queued.
+        """
+        future = self.submit(func, *args, **kw)
+        try:
+            return future.result(timeout)
+        except Timeout:
+            future.cancel()
+            metrics.incr('solitude_pool_timeouts_total', pool=self.name)
+            log.error('Pool {0} missed its {1}s budget for {2}, queue: {3}'
+                      .format(self.name, timeout, func_name(func),
+                              self.queue.qsize()))
+            raise